@@ -0,0 +1,165 @@
+"""
+Serving blobs with HTTP Range support
+Single byte ranges only (multi-range requests get the whole blob, which
+RFC 7233 allows). Bodies are sent from an mmap of the blob in chunks, or
+via the ASGI zero-copy send extension when the server offers it, so a seek
+into a long recording never reads the whole file.
+"""
+import os
+import re
+from typing import Optional, Tuple
+from fastapi import Request
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.responses import Response
+from starlette.types import Message, Receive, Scope, Send
+from app.services.blob_store import blob_store
+
+CHUNK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Already compressed: gzip would only cost CPU (and break byte ranges)
+UNCOMPRESSIBLE_TYPES = ("audio/", "video/", "image/")
+
+
+def parse_range(header: Optional[str], size: int) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """
+    (start, end) inclusive for a satisfiable single range, None for the full body
+    The bool is False when the range can't be satisfied (416).
+    """
+    if not header:
+        return None, True
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None, True  # multiple or malformed ranges: ignore, send everything
+    first, last = match.groups()
+    if not first and not last:
+        return None, True
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return None, False
+        return (max(size - length, 0), size - 1), True
+    start = int(first)
+    if last and int(last) < start:
+        return None, True  # invalid (last < first): ignore, send everything
+    if start >= size:
+        return None, False
+    end = min(int(last), size - 1) if last else size - 1
+    return (start, end), True
+
+
+class BlobResponse(Response):
+    """A stored blob (or one byte range of it), streamed without loading the file"""
+
+    def __init__(self, request: Request, key: str, media_type: str, headers: Optional[dict] = None):
+        super().__init__(status_code=200, headers=headers, media_type=media_type)
+        self.key = key
+        self.size = blob_store.size(key)
+        etag = f'"{key}"'  # strong: content-addressed
+        self.headers["ETag"] = etag
+        self.headers["Accept-Ranges"] = "bytes"
+        self.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if if_range is not None and if_range.strip() != etag:
+            range_header = None  # client's partial copy is of something else
+
+        if request.headers.get("if-none-match", "").strip() in (etag, f"W/{etag}", "*"):
+            self.status_code = 304
+            self.start, self.length = 0, 0
+            self._drop_content_length()
+            return
+
+        byte_range, satisfiable = parse_range(range_header, self.size)
+        if not satisfiable:
+            self.status_code = 416
+            self.headers["Content-Range"] = f"bytes */{self.size}"
+            self.start, self.length = 0, 0
+            self.headers["content-length"] = "0"
+        elif byte_range:
+            self.status_code = 206
+            self.start, end = byte_range
+            self.length = end - self.start + 1
+            self.headers["Content-Range"] = f"bytes {self.start}-{end}/{self.size}"
+            self.headers["content-length"] = str(self.length)
+        else:
+            self.start, self.length = 0, self.size
+            self.headers["content-length"] = str(self.size)
+
+    def _drop_content_length(self):
+        if "content-length" in self.headers:
+            del self.headers["content-length"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.length == 0 or scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(blob_store.path(self.key), "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.length,
+                })
+            return
+
+        mapped = blob_store.open_mmap(self.key)
+        view = memoryview(mapped)
+        try:
+            end = self.start + self.length
+            for offset in range(self.start, end, CHUNK_SIZE):
+                chunk_end = min(offset + CHUNK_SIZE, end)
+                await send({
+                    "type": "http.response.body",
+                    "body": bytes(view[offset:chunk_end]),
+                    "more_body": chunk_end < end,
+                })
+        finally:
+            view.release()
+            mapped.close()
+
+
+def guess_audio_type(name: Optional[str]) -> str:
+    extension = os.path.splitext((name or "").split("?")[0])[1].lower()
+    return {".wav": "audio/wav", ".ogg": "audio/ogg", ".m4a": "audio/mp4"}.get(extension, "audio/mpeg")
+
+
+class MediaGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            # Same pass-through path as an already-encoded response
+            self.content_encoding_set = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith(UNCOMPRESSIBLE_TYPES)
+            )
+            return
+        if message["type"] != "http.response.body":
+            # e.g. http.response.zerocopysend from BlobResponse: GZipResponder would drop it
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+        await super().send_with_gzip(message)
+
+
+class MediaGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves audio/video/image responses alone"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = MediaGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List
-from app.db.session import get_db
-from app.models.database import MemoryBranch, User
-from app.schemas.schemas import MemoryBranchCreate, MemoryBranchResponse
+from app.db.session import get_db, get_read_db
+from app.db.profiler import query_budget
+from app.models.database import MemoryBranch, User, RawInput, Story
+from app.db.config import settings
+from app.schemas.schemas import MemoryBranchCreate, MemoryBranchResponse, MemoryBranchOverview, DeleteResponse
+from app.services.deletion_service import branch_dependents, delete_branch_now, delete_branch_job
+from app.services.job_service import create_job, run_job
+from app.api.conditional import (
+    check_entity,
+    check_collection,
+    make_etag,
+    not_modified_response,
+    CachedEntityRead
+)
 
 router = APIRouter()
 
 
 @router.post("/", response_model=MemoryBranchResponse)
+@query_budget(3)
 def create_memory_branch(branch: MemoryBranchCreate, db: Session = Depends(get_db)):
     """Create a new memory branch for a user"""
     # Verify user exists
@@ -24,28 +37,130 @@ def create_memory_branch(branch: MemoryBranchCreate, db: Session = Depends(get_d
 
 
 @router.get("/{branch_id}", response_model=MemoryBranchResponse)
-def get_memory_branch(branch_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+def get_memory_branch(branch_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific memory branch"""
+    cache_read = CachedEntityRead(request, "branch", branch_id)
+    if cache_read.response:
+        return cache_read.response
+
+    not_modified = check_entity(request, response, db, MemoryBranch.updated_at, branch_id)
+    if not_modified:
+        return not_modified
+
     branch = db.query(MemoryBranch).filter(MemoryBranch.id == branch_id).first()
     if not branch:
         raise HTTPException(status_code=404, detail="Memory branch not found")
-    return branch
+    return cache_read.respond(branch, MemoryBranchResponse, MemoryBranch.updated_at)
 
 
 @router.get("/user/{user_id}", response_model=List[MemoryBranchResponse])
-def list_user_branches(user_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+def list_user_branches(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
     """List all memory branches for a user"""
+    not_modified = check_collection(
+        request, response, db, MemoryBranch.updated_at, [MemoryBranch.user_id == user_id],
+        "user", user_id
+    )
+    if not_modified:
+        return not_modified
+
     branches = db.query(MemoryBranch).filter(MemoryBranch.user_id == user_id).all()
     return branches
 
 
-@router.delete("/{branch_id}")
-def delete_memory_branch(branch_id: int, db: Session = Depends(get_db)):
-    """Delete a memory branch"""
+def _branch_overview_query(user_id: int):
+    """
+    One statement: per-branch input/story aggregates and the latest story
+    (row_number() window) joined onto the user's branches
+    """
+    inputs = select(
+        RawInput.memory_branch_id,
+        func.count(RawInput.id).label("input_count"),
+        func.max(RawInput.updated_at).label("latest_input")
+    ).where(RawInput.user_id == user_id).group_by(RawInput.memory_branch_id).subquery()
+
+    stories = select(
+        Story.memory_branch_id,
+        func.count(Story.id).label("story_count"),
+        func.max(Story.updated_at).label("latest_story")
+    ).where(Story.user_id == user_id).group_by(Story.memory_branch_id).subquery()
+
+    ranked = select(
+        Story.memory_branch_id,
+        Story.id,
+        Story.title,
+        func.row_number().over(
+            partition_by=Story.memory_branch_id,
+            order_by=(Story.created_at.desc(), Story.id.desc())
+        ).label("rank")
+    ).where(Story.user_id == user_id).subquery()
+
+    return select(
+        MemoryBranch,
+        func.coalesce(inputs.c.input_count, 0),
+        func.coalesce(stories.c.story_count, 0),
+        inputs.c.latest_input,
+        stories.c.latest_story,
+        ranked.c.id,
+        ranked.c.title
+    ).outerjoin(
+        inputs, inputs.c.memory_branch_id == MemoryBranch.id
+    ).outerjoin(
+        stories, stories.c.memory_branch_id == MemoryBranch.id
+    ).outerjoin(
+        ranked, (ranked.c.memory_branch_id == MemoryBranch.id) & (ranked.c.rank == 1)
+    ).where(MemoryBranch.user_id == user_id).order_by(MemoryBranch.id)
+
+
+@router.get("/user/{user_id}/overview", response_model=List[MemoryBranchOverview])
+@query_budget(1)
+def get_user_branch_overview(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    """Memory branches with input/story counts, latest activity and latest story"""
+    overview = []
+    for branch, input_count, story_count, latest_input, latest_story, story_id, story_title in db.execute(
+        _branch_overview_query(user_id)
+    ):
+        overview.append({
+            **MemoryBranchResponse.model_validate(branch).model_dump(),
+            "input_count": input_count,
+            "story_count": story_count,
+            "latest_activity": max(t for t in (branch.updated_at, latest_input, latest_story) if t),
+            "latest_story_id": story_id,
+            "latest_story_title": story_title,
+        })
+
+    # Validators come from the aggregates themselves; the query is cheap enough to always run
+    latest = max((item["latest_activity"] for item in overview), default=None)
+    etag = make_etag(
+        "overview", user_id,
+        *((item["id"], item["input_count"], item["story_count"], item["latest_activity"]) for item in overview)
+    )
+    not_modified = not_modified_response(request, response, etag, latest)
+    if not_modified:
+        return not_modified
+    return overview
+
+
+@router.delete("/{branch_id}", response_model=DeleteResponse)
+@query_budget(7)
+def delete_memory_branch(
+    branch_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Delete a memory branch with its inputs and stories (large branches: 202 + background job)"""
     branch = db.query(MemoryBranch).filter(MemoryBranch.id == branch_id).first()
     if not branch:
         raise HTTPException(status_code=404, detail="Memory branch not found")
 
-    db.delete(branch)
-    db.commit()
+    dependents = branch_dependents(db, branch_id)
+    if dependents > settings.DELETE_INLINE_MAX_ROWS:
+        job = create_job(db, "delete_branch", params={"branch_id": branch_id}, total=dependents + 1)
+        background_tasks.add_task(run_job, job.id, delete_branch_job(branch_id))
+        response.status_code = 202
+        return {"message": "Memory branch deletion started", "job_id": job.id}
+
+    delete_branch_now(db, branch)
     return {"message": "Memory branch deleted successfully"}
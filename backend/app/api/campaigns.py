@@ -0,0 +1,115 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.db.session import get_db
+from app.db.profiler import query_budget
+from app.models.database import Campaign, CampaignCall, CampaignCallStatus, CampaignStatus
+from app.schemas.schemas import CampaignCreate, CampaignResponse, CampaignCallResponse
+from app.services.campaign_service import create_campaign, campaign_progress, set_campaign_status
+
+router = APIRouter()
+
+
+def campaign_response(campaign: Campaign, progress: dict, skipped_user_ids: Optional[List[int]] = None) -> CampaignResponse:
+    return CampaignResponse(
+        id=campaign.id,
+        name=campaign.name,
+        status=campaign.status,
+        timezone=campaign.timezone,
+        windows=campaign.windows,
+        starts_at=campaign.starts_at,
+        max_attempts=campaign.max_attempts,
+        retry_backoff_minutes=campaign.retry_backoff_minutes,
+        created_at=campaign.created_at,
+        finished_at=campaign.finished_at,
+        progress=progress,
+        skipped_user_ids=skipped_user_ids or []
+    )
+
+
+def get_campaign_or_404(db: Session, campaign_id: int) -> Campaign:
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+
+@router.post("/", response_model=CampaignResponse)
+@query_budget(5)
+def create(data: CampaignCreate, db: Session = Depends(get_db)):
+    """
+    Create a call campaign for a set of users (default: everyone with a phone number)
+    Calls start as soon as a call window opens; users without a phone number are skipped.
+    """
+    campaign, skipped = create_campaign(db, data)
+    return campaign_response(campaign, campaign_progress(db, [campaign.id])[campaign.id], skipped)
+
+
+@router.get("/", response_model=List[CampaignResponse])
+@query_budget(2)
+def list_campaigns(
+    status: Optional[CampaignStatus] = None,
+    skip: int = 0,
+    limit: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """List campaigns, newest first, with their progress"""
+    query = db.query(Campaign)
+    if status:
+        query = query.filter(Campaign.status == status)
+    campaigns = query.order_by(Campaign.id.desc()).offset(skip).limit(limit).all()
+    progress = campaign_progress(db, [campaign.id for campaign in campaigns])
+    return [campaign_response(campaign, progress[campaign.id]) for campaign in campaigns]
+
+
+@router.get("/{campaign_id}", response_model=CampaignResponse)
+@query_budget(2)
+def get_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    """Campaign progress: calls by status and attempts placed so far"""
+    campaign = get_campaign_or_404(db, campaign_id)
+    return campaign_response(campaign, campaign_progress(db, [campaign.id])[campaign.id])
+
+
+@router.get("/{campaign_id}/calls", response_model=List[CampaignCallResponse])
+@query_budget(2)
+def list_campaign_calls(
+    campaign_id: int,
+    status: Optional[CampaignCallStatus] = None,
+    skip: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Per-user call state of a campaign"""
+    get_campaign_or_404(db, campaign_id)
+    query = db.query(CampaignCall).filter(CampaignCall.campaign_id == campaign_id)
+    if status:
+        query = query.filter(CampaignCall.status == status)
+    return query.order_by(CampaignCall.id).offset(skip).limit(limit).all()
+
+
+def _change_status(db: Session, campaign_id: int, status: CampaignStatus, allowed_from: tuple) -> CampaignResponse:
+    campaign = get_campaign_or_404(db, campaign_id)
+    if campaign.status not in allowed_from:
+        raise HTTPException(status_code=409, detail=f"Campaign is {campaign.status.value}")
+    set_campaign_status(db, campaign, status)
+    return campaign_response(campaign, campaign_progress(db, [campaign.id])[campaign.id])
+
+
+@router.post("/{campaign_id}/pause", response_model=CampaignResponse)
+@query_budget(5)
+def pause_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    """Stop placing new calls (calls in progress finish)"""
+    return _change_status(db, campaign_id, CampaignStatus.PAUSED, (CampaignStatus.ACTIVE,))
+
+
+@router.post("/{campaign_id}/resume", response_model=CampaignResponse)
+@query_budget(5)
+def resume_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    return _change_status(db, campaign_id, CampaignStatus.ACTIVE, (CampaignStatus.PAUSED,))
+
+
+@router.post("/{campaign_id}/cancel", response_model=CampaignResponse)
+@query_budget(5)
+def cancel_campaign(campaign_id: int, db: Session = Depends(get_db)):
+    """Cancel calls not yet placed"""
+    return _change_status(db, campaign_id, CampaignStatus.CANCELLED, (CampaignStatus.ACTIVE, CampaignStatus.PAUSED))
@@ -0,0 +1,169 @@
+"""
+Conditional GET helpers (ETag / Last-Modified)
+Validators are built from cheap columns (updated_at, count) so a 304 can be
+answered before the full row is loaded and serialized.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from time import perf_counter
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.services.entity_cache import entity_cache, CachedEntity, ENTITY_CACHE_SERVE
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag from the parts that determine a representation"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def http_date(value: datetime) -> str:
+    # Timestamps are stored as naive UTC
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """RFC 7232: If-None-Match (weak comparison) takes precedence over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        wanted = _strip_weak(etag)
+        return any(_strip_weak(tag) == wanted for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime]
+) -> Optional[Response]:
+    """
+    Set validator headers on `response`; return a 304 response if the
+    client's copy is current, otherwise None
+    """
+    set_validators(response, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+
+def check_entity(
+    request: Request,
+    response: Response,
+    db: Session,
+    timestamp_column,
+    entity_id: int
+) -> Optional[Response]:
+    """
+    Answer a conditional GET for one row using only its timestamp column
+    Returns a 304 response, or None if the full row should be loaded
+    """
+    if not has_conditional_headers(request):
+        return None
+    model = timestamp_column.class_
+    row = db.query(timestamp_column).filter(model.id == entity_id).first()
+    if row is None:
+        return None  # let the full lookup raise the 404
+    return not_modified_response(request, response, entity_etag(model, entity_id, row[0]), row[0])
+
+
+def entity_etag(model, entity_id: int, timestamp: Optional[datetime]) -> str:
+    return make_etag(model.__tablename__, entity_id, timestamp)
+
+
+def set_entity_validators(response: Response, entity, timestamp_column):
+    timestamp = getattr(entity, timestamp_column.key)
+    set_validators(response, entity_etag(type(entity), entity.id, timestamp), timestamp)
+
+
+def check_collection(
+    request: Request,
+    response: Response,
+    db: Session,
+    timestamp_column,
+    criteria: list,
+    *key_parts
+) -> Optional[Response]:
+    """
+    Validators for a listing from count(*) and max(timestamp) over its rows
+    `key_parts` identify the representation (e.g. skip/limit). Sets ETag and
+    Last-Modified and returns a 304 response when the client's copy is current.
+    """
+    model = timestamp_column.class_
+    count, latest = db.query(func.count(model.id), func.max(timestamp_column)).filter(*criteria).one()
+    etag = make_etag(model.__tablename__, *key_parts, count, latest)
+    return not_modified_response(request, response, etag, latest)
+
+
+class CachedEntityRead:
+    """
+    Read-through cache for a single-entity GET
+
+        read = CachedEntityRead(request, "story", story_id)
+        if read.response:
+            return read.response          # served from cache, no queries
+        ...conditional check, load row, 404...
+        return read.respond(story, StoryResponse, Story.updated_at)
+    """
+
+    def __init__(self, request: Request, kind: str, entity_id: int):
+        self.request = request
+        self.kind = kind
+        self.entity_id = entity_id
+        self.start = perf_counter()
+        cached, self.version = entity_cache.lookup(kind, entity_id)
+        self.response = self._serve(cached, "HIT") if cached else None
+
+    def respond(self, entity, schema, timestamp_column) -> Response:
+        """Serialize `entity`, cache the bytes and return them"""
+        timestamp = getattr(entity, timestamp_column.key)
+        cached = CachedEntity(
+            body=schema.model_validate(entity).model_dump_json().encode(),
+            etag=entity_etag(type(entity), entity.id, timestamp),
+            last_modified=timestamp
+        )
+        entity_cache.store(self.kind, self.entity_id, self.version, cached)
+        return self._serve(cached, "MISS")
+
+    def _serve(self, cached: CachedEntity, result: str) -> Response:
+        if is_not_modified(self.request, cached.etag, cached.last_modified):
+            response = Response(status_code=304)
+        else:
+            response = Response(content=cached.body, media_type="application/json")
+        set_validators(response, cached.etag, cached.last_modified)
+        response.headers["X-Cache"] = result
+        ENTITY_CACHE_SERVE.observe(perf_counter() - self.start, kind=self.kind, result=result.lower())
+        return response
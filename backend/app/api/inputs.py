@@ -1,16 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import get_db
+from typing import List, Optional
+from app.db.session import get_db, get_read_db
+from app.db.profiler import query_budget
 from app.models.database import RawInput, User, MemoryBranch
-from app.schemas.schemas import RawInputCreate, RawInputResponse
+from app.schemas.schemas import (
+    RawInputCreate,
+    RawInputResponse,
+    BulkRawInputCreate,
+    BulkRawInputResponse,
+    SummarizeInputsRequest,
+    SummarizeInputsResponse,
+    InputSummary
+)
+from app.services.ai_service import AIService
+from app.services.blob_store import blob_store
+from app.services.dedup_service import flag_duplicate, duplicate_index
+from app.services.enrichment_service import enrich_inputs
+from app.db.config import settings
+from app.api.blobs import BlobResponse, guess_audio_type
+from app.api.conditional import check_entity, check_collection, set_entity_validators
+from app.api.projection import select_fields, projected_query, projected_response
 
 router = APIRouter()
 
+# ?view=summary: list rows without the transcript (`raw_text`)
+INPUT_SUMMARY_FIELDS = [
+    "id", "user_id", "memory_branch_id", "input_type", "summary",
+    "transcript_confidence", "duplicate_of_id", "created_at", "updated_at"
+]
+
 
 @router.post("/", response_model=RawInputResponse)
-def create_raw_input(input_data: RawInputCreate, db: Session = Depends(get_db)):
-    """Create a new raw input (text or voice transcription)"""
+@query_budget(5)
+def create_raw_input(
+    input_data: RawInputCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Create a new raw input (text or voice transcription), enriched in the background"""
     # Verify user exists
     user = db.query(User).filter(User.id == input_data.user_id).first()
     if not user:
@@ -24,46 +54,171 @@ def create_raw_input(input_data: RawInputCreate, db: Session = Depends(get_db)):
         if not branch:
             raise HTTPException(status_code=404, detail="Memory branch not found")
 
-    db_input = RawInput(**input_data.model_dump())
+    db_input = RawInput(**input_data.model_dump(exclude={"metadata"}), input_metadata=input_data.metadata)
+    signature = flag_duplicate(db, db_input)
     db.add(db_input)
     db.commit()
     db.refresh(db_input)
+    if signature is not None:
+        duplicate_index.record(db_input, signature)
+    if settings.ENRICH_ON_INGEST:
+        background_tasks.add_task(enrich_inputs, [db_input.id])
+    # The refresh checked out a connection; give it back now. Dependencies are
+    # only closed after background tasks finish, and enrichment takes a while.
+    # The input stays readable (detached, attributes loaded).
+    db.close()
     return db_input
 
 
+@router.post("/bulk", response_model=BulkRawInputResponse)
+@query_budget(3)
+def create_raw_inputs_bulk(
+    request: BulkRawInputCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Import many inputs at once (one INSERT); duplicate flags, summaries and
+    the rest of enrichment happen in the background
+    """
+    user_ids = {item.user_id for item in request.inputs}
+    found_users = {row[0] for row in db.query(User.id).filter(User.id.in_(user_ids)).all()}
+    if user_ids - found_users:
+        raise HTTPException(status_code=404, detail=f"Users not found: {sorted(user_ids - found_users)}")
+
+    branch_ids = {item.memory_branch_id for item in request.inputs if item.memory_branch_id}
+    if branch_ids:
+        found_branches = {
+            row[0] for row in db.query(MemoryBranch.id).filter(MemoryBranch.id.in_(branch_ids)).all()
+        }
+        if branch_ids - found_branches:
+            raise HTTPException(status_code=404, detail=f"Memory branches not found: {sorted(branch_ids - found_branches)}")
+
+    # One multi-row INSERT ... RETURNING on the table (a flush falls back to
+    # row-at-a-time on backends that can't return ids in parameter order, and
+    # ORM bulk inserts split rows by which columns are set). Ids within one
+    # statement are allocated in VALUES order, so sorting restores it.
+    table = RawInput.__table__
+    rows = [item.model_dump() for item in request.inputs]  # `metadata` is the column name
+    ids = sorted(db.execute(insert(table).returning(table.c.id), rows).scalars().all())
+    db.commit()
+
+    if settings.ENRICH_ON_INGEST:
+        background_tasks.add_task(enrich_inputs, ids)
+    return BulkRawInputResponse(ids=ids, enrichment_queued=settings.ENRICH_ON_INGEST)
+
+
+@router.post("/summarize", response_model=SummarizeInputsResponse)
+@query_budget(3)
+async def summarize_inputs(
+    request: SummarizeInputsRequest,
+    db: Session = Depends(get_db)
+):
+    """Summarize many inputs at once (summaries are stored and reused)"""
+    input_ids = list(dict.fromkeys(request.input_ids))
+    ai_service = AIService(db)
+    summaries = await ai_service.summarize_inputs(
+        input_ids=input_ids,
+        max_length=request.max_length or 200
+    )
+    return SummarizeInputsResponse(
+        summaries=[
+            InputSummary(input_id=input_id, summary=summaries[input_id])
+            for input_id in input_ids if summaries.get(input_id)
+        ],
+        missing_ids=[input_id for input_id in input_ids if not summaries.get(input_id)]
+    )
+
+
 @router.get("/{input_id}", response_model=RawInputResponse)
-def get_raw_input(input_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+def get_raw_input(input_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific raw input"""
+    not_modified = check_entity(request, response, db, RawInput.updated_at, input_id)
+    if not_modified:
+        return not_modified
+
     raw_input = db.query(RawInput).filter(RawInput.id == input_id).first()
     if not raw_input:
         raise HTTPException(status_code=404, detail="Input not found")
+    set_entity_validators(response, raw_input, RawInput.updated_at)
     return raw_input
 
 
+@router.get("/{input_id}/audio")
+@query_budget(1)
+def get_input_audio(input_id: int, request: Request, db: Session = Depends(get_read_db)):
+    """Stream a voice input's recording (supports Range requests for seeking)"""
+    row = db.query(RawInput.audio_blob_key, RawInput.audio_url, RawInput.input_metadata).filter(
+        RawInput.id == input_id
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Input not found")
+
+    blob_key, audio_url, metadata = row
+    if blob_key and blob_store.exists(blob_key):
+        media_type = (metadata or {}).get("audio_content_type") or guess_audio_type(audio_url)
+        return BlobResponse(request, blob_key, media_type)
+    if audio_url:
+        # Not copied locally yet; the Telnyx URL may still be live
+        return RedirectResponse(audio_url, status_code=307)
+    raise HTTPException(status_code=404, detail="Input has no audio")
+
+
 @router.get("/user/{user_id}", response_model=List[RawInputResponse])
+@query_budget(2)
 def list_user_inputs(
     user_id: int,
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """List all inputs for a user"""
-    inputs = db.query(RawInput).filter(
+    """List all inputs for a user (`view=summary` or `fields=` to skip transcripts)"""
+    field_names = select_fields(RawInputResponse, INPUT_SUMMARY_FIELDS, view, fields)
+    not_modified = check_collection(
+        request, response, db, RawInput.updated_at, [RawInput.user_id == user_id],
+        "user", user_id, skip, limit, *field_names
+    )
+    if not_modified:
+        return not_modified
+
+    inputs = projected_query(db, RawInput, field_names).filter(
         RawInput.user_id == user_id
-    ).order_by(RawInput.created_at.desc()).offset(skip).limit(limit).all()
-    return inputs
+    ).order_by(RawInput.created_at.desc()).offset(skip).limit(limit)
+    return projected_response(inputs, response)
 
 
 @router.get("/branch/{branch_id}", response_model=List[RawInputResponse])
-def list_branch_inputs(branch_id: int, db: Session = Depends(get_db)):
-    """List all inputs for a specific memory branch"""
-    inputs = db.query(RawInput).filter(
+@query_budget(2)
+def list_branch_inputs(
+    branch_id: int,
+    request: Request,
+    response: Response,
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """List all inputs for a specific memory branch (`view=summary` or `fields=` to skip transcripts)"""
+    field_names = select_fields(RawInputResponse, INPUT_SUMMARY_FIELDS, view, fields)
+    not_modified = check_collection(
+        request, response, db, RawInput.updated_at, [RawInput.memory_branch_id == branch_id],
+        "branch", branch_id, *field_names
+    )
+    if not_modified:
+        return not_modified
+
+    inputs = projected_query(db, RawInput, field_names).filter(
         RawInput.memory_branch_id == branch_id
-    ).order_by(RawInput.created_at.desc()).all()
-    return inputs
+    ).order_by(RawInput.created_at.desc())
+    return projected_response(inputs, response)
 
 
 @router.delete("/{input_id}")
+@query_budget(2)
 def delete_raw_input(input_id: int, db: Session = Depends(get_db)):
     """Delete a raw input"""
     raw_input = db.query(RawInput).filter(RawInput.id == input_id).first()
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.db.profiler import query_budget
+from app.models.database import Job
+from app.schemas.schemas import JobResponse
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+@query_budget(1)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Get a background job's status and progress"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -0,0 +1,99 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from time import perf_counter
+from app.services.metrics import registry, SIZE_BUCKETS
+
+router = APIRouter()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total",
+    "HTTP requests by route, method and status",
+    ("route", "method", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("route", "method"),
+    quantiles=(0.5, 0.95, 0.99)
+)
+HTTP_RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes",
+    "HTTP response body size by route",
+    ("route", "method"),
+    buckets=SIZE_BUCKETS
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ("method",)
+)
+
+# endpoint function -> route template, built once per app
+_route_paths = {}
+
+
+def route_template(scope) -> str:
+    """
+    The matched route path ("/api/v1/stories/{story_id}") rather than the raw URL,
+    so metrics have one series per route instead of one per id
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+
+    app = scope.get("app")
+    paths = _route_paths.get(id(app))
+    if paths is None:
+        paths = _route_paths[id(app)] = {
+            getattr(r, "endpoint", None): r.path for r in getattr(app, "routes", [])
+        }
+    return paths.get(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route counts, latency and response size"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = route_template(scope)
+            HTTP_REQUESTS.inc(route=route, method=method, status=status_code)
+            HTTP_LATENCY.observe(elapsed, route=route, method=method)
+            HTTP_RESPONSE_SIZE.observe(response_size, route=route, method=method)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of all application metrics"""
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
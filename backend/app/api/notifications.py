@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.db.session import get_db
+from app.db.profiler import query_budget
+from app.models.database import User, Notification, NotificationRecipient, NotificationStatus
+from app.schemas.schemas import RecipientCreate, RecipientResponse, NotificationResponse, DeleteResponse
+
+router = APIRouter()
+
+
+@router.post("/recipients", response_model=RecipientResponse)
+@query_budget(3)
+def create_recipient(recipient: RecipientCreate, db: Session = Depends(get_db)):
+    """Text this phone number when the user gets a new story"""
+    if not db.query(User.id).filter(User.id == recipient.user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db_recipient = NotificationRecipient(**recipient.model_dump())
+    db.add(db_recipient)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Phone number already receives this user's notifications")
+    db.refresh(db_recipient)
+    return db_recipient
+
+
+@router.get("/recipients/user/{user_id}", response_model=List[RecipientResponse])
+@query_budget(1)
+def list_recipients(user_id: int, db: Session = Depends(get_db)):
+    return db.query(NotificationRecipient).filter(
+        NotificationRecipient.user_id == user_id
+    ).order_by(NotificationRecipient.id).all()
+
+
+@router.delete("/recipients/{recipient_id}", response_model=DeleteResponse)
+@query_budget(3)
+def delete_recipient(recipient_id: int, db: Session = Depends(get_db)):
+    """Stop notifying a recipient (drops their unsent notifications)"""
+    recipient = db.query(NotificationRecipient).filter(NotificationRecipient.id == recipient_id).first()
+    if not recipient:
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    db.delete(recipient)
+    db.commit()
+    return {"message": "Recipient deleted successfully"}
+
+
+@router.get("/user/{user_id}", response_model=List[NotificationResponse])
+@query_budget(1)
+def list_notifications(
+    user_id: int,
+    status: Optional[NotificationStatus] = None,
+    skip: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Notifications about a user's stories, newest first, with delivery state"""
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if status:
+        query = query.filter(Notification.status == status)
+    return query.order_by(Notification.id.desc()).offset(skip).limit(limit).all()
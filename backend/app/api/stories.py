@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import get_db
+from typing import List, Optional
+from app.db.session import get_db, get_read_db
+from app.db.profiler import query_budget
 from app.models.database import Story, User, MemoryBranch
 from app.schemas.schemas import (
     StoryCreate,
     StoryResponse,
     StoryUpdate,
-    GenerateStoryRequest
+    GenerateStoryRequest,
+    JobResponse,
+    TagCount
 )
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, generate_story_job
+from app.services.job_service import create_job, run_async_job
+from app.services.entity_cache import mark_changed
+from app.services.story_tags import PERSON, THEME, tag_key, tagged_story_criteria, tag_counts
+from app.api.conditional import check_entity, check_collection, CachedEntityRead
+from app.api.projection import select_fields, projected_query, projected_response
 
 router = APIRouter()
 
+# ?view=summary: enough to render a list of stories, without `content`
+STORY_SUMMARY_FIELDS = [
+    "id", "user_id", "memory_branch_id", "title", "summary", "time_period",
+    "version", "parent_story_id", "created_at", "updated_at"
+]
+
 
 @router.post("/", response_model=StoryResponse)
+@query_budget(7)
 def create_story(story: StoryCreate, db: Session = Depends(get_db)):
     """Create a new story"""
     # Verify user exists
@@ -38,38 +53,152 @@ def create_story(story: StoryCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/{story_id}", response_model=StoryResponse)
-def get_story(story_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+def get_story(story_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific story"""
+    cache_read = CachedEntityRead(request, "story", story_id)
+    if cache_read.response:
+        return cache_read.response
+
+    not_modified = check_entity(request, response, db, Story.updated_at, story_id)
+    if not_modified:
+        return not_modified
+
     story = db.query(Story).filter(Story.id == story_id).first()
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
-    return story
+    return cache_read.respond(story, StoryResponse, Story.updated_at)
 
 
 @router.get("/user/{user_id}", response_model=List[StoryResponse])
+@query_budget(2)
 def list_user_stories(
     user_id: int,
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """List all stories for a user"""
-    stories = db.query(Story).filter(
+    """List all stories for a user (`view=summary` or `fields=` to skip large columns)"""
+    field_names = select_fields(StoryResponse, STORY_SUMMARY_FIELDS, view, fields)
+    not_modified = check_collection(
+        request, response, db, Story.updated_at, [Story.user_id == user_id],
+        "user", user_id, skip, limit, *field_names
+    )
+    if not_modified:
+        return not_modified
+
+    stories = projected_query(db, Story, field_names).filter(
         Story.user_id == user_id
-    ).order_by(Story.created_at.desc()).offset(skip).limit(limit).all()
-    return stories
+    ).order_by(Story.created_at.desc()).offset(skip).limit(limit)
+    return projected_response(stories, response)
+
+
+@router.get("/user/{user_id}/people", response_model=List[TagCount])
+@query_budget(1)
+def list_user_people(user_id: int, limit: int = 100, db: Session = Depends(get_read_db)):
+    """People in a user's stories, most frequent first (maintained counts, no story scan)"""
+    return tag_counts(db, user_id, PERSON, limit)
+
+
+@router.get("/user/{user_id}/themes", response_model=List[TagCount])
+@query_budget(1)
+def list_user_themes(user_id: int, limit: int = 100, db: Session = Depends(get_read_db)):
+    """Themes of a user's stories, most frequent first"""
+    return tag_counts(db, user_id, THEME, limit)
+
+
+def _list_tagged_stories(
+    request: Request,
+    response: Response,
+    db: Session,
+    user_id: int,
+    kind: str,
+    name: str,
+    skip: int,
+    limit: int,
+    view: str,
+    fields: Optional[str]
+):
+    field_names = select_fields(StoryResponse, STORY_SUMMARY_FIELDS, view, fields)
+    criteria = tagged_story_criteria(user_id, kind, name)
+    not_modified = check_collection(
+        request, response, db, Story.updated_at, criteria,
+        "user", user_id, kind, tag_key(kind, name), skip, limit, *field_names
+    )
+    if not_modified:
+        return not_modified
+
+    stories = projected_query(db, Story, field_names).filter(*criteria).order_by(
+        Story.created_at.desc()
+    ).offset(skip).limit(limit)
+    return projected_response(stories, response)
+
+
+@router.get("/user/{user_id}/people/{name}", response_model=List[StoryResponse])
+@query_budget(2)
+def list_stories_mentioning(
+    user_id: int,
+    name: str,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """A user's stories mentioning a person ("Aunt Rose", "my aunt rose" and "aunt rose." match)"""
+    return _list_tagged_stories(request, response, db, user_id, PERSON, name, skip, limit, view, fields)
+
+
+@router.get("/user/{user_id}/themes/{theme}", response_model=List[StoryResponse])
+@query_budget(2)
+def list_stories_with_theme(
+    user_id: int,
+    theme: str,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """A user's stories with a theme"""
+    return _list_tagged_stories(request, response, db, user_id, THEME, theme, skip, limit, view, fields)
 
 
 @router.get("/branch/{branch_id}", response_model=List[StoryResponse])
-def list_branch_stories(branch_id: int, db: Session = Depends(get_db)):
-    """List all stories for a specific memory branch"""
-    stories = db.query(Story).filter(
+@query_budget(2)
+def list_branch_stories(
+    branch_id: int,
+    request: Request,
+    response: Response,
+    view: str = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """List all stories for a specific memory branch (`view=summary` or `fields=` to skip large columns)"""
+    field_names = select_fields(StoryResponse, STORY_SUMMARY_FIELDS, view, fields)
+    not_modified = check_collection(
+        request, response, db, Story.updated_at, [Story.memory_branch_id == branch_id],
+        "branch", branch_id, *field_names
+    )
+    if not_modified:
+        return not_modified
+
+    stories = projected_query(db, Story, field_names).filter(
         Story.memory_branch_id == branch_id
-    ).order_by(Story.created_at.desc()).all()
-    return stories
+    ).order_by(Story.created_at.desc())
+    return projected_response(stories, response)
 
 
 @router.put("/{story_id}", response_model=StoryResponse)
+@query_budget(10)
 def update_story(
     story_id: int,
     story_update: StoryUpdate,
@@ -91,18 +220,22 @@ def update_story(
 
 
 @router.delete("/{story_id}")
+@query_budget(5)
 def delete_story(story_id: int, db: Session = Depends(get_db)):
     """Delete a story"""
     story = db.query(Story).filter(Story.id == story_id).first()
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
 
+    # Later versions keep existing; the database sets their parent_story_id to NULL
+    mark_changed(db, "story", [row[0] for row in db.query(Story.id).filter(Story.parent_story_id == story_id)])
     db.delete(story)
     db.commit()
     return {"message": "Story deleted successfully"}
 
 
 @router.post("/generate", response_model=StoryResponse)
+@query_budget(10)  # + notification recipients and their events
 async def generate_story(
     request: GenerateStoryRequest,
     db: Session = Depends(get_db)
@@ -113,6 +246,23 @@ async def generate_story(
         user_id=request.user_id,
         input_ids=request.input_ids,
         memory_branch_id=request.memory_branch_id,
-        style=request.style
+        style=request.style,
+        collapse_duplicates=request.collapse_duplicates
     )
     return story
+
+
+@router.post("/generate/jobs", response_model=JobResponse, status_code=202)
+@query_budget(2)
+def start_story_generation(
+    request: GenerateStoryRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Generate a story in the background; poll GET /jobs/{job_id} (result: {"story_id": ...})"""
+    job = create_job(db, "generate_story", params=request.model_dump())
+    background_tasks.add_task(run_async_job, job.id, generate_story_job(**request.model_dump()))
+    # Dependencies are closed only after background tasks finish; don't keep the
+    # connection create_job's refresh checked out for the whole generation
+    db.close()
+    return job
@@ -1,20 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import get_db
+from typing import List, Optional
+from app.db.session import get_db, get_read_db
+from app.db.profiler import query_budget
 from app.models.database import User
-from app.schemas.schemas import UserCreate, UserResponse
+from app.db.config import settings
+from app.schemas.schemas import UserCreate, UserUpdate, UserResponse, DeleteResponse, TimelinePage
+from app.services.deletion_service import user_dependents, delete_user_now, delete_user_job
+from app.services.job_service import create_job, run_job
+from app.services.timeline import timeline_page
+from app.api.conditional import (
+    check_entity,
+    check_collection,
+    entity_etag,
+    not_modified_response,
+    CachedEntityRead
+)
 
 router = APIRouter()
 
 
 @router.post("/", response_model=UserResponse)
+@query_budget(3)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user"""
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    # Check if email or phone number already exists
+    conditions = [User.email == user.email]
+    if user.phone_number:
+        conditions.append(User.phone_number == user.phone_number)
+    existing_user = db.query(User).filter(or_(*conditions)).first()
     if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
+        if existing_user.email == user.email:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        raise HTTPException(status_code=400, detail="Phone number already registered")
 
     db_user = User(**user.model_dump())
     db.add(db_user)
@@ -24,25 +43,107 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+def get_user(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get user by ID"""
+    cache_read = CachedEntityRead(request, "user", user_id)
+    if cache_read.response:
+        return cache_read.response
+
+    not_modified = check_entity(request, response, db, User.updated_at, user_id)
+    if not_modified:
+        return not_modified
+
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    return cache_read.respond(user, UserResponse, User.updated_at)
+
+
+@router.put("/{user_id}", response_model=UserResponse)
+@query_budget(6)
+def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db)):
+    """Update name or birth year (a new birth year re-places life stages on the timeline)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    for field, value in user_update.model_dump(exclude_unset=True).items():
+        setattr(user, field, value)
+
+    db.commit()
+    db.refresh(user)
     return user
 
 
+@router.get("/{user_id}/timeline", response_model=TimelinePage)
+@query_budget(1)
+def get_user_timeline(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_undated: bool = True,
+    db: Session = Depends(get_read_db)
+):
+    """A user's stories across all branches in chronological order (undated last), cursor-paged"""
+    try:
+        entries, next_cursor = timeline_page(db, user_id, limit, cursor, include_undated)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"entries": entries, "next_cursor": next_cursor}
+
+
 @router.get("/", response_model=List[UserResponse])
-def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@query_budget(2)
+def list_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
     """List all users"""
+    not_modified = check_collection(request, response, db, User.updated_at, [], "all", skip, limit)
+    if not_modified:
+        return not_modified
+
     users = db.query(User).offset(skip).limit(limit).all()
     return users
 
 
 @router.get("/email/{email}", response_model=UserResponse)
-def get_user_by_email(email: str, db: Session = Depends(get_db)):
+@query_budget(1)
+def get_user_by_email(email: str, request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get user by email"""
     user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    # Not addressable by id, so the row has to be loaded; still skip serialization
+    not_modified = not_modified_response(
+        request, response, entity_etag(User, user.id, user.updated_at), user.updated_at
+    )
+    return not_modified or user
+
+
+@router.delete("/{user_id}", response_model=DeleteResponse)
+@query_budget(5)
+def delete_user(
+    user_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Delete a user and all their branches, inputs and stories (large accounts: 202 + background job)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    dependents = user_dependents(db, user_id)
+    if dependents > settings.DELETE_INLINE_MAX_ROWS:
+        job = create_job(db, "delete_user", params={"user_id": user_id}, total=dependents + 1)
+        background_tasks.add_task(run_job, job.id, delete_user_job(user_id))
+        response.status_code = 202
+        return {"message": "User deletion started", "job_id": job.id}
+
+    delete_user_now(db, user)
+    return {"message": "User deleted successfully"}
@@ -1,83 +1,262 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from typing import Dict, Optional, Tuple
+from app.db.session import get_db, SessionLocal
+from app.db.profiler import query_budget
 from app.models.database import RawInput, InputType
 from app.schemas.schemas import VoiceInputWebhook
 from app.services.telnyx_service import TelnyxService
+from app.services.phone_service import resolve_user_id, try_normalize_phone_number
+from app.services.dedup_service import flag_duplicate, duplicate_index
+from app.services.enrichment_service import enrich_later
+from app.services.webhook_queue import webhook_queue, QueueConsumer, QueuedEvent, DropEvent, REJECTED
+from app.services.campaign_service import record_call_event, CALL_EVENTS
+from app.services.notification_service import record_message_event, MESSAGE_EVENTS
+from app.api.blobs import guess_audio_type
 from app.db.config import settings
 
 router = APIRouter()
-telnyx_service = TelnyxService(api_key=settings.TELNYX_API_KEY)
+telnyx_service = TelnyxService(api_key=settings.TELNYX_API_KEY, api_base=settings.TELNYX_API_BASE)
+
+
+WEBHOOK_CONSUMER = "voice"
+
+# One handler per recording at a time in this process (redeliveries can land in the same batch);
+# the consumer lease keeps other workers out
+_recording_locks: Dict[Tuple[str, str], list] = {}  # key -> [lock, handlers using it]
 
 
 @router.post("/webhook")
+@query_budget(3)
 async def telnyx_webhook(
-    webhook_data: dict,
+    request: Request,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
     Webhook endpoint for Telnyx voice events
-    Handles call recordings and transcriptions
+    Appends the event to the local queue and returns (recordings are
+    transcribed by the queue consumer); 503 + Retry-After when it's backed up
     """
-    event_type = webhook_data.get("data", {}).get("event_type")
+    body = await request.body()
+    try:
+        webhook_data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(webhook_data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    event_type = (webhook_data.get("data") or {}).get("event_type")
+
+    if webhook_queue is not None:
+        if webhook_queue.is_overloaded(WEBHOOK_CONSUMER):
+            return _busy()
+        try:
+            offset = await webhook_queue.append(body, event_type)
+        except Exception as e:
+            print(f"Error queueing webhook: {e}")
+            return _busy()
+        return {"status": "queued", "offset": offset}
 
+    # Inline processing (WEBHOOK_QUEUE_ENABLED=False)
     if event_type == "call.recording.saved":
-        # Process recording
         call_data = webhook_data.get("data", {}).get("payload", {})
-        call_id = call_data.get("call_control_id")
-        recording_urls = call_data.get("recording_urls", {})
-        recording_url = recording_urls.get("mp3") or recording_urls.get("wav")
-
-        if recording_url:
-            # Transcribe in background
-            background_tasks.add_task(
-                process_voice_recording,
-                call_id=call_id,
-                recording_url=recording_url,
-                db=db
-            )
-
+        background_tasks.add_task(process_recording_inline, call_data)
         return {"status": "processing"}
 
-    elif event_type == "call.answered":
-        # Handle answered call
+    if event_type in CALL_EVENTS:
+        # Campaign calls track their state from these
+        background_tasks.add_task(record_call_event, db, event_type, webhook_data.get("data", {}).get("payload", {}))
+
+    elif event_type in MESSAGE_EVENTS:
+        # SMS delivery receipts
+        background_tasks.add_task(record_message_event, db, event_type, webhook_data.get("data", {}).get("payload", {}))
+        return {"status": "delivery_recorded"}
+
+    if event_type == "call.answered":
         return {"status": "call_answered"}
 
     elif event_type == "call.hangup":
-        # Handle call hangup
         return {"status": "call_ended"}
 
     return {"status": "received"}
 
 
-async def process_voice_recording(call_id: str, recording_url: str, db: Session):
-    """Background task to transcribe voice recording"""
-    try:
-        # Transcribe audio using Telnyx or external service
-        transcription_result = await telnyx_service.transcribe_audio(recording_url)
-
-        # Create raw input with transcription
-        raw_input = RawInput(
-            user_id=1,  # TODO: Map phone number to user_id
-            input_type=InputType.VOICE,
-            telnyx_call_id=call_id,
-            audio_url=recording_url,
-            raw_text=transcription_result["text"],
-            transcript_confidence=transcription_result.get("confidence", 0),
-            metadata={
-                "duration": transcription_result.get("duration"),
-                "language": transcription_result.get("language", "en")
-            }
+def _busy() -> JSONResponse:
+    REJECTED.inc()
+    return JSONResponse(
+        status_code=503,
+        content={"status": "busy"},
+        headers={"Retry-After": str(settings.WEBHOOK_QUEUE_RETRY_AFTER)}
+    )
+
+
+async def process_recording_event(call_data: dict):
+    recording_urls = call_data.get("recording_urls", {})
+    recording_url = recording_urls.get("mp3") or recording_urls.get("wav")
+    if recording_url:
+        await process_voice_recording(
+            call_id=call_data.get("call_control_id"),
+            recording_url=recording_url,
+            from_number=call_data.get("from"),
+            to_number=call_data.get("to")
         )
 
-        db.add(raw_input)
-        db.commit()
 
+async def process_recording_inline(call_data: dict):
+    """Without the queue there's nothing to retry from: log and move on"""
+    try:
+        await process_recording_event(call_data)
     except Exception as e:
         print(f"Error processing voice recording: {e}")
 
 
+async def handle_webhook_event(event: QueuedEvent):
+    """Queue consumer handler: one stored webhook (DB work in short sessions of its own, off the event loop)"""
+    if event.event_type != "call.recording.saved" and event.event_type not in CALL_EVENTS | MESSAGE_EVENTS:
+        return
+    call_data = json.loads(event.payload).get("data", {}).get("payload", {})
+    if event.event_type in CALL_EVENTS:
+        await asyncio.to_thread(_in_session, record_call_event, event.event_type, call_data)
+    elif event.event_type in MESSAGE_EVENTS:
+        await asyncio.to_thread(_in_session, record_message_event, event.event_type, call_data)
+    else:
+        await process_recording_event(call_data)
+
+
+def _in_session(function, *args):
+    """function(db, *args) in a session of its own; for asyncio.to_thread"""
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        return function(db, *args)
+    finally:
+        db.close()
+
+
+webhook_consumer = QueueConsumer(
+    webhook_queue,
+    WEBHOOK_CONSUMER,
+    handle_webhook_event,
+    batch_size=settings.WEBHOOK_CONSUMER_BATCH_SIZE,
+    concurrency=settings.WEBHOOK_CONSUMER_CONCURRENCY,
+    retention_seconds=settings.WEBHOOK_QUEUE_RETENTION_HOURS * 3600,
+    max_attempts=settings.WEBHOOK_CONSUMER_MAX_ATTEMPTS,
+    retry_backoff=settings.WEBHOOK_CONSUMER_RETRY_BACKOFF
+) if webhook_queue is not None else None
+
+
+def resolve_caller(db: Session, from_number: Optional[str], to_number: Optional[str]) -> Optional[int]:
+    """
+    Find the user on the other end of a call
+    Inbound calls come from the user; outbound calls we placed go to the user.
+    """
+    own_number = try_normalize_phone_number(settings.TELNYX_PHONE_NUMBER)
+    for number in (from_number, to_number):
+        if number and try_normalize_phone_number(number) != own_number:
+            user_id = resolve_user_id(db, number)
+            if user_id is not None:
+                return user_id
+    return None
+
+
+async def process_voice_recording(
+    call_id: str,
+    recording_url: str,
+    from_number: Optional[str] = None,
+    to_number: Optional[str] = None
+):
+    """
+    Transcribe a voice recording into a raw input (once per recording: webhooks can be redelivered or replayed)
+    No session is held while downloading and transcribing. Raises DropEvent
+    when no user matches the call; other errors propagate so the queue retries them.
+    """
+    key = (call_id, recording_url)
+    entry = _recording_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            await _process_voice_recording(call_id, recording_url, from_number, to_number)
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _recording_locks[key]
+
+
+async def _process_voice_recording(
+    call_id: str,
+    recording_url: str,
+    from_number: Optional[str],
+    to_number: Optional[str]
+):
+    stored, user_id = await asyncio.to_thread(_in_session, _lookup_recording, call_id, recording_url, from_number, to_number)
+    if stored:
+        return
+    if user_id is None:
+        raise DropEvent(f"no user for caller {from_number} (call {call_id})")
+
+    # Keep our own copy: Telnyx recording URLs expire
+    blob = await telnyx_service.download_recording(recording_url)
+
+    # Transcribe audio using Telnyx or external service
+    transcription_result = await telnyx_service.transcribe_audio(recording_url, audio_blob_key=blob.key)
+
+    # Create raw input with transcription
+    raw_input = RawInput(
+        user_id=user_id,
+        input_type=InputType.VOICE,
+        telnyx_call_id=call_id,
+        audio_url=recording_url,
+        audio_blob_key=blob.key,
+        raw_text=transcription_result["text"],
+        transcript_confidence=transcription_result.get("confidence", 0),
+        input_metadata={
+            "duration": transcription_result.get("duration"),
+            "language": transcription_result.get("language", "en"),
+            "audio_size": blob.size,
+            "audio_content_type": guess_audio_type(recording_url)
+        }
+    )
+    if not await asyncio.to_thread(_in_session, _store_recording, raw_input):
+        return
+    if settings.ENRICH_ON_INGEST:
+        # Not awaited: the webhook task (or queue consumer) moves on to the next event
+        enrich_later([raw_input.id])
+
+
+def _recording_stored(db: Session, call_id: str, recording_url: str) -> bool:
+    return db.query(RawInput.id).filter(
+        RawInput.telnyx_call_id == call_id,
+        RawInput.audio_url == recording_url
+    ).first() is not None
+
+
+def _lookup_recording(
+    db: Session,
+    call_id: str,
+    recording_url: str,
+    from_number: Optional[str],
+    to_number: Optional[str]
+) -> Tuple[bool, Optional[int]]:
+    """(already stored, user id)"""
+    if _recording_stored(db, call_id, recording_url):
+        return True, None
+    return False, resolve_caller(db, from_number, to_number)
+
+
+def _store_recording(db: Session, raw_input: RawInput) -> bool:
+    """Insert the transcribed input; False if the recording was stored meanwhile"""
+    if _recording_stored(db, raw_input.telnyx_call_id, raw_input.audio_url):
+        return False
+    signature = flag_duplicate(db, raw_input)
+    db.add(raw_input)
+    db.commit()
+    if signature is not None:
+        duplicate_index.record(raw_input, signature)
+    return True
+
+
 @router.post("/call/initiate")
 async def initiate_call(phone_number: str, user_id: int):
     """Initiate an outbound call to collect stories"""
@@ -1,4 +1,4 @@
-from app.db.session import get_db, SessionLocal, engine
+from app.db.session import get_db, get_read_db, SessionLocal, engine
 from app.db.config import settings
 
-__all__ = ["get_db", "SessionLocal", "engine", "settings"]
+__all__ = ["get_db", "get_read_db", "SessionLocal", "engine", "settings"]
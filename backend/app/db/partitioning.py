@@ -0,0 +1,81 @@
+"""
+Hash partitioning of raw_inputs and stories by user_id (PostgreSQL)
+With DB_USER_PARTITIONS=N on PostgreSQL both tables are created
+PARTITION BY HASH (user_id) with N partitions (raw_inputs_p0 .. _pN-1).
+Every hot query is scoped by user_id, so the planner reads one partition:
+smaller indexes, vacuum per partition, and a user's rows stay together.
+
+A partitioned table's unique constraints must include the partition key, so
+the primary key becomes (id, user_id) (the ORM still identifies rows by id,
+which the sequence keeps unique) and foreign keys to these tables reference
+(id, user_id). Self references (stories.parent_story_id,
+raw_inputs.duplicate_of_id) use ON DELETE SET NULL (column), PostgreSQL 15+.
+
+Existing plain tables are converted online by scripts/partition_tables.py.
+"""
+from typing import List, Set
+from sqlalchemy import text
+from app.db.config import settings
+
+PARTITIONED_TABLES = ("raw_inputs", "stories")
+USER_PARTITIONS = settings.DB_USER_PARTITIONS if settings.DATABASE_URL.startswith("postgresql") else 0
+
+# Added as DDL: SQLAlchemy can't emit SET NULL with a column list
+SELF_REFERENCES = {
+    "raw_inputs": "duplicate_of_id",
+    "stories": "parent_story_id",
+}
+
+
+def partition_name(table: str, remainder: int) -> str:
+    return f"{table}_p{remainder}"
+
+
+def create_partitions_sql(parent: str, partitions: int, table: str = None) -> List[str]:
+    """CREATE TABLE statements for the hash partitions of `parent` (named after `table`, default parent)"""
+    return [
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table or parent, remainder)} PARTITION OF {parent} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+
+
+def self_reference_sql(table: str, referenced: str = None, not_valid: bool = False) -> str:
+    """FK of a partitioned table's (or a partition's) self reference column to `referenced` (default: table)"""
+    column = SELF_REFERENCES[referenced or table]
+    return (
+        f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}, user_id) "
+        f"REFERENCES {referenced or table} (id, user_id) ON DELETE SET NULL ({column})"
+        + (" NOT VALID" if not_valid else "")
+    )
+
+
+def create_partitions(table, connection, **kw):
+    """after_create listener: partitions and the self reference of a new partitioned table"""
+    if connection.dialect.name != "postgresql":
+        return
+    for statement in create_partitions_sql(table.name, USER_PARTITIONS):
+        connection.execute(text(statement))
+    connection.execute(text(self_reference_sql(table.name)))
+
+
+def partitioned_tables(connection) -> Set[str]:
+    """Tables that are partitioned in the database (PostgreSQL)"""
+    if connection.dialect.name != "postgresql":
+        return set()
+    return set(connection.execute(text(
+        "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE pg_table_is_visible(c.oid)"
+    )).scalars())
+
+
+def relations_in_plan(plan) -> Set[str]:
+    """Tables and partitions an EXPLAIN (FORMAT JSON) plan reads"""
+    relations = set()
+    nodes = [plan[0]["Plan"] if isinstance(plan, list) else plan]
+    while nodes:
+        node = nodes.pop()
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return relations
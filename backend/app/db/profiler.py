@@ -0,0 +1,190 @@
+"""
+Per-request SQL profiling
+Counts queries and DB time per request using SQLAlchemy cursor events, flags
+repeated statement shapes (N+1 patterns) and slow queries, and reports them in
+an X-DB-Profile response header (DEBUG only) and a structured log line.
+
+Endpoints can declare a query budget with @query_budget(n). With
+SQL_QUERY_BUDGET_STRICT enabled (test mode) a request that goes over its
+budget gets a 500 naming the budget instead of its response, which fails the
+endpoint test. The check runs when the body starts, so queries issued while
+a streaming body is sent aren't counted against it.
+"""
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.db.config import settings
+from app.api.metrics import route_template
+
+logger = logging.getLogger("app.sql_profiler")
+
+_current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("sql_profile", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_statement(statement: str) -> str:
+    """Reduce a SQL statement to its shape: literals and parameter lists collapsed"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return shape[:500]
+
+
+class QueryProfile:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+        self.slow: List[Tuple[float, str]] = []
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        shape = normalize_statement(statement)
+        self.shapes[shape] += 1
+        if elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+            self.slow.append((elapsed, shape))
+
+    def repeated_shapes(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times (likely N+1)"""
+        threshold = threshold or settings.SQL_N_PLUS_ONE_THRESHOLD
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def header_value(self) -> str:
+        return (
+            f"queries={self.queries}; time_ms={self.db_time * 1000:.1f}; "
+            f"repeated={len(self.repeated_shapes())}; slow={len(self.slow)}"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "queries": self.queries,
+            "db_time_ms": round(self.db_time * 1000, 2),
+            "repeated": [{"statement": shape, "count": count} for shape, count in self.repeated_shapes()],
+            "slow": [{"statement": shape, "ms": round(elapsed * 1000, 2)} for elapsed, shape in self.slow]
+        }
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    starts = conn.info.get("query_start")
+    if profile is not None and starts:
+        profile.record(statement, perf_counter() - starts.pop())
+
+
+@contextmanager
+def profile_queries(label: str = ""):
+    """Profile every query issued in this context (and threads/tasks spawned from it)"""
+    profile = QueryProfile(label)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, label: str = ""):
+    """Fail if the block issues more than max_queries queries"""
+    with profile_queries(label) as profile:
+        yield profile
+    if profile.queries > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label or 'block'} issued {profile.queries} queries (budget {max_queries}): "
+            f"{json.dumps(profile.to_dict())}"
+        )
+
+
+def query_budget(max_queries: int):
+    """Declare the maximum number of queries an endpoint may issue"""
+    def decorator(endpoint):
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+    return decorator
+
+
+class SQLProfilerMiddleware:
+    """Pure ASGI middleware that profiles the queries issued by each request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(f"{scope['method']} {scope['path']}") as profile:
+            held = {}  # http.response.start, until the body shows the endpoint is done
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    held["start"] = message
+                    return
+                if "start" in held:
+                    start = held.pop("start")
+                    error = self._budget_error(scope, profile)
+                    if error and settings.SQL_QUERY_BUDGET_STRICT:
+                        held["rejected"] = True
+                        await send({"type": "http.response.start", "status": 500,
+                                    "headers": [(b"content-type", b"application/json")]})
+                        await send({"type": "http.response.body", "body": json.dumps({"detail": error}).encode()})
+                        return
+                    if settings.DEBUG:
+                        headers = list(start.get("headers", []))
+                        headers.append((b"x-db-profile", profile.header_value().encode()))
+                        start = {**start, "headers": headers}
+                    await send(start)
+                if held.get("rejected"):
+                    return
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        self._report(scope, profile)
+
+    @staticmethod
+    def _budget_error(scope, profile: QueryProfile) -> Optional[str]:
+        budget = getattr(scope.get("endpoint"), "__query_budget__", None)
+        if budget is None or profile.queries <= budget:
+            return None
+        return f"{route_template(scope)} issued {profile.queries} queries (budget {budget})"
+
+    def _report(self, scope, profile: QueryProfile):
+        route = route_template(scope)
+        budget = getattr(scope.get("endpoint"), "__query_budget__", None)
+        over_budget = budget is not None and profile.queries > budget
+        flagged = over_budget or profile.slow or profile.repeated_shapes()
+
+        record = {"event": "sql_profile", "route": route, "budget": budget, **profile.to_dict()}
+        if flagged:
+            logger.warning(json.dumps(record))
+        else:
+            logger.debug(json.dumps(record))
@@ -0,0 +1,194 @@
+"""
+Read replica routing
+get_read_db sends read-only endpoints to a healthy replica (round-robin),
+falling back to the primary when:
+- no replica is configured or healthy (health/lag probed every
+  REPLICA_HEALTH_CHECK_INTERVAL seconds in a background thread)
+- the client asks for it: `X-Consistency: strong`
+- the client wrote recently (read-your-writes): every commit on the primary
+  stamps `X-Consistency: <commit time>` on the response. Clients that send
+  it back within READ_YOUR_WRITES_SECONDS read from the primary, whichever
+  worker they reach. Endpoints with a `user_id` path parameter also stick to
+  the primary when this worker saw that user write recently.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.db.config import settings
+from app.services.metrics import registry
+
+DB_READ_ROUTES = registry.counter(
+    "db_read_routes_total",
+    "Read-only sessions by engine and routing reason",
+    ("engine", "reason")
+)
+DB_REPLICA_HEALTHY = registry.gauge(
+    "db_replica_healthy",
+    "1 if the replica passed its last health check",
+    ("engine",)
+)
+DB_REPLICA_LAG = registry.gauge(
+    "db_replica_lag_seconds",
+    "Replication lag measured by the last health check",
+    ("engine",)
+)
+
+# 0 when the standby has replayed everything it received (an idle primary
+# doesn't advance pg_last_xact_replay_timestamp), and on non-standbys
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self._sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def session(self) -> Session:
+        return self._sessionmaker()
+
+    def check(self, max_lag: float):
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            healthy = self.lag <= max_lag
+        except Exception as e:
+            if self.healthy:
+                print(f"Replica {self.name} failed health check: {e}")
+            healthy = False
+        self.healthy = healthy
+        DB_REPLICA_HEALTHY.set(1 if healthy else 0, engine=self.name)
+        DB_REPLICA_LAG.set(self.lag, engine=self.name)
+
+
+class WriteTracker:
+    """user_id -> time of their last committed write, in this process"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._writes: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_ids: Iterable[int]):
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                self._writes[user_id] = now
+            if len(self._writes) > 10000:
+                cutoff = now - self.window
+                self._writes = {u: t for u, t in self._writes.items() if t >= cutoff}
+
+    def wrote_recently(self, user_id: int) -> bool:
+        written = self._writes.get(user_id)
+        return written is not None and time.monotonic() - written < self.window
+
+
+write_tracker = WriteTracker(settings.READ_YOUR_WRITES_SECONDS)
+
+
+class ReadRouter:
+    def __init__(self, replicas: List[Replica], check_interval: float, max_lag: float):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._round_robin = itertools.count()
+        self._checker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def route(self, request: Request) -> Optional[Replica]:
+        """Replica to read from, or None for the primary"""
+        reason = self._primary_reason(request)
+        replica = None if reason else self._next_healthy()
+        if replica is None:
+            DB_READ_ROUTES.inc(engine="primary", reason=reason or "no_healthy_replica")
+            return None
+        DB_READ_ROUTES.inc(engine=replica.name, reason="read")
+        return replica
+
+    def _primary_reason(self, request: Request) -> Optional[str]:
+        if not self.replicas:
+            return "no_replicas"
+        consistency = request.headers.get("x-consistency", "").strip()
+        if consistency == "strong":
+            return "requested"
+        if consistency:
+            try:
+                if time.time() - float(consistency) < settings.READ_YOUR_WRITES_SECONDS:
+                    return "recent_write"
+            except ValueError:
+                pass
+        user_id = request.path_params.get("user_id")
+        if user_id is not None and str(user_id).isdigit() and write_tracker.wrote_recently(int(user_id)):
+            return "recent_write"
+        return None
+
+    def _next_healthy(self) -> Optional[Replica]:
+        self._ensure_checker()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.check(self.max_lag)
+
+    def _ensure_checker(self):
+        if self._checker is not None:
+            return
+        with self._lock:
+            if self._checker is None:
+                # First probe inline so no request is routed to a replica that was never checked
+                self.check_all()
+                self._checker = threading.Thread(target=self._check_loop, name="replica-health", daemon=True)
+                self._checker.start()
+
+    def _check_loop(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.check_all()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_writers(session, flush_context):
+    writers = session.info.setdefault("written_user_ids", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        # By table name: importing the models here would be circular (they read settings via app.db)
+        user_id = obj.id if getattr(obj, "__tablename__", None) == "users" else getattr(obj, "user_id", None)
+        if user_id is not None:
+            writers.add(user_id)
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_writes(session):
+    writers = session.info.pop("written_user_ids", None)
+    if writers:
+        write_tracker.mark(writers)
+    if session.info.pop("wrote", False):
+        response = session.info.get("response")
+        if response is not None:
+            response.headers["X-Consistency"] = f"{time.time():.3f}"
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_writes(session):
+    session.info.pop("written_user_ids", None)
+    session.info.pop("wrote", None)
@@ -1,20 +1,104 @@
-from sqlalchemy import create_engine
+from time import perf_counter
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.db.config import settings
+from app.db.replicas import Replica, ReadRouter
+from app.services.metrics import registry
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ("engine",)
 )
+DB_POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections",
+    "Connection pool state",
+    ("engine", "state")
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    metrics_name = "primary"
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(perf_counter() - start, engine=self.metrics_name)
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores FOREIGN KEY clauses (and ON DELETE CASCADE) unless asked per connection
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+def create_instrumented_engine(url: str, name: str) -> Engine:
+    """Engine whose pool metrics are labelled engine=<name>"""
+    # A subclass per engine: pools are re-created from their class on dispose()
+    poolclass = type(f"{InstrumentedQueuePool.__name__}_{name}", (InstrumentedQueuePool,), {"metrics_name": name})
+    new_engine = create_engine(
+        url,
+        poolclass=poolclass,
+        pool_pre_ping=True,
+        pool_size=10,
+        max_overflow=20
+    )
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", _enable_sqlite_foreign_keys)
+    return new_engine
+
+
+engine = create_instrumented_engine(settings.DATABASE_URL, "primary")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replicas (DATABASE_REPLICA_URLS); listing endpoints read from these via get_read_db
+replicas = [
+    Replica(f"replica{i}", create_instrumented_engine(url, f"replica{i}"))
+    for i, url in enumerate(settings.replica_urls, start=1)
+]
+read_router = ReadRouter(
+    replicas,
+    check_interval=settings.REPLICA_HEALTH_CHECK_INTERVAL,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS
+)
 
-def get_db():
-    """Dependency for getting database sessions"""
+
+def _collect_pool_metrics():
+    for name, pool in [("primary", engine.pool)] + [(r.name, r.engine.pool) for r in replicas]:
+        DB_POOL_CONNECTIONS.set(pool.size(), engine=name, state="size")
+        DB_POOL_CONNECTIONS.set(pool.checkedout(), engine=name, state="checked_out")
+        DB_POOL_CONNECTIONS.set(pool.checkedin(), engine=name, state="idle")
+        DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), engine=name, state="overflow")
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+def get_db(response: Response):
+    """Dependency for getting database sessions (primary)"""
     db = SessionLocal()
+    # Commits stamp X-Consistency on the response (see db/replicas.py)
+    db.info["response"] = response
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Dependency for read-only endpoints: a replica session when one is healthy
+    and the caller hasn't written recently, otherwise the primary
+    """
+    replica = read_router.route(request)
+    db = replica.session() if replica else SessionLocal()
     try:
         yield db
     finally:
@@ -1,9 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import users, inputs, stories, branches, voice
+from app.api import users, inputs, stories, branches, voice, metrics, jobs, campaigns, notifications
+from app.api.metrics import MetricsMiddleware
+from app.api.blobs import MediaGZipMiddleware
+from app.db.profiler import SQLProfilerMiddleware
 from app.db.config import settings
 from app.models.database import Base
 from app.db.session import engine
+from app.services.campaign_service import campaign_dispatcher
+from app.services.notification_service import notification_dispatcher
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -21,14 +26,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Consistency"],  # readable by browser clients
 )
 
+# Compress larger responses (story and transcript listings) for clients that accept gzip;
+# recordings are served as-is so Range requests stay byte-accurate
+app.add_middleware(MediaGZipMiddleware, minimum_size=1000)
+
+# Per-request SQL query counts, N+1 and slow query detection
+if settings.SQL_PROFILING:
+    app.add_middleware(SQLProfilerMiddleware)
+
+# Per-route request metrics, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(users.router, prefix=f"/api/{settings.API_VERSION}/users", tags=["users"])
 app.include_router(branches.router, prefix=f"/api/{settings.API_VERSION}/branches", tags=["branches"])
 app.include_router(inputs.router, prefix=f"/api/{settings.API_VERSION}/inputs", tags=["inputs"])
 app.include_router(stories.router, prefix=f"/api/{settings.API_VERSION}/stories", tags=["stories"])
 app.include_router(voice.router, prefix=f"/api/{settings.API_VERSION}/voice", tags=["voice"])
+app.include_router(jobs.router, prefix=f"/api/{settings.API_VERSION}/jobs", tags=["jobs"])
+app.include_router(campaigns.router, prefix=f"/api/{settings.API_VERSION}/campaigns", tags=["campaigns"])
+app.include_router(notifications.router, prefix=f"/api/{settings.API_VERSION}/notifications", tags=["notifications"])
+app.include_router(metrics.router, tags=["metrics"])
+
+
+@app.on_event("startup")
+async def start_webhook_consumer():
+    # Every worker runs one; the queue's lease lets a single worker drain at a time
+    if voice.webhook_consumer is not None and settings.WEBHOOK_CONSUMER_ENABLED:
+        voice.webhook_consumer.start()
+
+
+@app.on_event("shutdown")
+async def stop_webhook_consumer():
+    if voice.webhook_consumer is not None:
+        await voice.webhook_consumer.stop()
+        voice.webhook_queue.close()
+
+
+@app.on_event("startup")
+async def start_campaign_dispatcher():
+    if settings.CAMPAIGN_DISPATCHER_ENABLED:
+        campaign_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_campaign_dispatcher():
+    await campaign_dispatcher.stop()
+
+
+@app.on_event("startup")
+async def start_notification_dispatcher():
+    if settings.NOTIFY_DISPATCHER_ENABLED:
+        notification_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_notification_dispatcher():
+    await notification_dispatcher.stop()
 
 
 @app.get("/")
@@ -1,12 +1,34 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum
+from sqlalchemy import (
+    Column, Integer, Float, String, Text, DateTime, ForeignKey, ForeignKeyConstraint, JSON, Enum, LargeBinary, Index,
+    UniqueConstraint, event
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, backref, column_property
 from datetime import datetime
 import enum
+from app.db.partitioning import USER_PARTITIONS, create_partitions
 
 Base = declarative_base()
 
 
+def user_partitioned(*table_args) -> tuple:
+    """__table_args__ of raw_inputs/stories: PARTITION BY HASH (user_id) when USER_PARTITIONS is set"""
+    if not USER_PARTITIONS:
+        return table_args
+    return table_args + ({"postgresql_partition_by": "HASH (user_id)"},)
+
+
+def story_fk(ondelete: str) -> list:
+    """Column FK to stories.id; partitioned stories are referenced by (id, user_id), see story_fk_args()"""
+    return [] if USER_PARTITIONS else [ForeignKey("stories.id", ondelete=ondelete)]
+
+
+def story_fk_args(ondelete: str) -> tuple:
+    if not USER_PARTITIONS:
+        return ()
+    return (ForeignKeyConstraint(["story_id", "user_id"], ["stories.id", "stories.user_id"], ondelete=ondelete),)
+
+
 class StoryBranchType(str, enum.Enum):
     CHILDHOOD = "childhood"
     EDUCATION = "education"
@@ -32,27 +54,63 @@ class InputType(str, enum.Enum):
     TEXT = "text"
 
 
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class CampaignStatus(str, enum.Enum):
+    ACTIVE = "active"
+    PAUSED = "paused"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class CampaignCallStatus(str, enum.Enum):
+    PENDING = "pending"  # waiting for next_attempt_at (and the campaign's call window)
+    DIALING = "dialing"  # call placed, not answered yet
+    ANSWERED = "answered"
+    COMPLETED = "completed"
+    NO_ANSWER = "no_answer"  # every attempt went unanswered or busy
+    FAILED = "failed"  # the number can't be called
+    CANCELLED = "cancelled"
+
+
+class NotificationStatus(str, enum.Enum):
+    PENDING = "pending"  # waiting for next_attempt_at (and the recipient's rate limit)
+    SENDING = "sending"
+    SENT = "sent"  # accepted by Telnyx
+    DELIVERED = "delivered"  # delivery receipt (message.finalized)
+    UNDELIVERED = "undelivered"
+    FAILED = "failed"  # refused, or out of attempts
+
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, index=True)
-    phone_number = Column(String(20), nullable=True)
+    # E.164; active_history loads the old number on assignment, so caller caches can drop it (services/phone_service.py)
+    phone_number = column_property(Column(String(20), nullable=True, unique=True, index=True), active_history=True)
+    birth_year = Column(Integer, nullable=True)  # places life stages ("childhood") on the timeline
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    memory_branches = relationship("MemoryBranch", back_populates="user", cascade="all, delete-orphan")
-    raw_inputs = relationship("RawInput", back_populates="user", cascade="all, delete-orphan")
-    stories = relationship("Story", back_populates="user", cascade="all, delete-orphan")
+    # Children are removed by ON DELETE CASCADE; passive_deletes keeps the ORM from loading them first
+    memory_branches = relationship("MemoryBranch", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    raw_inputs = relationship("RawInput", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    stories = relationship("Story", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class MemoryBranch(Base):
     __tablename__ = "memory_branches"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     branch_type = Column(Enum(StoryBranchType), nullable=False)
     title = Column(String(500), nullable=False)
     description = Column(Text, nullable=True)
@@ -61,29 +119,50 @@ class MemoryBranch(Base):
 
     # Relationships
     user = relationship("User", back_populates="memory_branches")
-    raw_inputs = relationship("RawInput", back_populates="memory_branch", cascade="all, delete-orphan")
-    stories = relationship("Story", back_populates="memory_branch", cascade="all, delete-orphan")
+    raw_inputs = relationship("RawInput", back_populates="memory_branch", cascade="all, delete-orphan", passive_deletes=True)
+    stories = relationship("Story", back_populates="memory_branch", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class RawInput(Base):
     __tablename__ = "raw_inputs"
+    __table_args__ = user_partitioned()
+    __mapper_args__ = {"primary_key": ["id"]}  # (id, user_id) in the table when partitioned; id is unique either way
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    memory_branch_id = Column(Integer, ForeignKey("memory_branches.id"), nullable=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True,
+                     primary_key=bool(USER_PARTITIONS))
+    memory_branch_id = Column(Integer, ForeignKey("memory_branches.id", ondelete="CASCADE"), nullable=True, index=True)
     input_type = Column(Enum(InputType), nullable=False)
 
     # For voice inputs
     telnyx_call_id = Column(String(255), nullable=True)
-    audio_url = Column(String(1000), nullable=True)
+    audio_url = Column(String(1000), nullable=True)  # Telnyx-hosted, expires
+    audio_blob_key = Column(String(64), nullable=True, index=True)  # sha256 in the local blob store
 
     # Content
     raw_text = Column(Text, nullable=True)  # Original text or transcription
     transcript_confidence = Column(Integer, nullable=True)  # 0-100 for voice inputs
+    summary = Column(Text, nullable=True)  # AI summary, generated once and reused
+
+    # Filled in the background after ingest (services/enrichment_service.py)
+    token_count = Column(Integer, nullable=True)  # estimated prompt tokens of raw_text
+    people_mentioned = Column(JSON, nullable=True)
+    time_period = Column(String(100), nullable=True)
+    embedding = Column(JSON, nullable=True)  # only with ENRICH_EMBEDDINGS
+    enriched_at = Column(DateTime, nullable=True)
+
+    # Near-duplicate detection (services/dedup_service.py)
+    minhash_signature = Column(LargeBinary, nullable=True)  # 128 x uint32
+    minhash_signed_at = Column(DateTime, nullable=True)  # when the signature was written (lookups load by it)
+    duplicate_of_id = Column(  # earliest retelling of the same story
+        Integer, *([] if USER_PARTITIONS else [ForeignKey("raw_inputs.id", ondelete="SET NULL")]), nullable=True, index=True
+    )
 
     # Metadata
-    metadata = Column(JSON, nullable=True)  # Additional info like duration, language, etc.
+    # "metadata" is reserved on declarative models, so the attribute is named differently
+    input_metadata = Column("metadata", JSON, nullable=True)  # Additional info like duration, language, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # changes when AI fields are filled in
 
     # Relationships
     user = relationship("User", back_populates="raw_inputs")
@@ -92,26 +171,30 @@ class RawInput(Base):
 
 class Story(Base):
     __tablename__ = "stories"
+    __table_args__ = user_partitioned()
+    __mapper_args__ = {"primary_key": ["id"]}
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    memory_branch_id = Column(Integer, ForeignKey("memory_branches.id"), nullable=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True,
+                     primary_key=bool(USER_PARTITIONS))
+    memory_branch_id = Column(Integer, ForeignKey("memory_branches.id", ondelete="CASCADE"), nullable=True, index=True)
 
     title = Column(String(500), nullable=False)
     content = Column(Text, nullable=False)
     summary = Column(Text, nullable=True)
 
     # AI-generated metadata
-    key_themes = Column(JSON, nullable=True)  # List of themes extracted by AI
+    # active_history loads the old value on assignment, so story_tags can be diffed (services/story_tags.py)
+    key_themes = column_property(Column(JSON, nullable=True), active_history=True)  # List of themes extracted by AI
     time_period = Column(String(100), nullable=True)  # e.g., "1960s", "childhood"
-    people_mentioned = Column(JSON, nullable=True)  # List of people in the story
+    people_mentioned = column_property(Column(JSON, nullable=True), active_history=True)  # List of people in the story
 
     # Source tracking
     source_input_ids = Column(JSON, nullable=True)  # IDs of raw_inputs used to generate this story
 
     # Versioning
     version = Column(Integer, default=1)
-    parent_story_id = Column(Integer, ForeignKey("stories.id"), nullable=True)
+    parent_story_id = Column(Integer, *story_fk("SET NULL"), nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -119,4 +202,162 @@ class Story(Base):
     # Relationships
     user = relationship("User", back_populates="stories")
     memory_branch = relationship("MemoryBranch", back_populates="stories")
-    parent_story = relationship("Story", remote_side=[id], backref="versions")
+    parent_story = relationship(
+        "Story", primaryjoin="foreign(Story.parent_story_id) == remote(Story.id)",
+        backref=backref("versions", passive_deletes=True)
+    )
+
+
+class StoryTag(Base):
+    """One person or theme of a story (normalized from people_mentioned / key_themes, for lookups)"""
+    __tablename__ = "story_tags"
+
+    story_id = Column(Integer, *story_fk("CASCADE"), primary_key=True)
+    kind = Column(String(20), primary_key=True)  # "person" or "theme"
+    key = Column(String(255), primary_key=True)  # normalized name, e.g. "aunt rose"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    label = Column(String(255), nullable=False)  # as written in the story
+
+    __table_args__ = (Index("ix_story_tags_user_kind_key", "user_id", "kind", "key"),) + story_fk_args("CASCADE")
+
+
+class UserTagCount(Base):
+    """Stories per person/theme for a user, maintained incrementally with story_tags"""
+    __tablename__ = "user_tag_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    kind = Column(String(20), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    label = Column(String(255), nullable=False)  # first spelling seen
+    story_count = Column(Integer, nullable=False, default=0)
+
+
+class TimelineEntry(Base):
+    """A story placed on its user's timeline (services/timeline.py), in sort_year order"""
+    __tablename__ = "timeline_entries"
+
+    story_id = Column(Integer, *story_fk("CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    memory_branch_id = Column(Integer, nullable=True)
+    title = Column(String(500), nullable=False)  # copied from the story, so pages need no join
+    time_period = Column(String(100), nullable=True)
+    start_year = Column(Integer, nullable=True)  # NULL: couldn't be placed
+    end_year = Column(Integer, nullable=True)
+    precision = Column(String(20), nullable=True)  # year, range, decade, era, age, stage
+    sort_year = Column(Integer, nullable=False)  # start_year, or 9999 for undated
+
+    __table_args__ = (Index("ix_timeline_entries_user_sort", "user_id", "sort_year", "story_id"),) + story_fk_args("CASCADE")
+
+
+class Job(Base):
+    """Background work (large deletes, ...) with progress for polling clients"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(100), nullable=False)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    params = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    total = Column(Integer, nullable=True)  # units of work, when known up front
+    completed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def progress(self):
+        if self.status == JobStatus.COMPLETED:
+            return 1.0
+        if not self.total:
+            return None
+        return min(1.0, (self.completed or 0) / self.total)
+
+
+class Campaign(Base):
+    """Outbound interview calls to a set of users (services/campaign_service.py)"""
+    __tablename__ = "campaigns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    status = Column(Enum(CampaignStatus), nullable=False, default=CampaignStatus.ACTIVE)
+    timezone = Column(String(64), nullable=False, default="UTC")  # call windows are local to this zone
+    windows = Column(JSON, nullable=True)  # [{"days": [0-6, Monday=0], "start": "HH:MM", "end": "HH:MM"}]; none: any time
+    starts_at = Column(DateTime, nullable=True)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    retry_backoff_minutes = Column(Float, nullable=False, default=60.0)  # doubles after each unanswered attempt
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class CampaignCall(Base):
+    """One user's calls within a campaign: state of the current attempt and when to try again"""
+    __tablename__ = "campaign_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    phone_number = Column(String(20), nullable=False)  # E.164, as of campaign creation
+    status = Column(Enum(CampaignCallStatus), nullable=False, default=CampaignCallStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    call_control_id = Column(String(255), nullable=True, index=True)  # Telnyx id of the current attempt
+    last_outcome = Column(String(50), nullable=True)  # answered, no_answer, busy, failed, ...
+    last_error = Column(Text, nullable=True)
+    answered_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("campaign_id", "user_id", name="uq_campaign_calls_campaign_user"),
+        Index("ix_campaign_calls_status_next", "status", "next_attempt_at"),  # due calls, calls in flight
+        Index("ix_campaign_calls_campaign_status", "campaign_id", "status"),  # progress counts
+    )
+
+
+class NotificationRecipient(Base):
+    """A relative who gets an SMS when the user has new stories"""
+    __tablename__ = "notification_recipients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(255), nullable=False)
+    phone_number = Column(String(20), nullable=False)  # E.164
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("user_id", "phone_number", name="uq_notification_recipients_user_phone"),)
+
+
+class Notification(Base):
+    """
+    One event for one recipient (services/notification_service.py)
+    Pending events for the same phone number go out together as one SMS;
+    batch_id groups them while sending, message_id once Telnyx accepted it.
+    """
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient_id = Column(Integer, ForeignKey("notification_recipients.id", ondelete="CASCADE"), nullable=False, index=True)
+    phone_number = Column(String(20), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)  # whose news it is
+    story_id = Column(Integer, *story_fk("CASCADE"), nullable=True, index=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(Enum(NotificationStatus), nullable=False, default=NotificationStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    batch_id = Column(String(36), nullable=True, index=True)
+    message_id = Column(String(255), nullable=True, index=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notifications_status_next", "status", "next_attempt_at"),  # due events, queue lag
+        Index("ix_notifications_phone_sent", "phone_number", "sent_at"),  # per-recipient rate limit
+    ) + story_fk_args("CASCADE")
+
+
+if USER_PARTITIONS:
+    for partitioned in (RawInput.__table__, Story.__table__):
+        event.listen(partitioned, "after_create", create_partitions)
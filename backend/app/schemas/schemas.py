@@ -1,7 +1,10 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
-from app.models.database import StoryBranchType, InputType
+import re
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, field_validator
+from typing import Dict, Optional, List
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app.models.database import StoryBranchType, InputType, JobStatus, CampaignStatus, CampaignCallStatus, NotificationStatus
+from app.services.phone_service import normalize_phone_number
 
 
 # User Schemas
@@ -9,10 +12,19 @@ class UserBase(BaseModel):
     name: str
     email: EmailStr
     phone_number: Optional[str] = None
+    birth_year: Optional[int] = Field(default=None, ge=1850, le=2100)
 
 
 class UserCreate(UserBase):
-    pass
+    @field_validator("phone_number")
+    @classmethod
+    def normalize_phone(cls, value: Optional[str]) -> Optional[str]:
+        return normalize_phone_number(value)
+
+
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+    birth_year: Optional[int] = Field(default=None, ge=1850, le=2100)
 
 
 class UserResponse(UserBase):
@@ -45,6 +57,14 @@ class MemoryBranchResponse(MemoryBranchBase):
         from_attributes = True
 
 
+class MemoryBranchOverview(MemoryBranchResponse):
+    input_count: int = 0
+    story_count: int = 0
+    latest_activity: datetime
+    latest_story_id: Optional[int] = None
+    latest_story_title: Optional[str] = None
+
+
 # Raw Input Schemas
 class RawInputBase(BaseModel):
     input_type: InputType
@@ -60,14 +80,34 @@ class RawInputCreate(RawInputBase):
     metadata: Optional[dict] = None
 
 
+class BulkRawInputCreate(BaseModel):
+    inputs: List[RawInputCreate] = Field(min_length=1, max_length=500)
+
+
+class BulkRawInputResponse(BaseModel):
+    ids: List[int]  # in request order
+    enrichment_queued: bool
+
+
 class RawInputResponse(RawInputBase):
     id: int
     user_id: int
     telnyx_call_id: Optional[str] = None
     audio_url: Optional[str] = None
+    audio_blob_key: Optional[str] = None
     transcript_confidence: Optional[int] = None
-    metadata: Optional[dict] = None
+    summary: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
+    token_count: Optional[int] = None
+    people_mentioned: Optional[List[str]] = None
+    time_period: Optional[str] = None
+    enriched_at: Optional[datetime] = None
+    metadata: Optional[dict] = Field(
+        default=None,
+        validation_alias=AliasChoices("input_metadata", "metadata")
+    )
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -114,6 +154,30 @@ class StoryResponse(StoryBase):
         from_attributes = True
 
 
+class TagCount(BaseModel):
+    """A person or theme with the number of the user's stories that mention it"""
+    name: str
+    story_count: int
+
+
+class TimelineEntryResponse(BaseModel):
+    story_id: int
+    memory_branch_id: Optional[int] = None
+    title: str
+    time_period: Optional[str] = None
+    start_year: Optional[int] = None  # None: the time period couldn't be placed
+    end_year: Optional[int] = None
+    precision: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TimelinePage(BaseModel):
+    entries: List[TimelineEntryResponse]
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page
+
+
 # Voice Input Schema (for Telnyx webhook)
 class VoiceInputWebhook(BaseModel):
     call_id: str
@@ -129,8 +193,177 @@ class GenerateStoryRequest(BaseModel):
     input_ids: List[int]  # IDs of raw inputs to use
     memory_branch_id: Optional[int] = None
     style: Optional[str] = "narrative"  # narrative, bullet_points, timeline, etc.
+    collapse_duplicates: bool = True  # use one telling of stories the user repeated across inputs
 
 
 class SummarizeInputRequest(BaseModel):
     input_id: int
     max_length: Optional[int] = 200
+
+
+class SummarizeInputsRequest(BaseModel):
+    input_ids: List[int]
+    max_length: Optional[int] = 200
+
+
+class InputSummary(BaseModel):
+    input_id: int
+    summary: str
+
+
+class SummarizeInputsResponse(BaseModel):
+    summaries: List[InputSummary]
+    missing_ids: List[int]  # inputs that don't exist or have no text
+
+
+# Background job Schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: JobStatus
+    params: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    total: Optional[int] = None
+    completed: int = 0
+    progress: Optional[float] = None  # 0.0-1.0, when the total is known
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Call campaign Schemas
+class CallWindow(BaseModel):
+    """Local times (campaign time zone) during which calls may be placed; end before start spans midnight"""
+    days: List[int] = Field(default=[0, 1, 2, 3, 4, 5, 6])  # Monday=0
+    start: str  # "HH:MM"
+    end: str
+
+    @field_validator("days")
+    @classmethod
+    def check_days(cls, value: List[int]) -> List[int]:
+        if not value or any(day < 0 or day > 6 for day in value):
+            raise ValueError("days must be weekday numbers 0 (Monday) to 6 (Sunday)")
+        return sorted(set(value))
+
+    @field_validator("start", "end")
+    @classmethod
+    def check_time(cls, value: str) -> str:
+        match = re.fullmatch(r"(\d{1,2}):(\d{2})", value)
+        hours, minutes = (int(match.group(1)), int(match.group(2))) if match else (99, 0)
+        if minutes > 59 or hours * 60 + minutes > 24 * 60:
+            raise ValueError("expected HH:MM (00:00-24:00)")
+        return f"{hours:02d}:{minutes:02d}"
+
+
+class CampaignCreate(BaseModel):
+    name: str
+    user_ids: Optional[List[int]] = None  # default: every user with a phone number
+    timezone: str = "UTC"
+    windows: List[CallWindow] = []  # empty: any time
+    starts_at: Optional[datetime] = None
+    max_attempts: int = Field(default=3, ge=1, le=10)
+    retry_backoff_minutes: float = Field(default=60.0, gt=0)  # doubles after each unanswered attempt
+
+    @field_validator("timezone")
+    @classmethod
+    def check_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"unknown time zone {value!r}")
+        return value
+
+    @field_validator("starts_at")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored like every other timestamp: naive UTC
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class CampaignProgress(BaseModel):
+    total: int = 0
+    by_status: Dict[CampaignCallStatus, int] = {}
+    attempts: int = 0  # calls placed so far, retries included
+    progress: float = 0.0  # share of users with a final outcome
+
+
+class CampaignResponse(BaseModel):
+    id: int
+    name: str
+    status: CampaignStatus
+    timezone: str
+    windows: Optional[List[CallWindow]] = None
+    starts_at: Optional[datetime] = None
+    max_attempts: int
+    retry_backoff_minutes: float
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    progress: CampaignProgress
+    skipped_user_ids: List[int] = []  # on create: requested users without a phone number (or unknown)
+
+
+class CampaignCallResponse(BaseModel):
+    id: int
+    user_id: int
+    phone_number: str
+    status: CampaignCallStatus
+    attempts: int
+    next_attempt_at: datetime
+    last_outcome: Optional[str] = None
+    last_error: Optional[str] = None
+    answered_at: Optional[datetime] = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Notification Schemas
+class RecipientCreate(BaseModel):
+    user_id: int  # whose new stories they hear about
+    name: str
+    phone_number: str
+
+    @field_validator("phone_number")
+    @classmethod
+    def normalize_phone(cls, value: str) -> str:
+        number = normalize_phone_number(value)
+        if not number:
+            raise ValueError("phone_number is required")
+        return number
+
+
+class RecipientResponse(RecipientCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class NotificationResponse(BaseModel):
+    id: int
+    recipient_id: int
+    phone_number: str
+    story_id: Optional[int] = None
+    kind: str
+    status: NotificationStatus
+    attempts: int
+    next_attempt_at: datetime
+    message_id: Optional[str] = None  # shared by events sent in the same SMS
+    error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DeleteResponse(BaseModel):
+    message: str
+    job_id: Optional[int] = None  # set when the delete continues in the background
@@ -1,16 +1,31 @@
+from sqlalchemy import bindparam
 from sqlalchemy.orm import Session
-from typing import List, Optional
-import openai
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+# llm_scheduler imports openai, which has to be loaded before comet_ml:
+# comet's import hooks fail on modules imported after it with openai>=1.0
+from app.services.llm_scheduler import llm_scheduler, LLMRequest, Priority, estimate_tokens
 from comet_ml import Experiment
 from app.models.database import Story, RawInput, MemoryBranch
 from app.db.config import settings
+from app.db.session import SessionLocal
+from app.services.metadata_extractor import local_extractor, MAX_PEOPLE
+from app.services import dedup_service
+from app.services import story_tags, timeline  # noqa: F401  keep the story index and timeline in sync
+from app.services.notification_service import notify_story
+from app.services.metrics import registry
 
-# Initialize OpenAI
-openai.api_key = settings.OPENAI_API_KEY
+METADATA_EXTRACTIONS = registry.counter(
+    "story_metadata_extractions_total",
+    "Story metadata extractions by extractor and outcome",
+    ("extractor", "outcome")
+)
 
 
 class AIService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session]):
         self.db = db
         self.comet_experiment = None
         if settings.COMET_API_KEY:
@@ -25,10 +40,14 @@ class AIService:
         user_id: int,
         input_ids: List[int],
         memory_branch_id: Optional[int] = None,
-        style: str = "narrative"
+        style: str = "narrative",
+        collapse_duplicates: bool = True
     ) -> Story:
         """
         Generate a cohesive story from multiple raw inputs using AI
+        With collapse_duplicates, stories told on several calls go into the
+        prompt once (see services/dedup_service.py). Inputs enriched at ingest
+        (services/enrichment_service.py) save the metadata LLM call.
         """
         # Fetch raw inputs
         inputs = self.db.query(RawInput).filter(
@@ -39,8 +58,13 @@ class AIService:
         if not inputs:
             raise ValueError("No inputs found")
 
-        # Combine all input texts
-        combined_text = "\n\n".join([inp.raw_text for inp in inputs if inp.raw_text])
+        prompt_inputs, duplicates = inputs, []
+        if collapse_duplicates:
+            prompt_inputs, duplicates = dedup_service.collapse_duplicates(inputs)
+
+        # Combine input texts (precomputed summaries stand in for long ones)
+        combined_text, summarized_ids = self._combine_inputs(prompt_inputs)
+        enriched = all(inp.enriched_at for inp in prompt_inputs)
 
         # Get memory branch context if available
         branch_context = ""
@@ -50,29 +74,46 @@ class AIService:
             ).first()
             if branch:
                 branch_context = f"Memory Branch: {branch.title} ({branch.branch_type})\n"
+        if enriched:
+            branch_context += self._input_details(prompt_inputs)
 
         # Create prompt based on style
         prompt = self._create_story_prompt(combined_text, branch_context, style)
 
+        # Everything below uses what's already loaded: detach the inputs and end
+        # the read transaction, so no pooled connection waits on the LLM with us
+        for inp in inputs:
+            self.db.expunge(inp)
+        self.db.commit()
+
         # Log to Comet ML
         if self.comet_experiment:
             self.comet_experiment.log_parameters({
                 "user_id": user_id,
                 "num_inputs": len(inputs),
+                "num_duplicates_collapsed": len(duplicates),
+                "prompt_tokens_saved": dedup_service.prompt_tokens(duplicates),
+                "num_inputs_summarized": len(summarized_ids),
+                "inputs_enriched": enriched,
                 "style": style,
                 "memory_branch_id": memory_branch_id
             })
             self.comet_experiment.log_text(combined_text, metadata={"type": "raw_input"})
 
         # Generate story using OpenAI
-        response = await self._generate_text(prompt, max_tokens=2000)
+        response = await self._generate_text(prompt, max_tokens=2000, user_id=user_id)
         story_content = response["content"]
 
-        # Extract metadata using AI
-        metadata = await self._extract_story_metadata(story_content)
-
-        # Create story title
-        title = await self._generate_title(story_content)
+        if enriched:
+            # People and time period were extracted at ingest
+            metadata = self._metadata_from_inputs(prompt_inputs, story_content)
+            title = await self._generate_title(story_content, user_id=user_id)
+        else:
+            # Metadata and title don't depend on each other
+            metadata, title = await asyncio.gather(
+                self._extract_story_metadata(story_content, user_id=user_id),
+                self._generate_title(story_content, user_id=user_id)
+            )
 
         # Create story in database
         story = Story(
@@ -88,6 +129,9 @@ class AIService:
         )
 
         self.db.add(story)
+        if settings.NOTIFY_ON_STORY_GENERATED:
+            self.db.flush()
+            notify_story(self.db, story)  # sent later by the notification dispatcher
         self.db.commit()
         self.db.refresh(story)
 
@@ -102,16 +146,170 @@ class AIService:
 
         return story
 
+    def _combine_inputs(self, inputs: List[RawInput]) -> Tuple[str, List[int]]:
+        """
+        Input texts for the story prompt
+        Over GENERATION_PROMPT_MAX_TOKENS, the longest inputs that already have
+        a summary use it instead. Returns (text, ids of summarized inputs).
+        """
+        texts = {inp.id: inp.raw_text for inp in inputs if inp.raw_text}
+        tokens = {inp.id: inp.token_count or estimate_tokens(inp.raw_text) for inp in inputs if inp.raw_text}
+        total = sum(tokens.values())
+        summarized = []
+        for inp in sorted((i for i in inputs if i.id in texts and i.summary), key=lambda i: -tokens[i.id]):
+            if total <= settings.GENERATION_PROMPT_MAX_TOKENS:
+                break
+            saved = tokens[inp.id] - estimate_tokens(inp.summary)
+            if saved > 0:
+                texts[inp.id] = f"(Summary of a longer memory) {inp.summary}"
+                total -= saved
+                summarized.append(inp.id)
+        return "\n\n".join(texts[inp.id] for inp in inputs if inp.id in texts), summarized
+
+    def _input_details(self, inputs: List[RawInput]) -> str:
+        people = list(dict.fromkeys(p for inp in inputs for p in inp.people_mentioned or []))[:MAX_PEOPLE]
+        periods = list(dict.fromkeys(inp.time_period for inp in inputs if inp.time_period))
+        details = ""
+        if people:
+            details += f"People mentioned: {', '.join(people)}\n"
+        if periods:
+            details += f"Time period: {', '.join(periods)}\n"
+        return details
+
+    def _metadata_from_inputs(self, inputs: List[RawInput], story_content: str) -> dict:
+        """Story metadata from what enrichment extracted per input (rules for themes)"""
+        local = local_extractor.extract(story_content)
+        periods = Counter(inp.time_period for inp in inputs if inp.time_period)
+        METADATA_EXTRACTIONS.inc(extractor="inputs", outcome="ok")
+        return {
+            "people": list(dict.fromkeys(p for inp in inputs for p in inp.people_mentioned or []))[:MAX_PEOPLE],
+            "time_period": periods.most_common(1)[0][0] if periods else local.time_period,
+            "themes": local.themes,
+            "summary": local.summary
+        }
+
     async def summarize_input(
         self,
         input_id: int,
         max_length: int = 200
     ) -> str:
-        """Summarize a raw input"""
+        """Summarize a raw input (stored on the input, so it's only generated once)"""
         raw_input = self.db.query(RawInput).filter(RawInput.id == input_id).first()
         if not raw_input or not raw_input.raw_text:
             raise ValueError("Input not found or empty")
+        if raw_input.summary:
+            return raw_input.summary
+
+        # No connection held while the LLM runs
+        self.db.expunge(raw_input)
+        self.db.commit()
+        summary = await self._summarize_one(raw_input, max_length)
+        return self._store_summaries({input_id: summary}).get(input_id) or summary
+
+    async def summarize_inputs(
+        self,
+        input_ids: List[int],
+        max_length: int = 200
+    ) -> Dict[int, str]:
+        """
+        Summarize many inputs, packing several short inputs into each LLM call
+        Already-summarized inputs are returned as-is; new summaries are persisted.
+        Returns {input_id: summary} for every input that exists and has text.
+        """
+        inputs = self.db.query(RawInput).filter(
+            RawInput.id.in_(input_ids),
+            RawInput.raw_text.isnot(None)
+        ).all()
+
+        summaries = {inp.id: inp.summary for inp in inputs if inp.summary}
+        pending = [inp for inp in inputs if not inp.summary and inp.raw_text.strip()]
+        if not pending:
+            return summaries
+
+        # Detach what we need and end the read transaction before the LLM calls
+        for inp in inputs:
+            self.db.expunge(inp)
+        self.db.commit()
+        generated = await self.summarize_loaded(pending, max_length)
+        summaries.update(generated)
+        summaries.update(self._store_summaries(generated))
+        return summaries
 
+    def _store_summaries(self, summaries: Dict[int, str]) -> Dict[int, str]:
+        """
+        Store new summaries in one short transaction, keeping any another
+        request stored meanwhile; returns the stored summaries
+        """
+        rows = [{"input_id": input_id, "new_summary": summary} for input_id, summary in summaries.items() if summary]
+        if not rows:
+            return {}
+        table = RawInput.__table__
+        self.db.execute(
+            table.update()
+            .where(table.c.id == bindparam("input_id"), table.c.summary.is_(None))
+            .values(summary=bindparam("new_summary")),
+            rows
+        )
+        stored = self.db.query(RawInput.id, RawInput.summary).filter(
+            RawInput.id.in_([row["input_id"] for row in rows])
+        ).all()
+        self.db.commit()
+        return {row.id: row.summary for row in stored if row.summary}
+
+    async def summarize_loaded(self, inputs: List[RawInput], max_length: int = 200) -> Dict[int, str]:
+        """
+        LLM summaries of already loaded inputs, {input_id: summary}; uses no
+        session, so callers can release theirs first (services/enrichment_service.py)
+        """
+        if not inputs:
+            return {}
+        summaries = {}
+        semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+        async def run_batch(batch: List[RawInput]) -> Dict[int, str]:
+            async with semaphore:
+                if len(batch) == 1:
+                    return {batch[0].id: await self._summarize_one(batch[0], max_length)}
+                results = await self._summarize_batch(batch, max_length)
+                # Anything the model dropped or mangled gets its own call
+                for inp in batch:
+                    if not results.get(inp.id):
+                        results[inp.id] = await self._summarize_one(inp, max_length)
+                return results
+
+        batches = self._pack_summary_batches(inputs)
+        for results in await asyncio.gather(*[run_batch(batch) for batch in batches]):
+            summaries.update(results)
+        return summaries
+
+    def _pack_summary_batches(self, inputs: List[RawInput]) -> List[List[RawInput]]:
+        """
+        Group inputs into batches for one LLM call each
+        Batches never mix users (so the scheduler can keep them fair) and stay
+        under SUMMARY_BATCH_MAX_CHARS / SUMMARY_BATCH_MAX_ITEMS.
+        """
+        by_user: Dict[int, List[RawInput]] = {}
+        for inp in inputs:
+            by_user.setdefault(inp.user_id, []).append(inp)
+
+        batches = []
+        for user_inputs in by_user.values():
+            batch, batch_chars = [], 0
+            for inp in sorted(user_inputs, key=lambda i: len(i.raw_text)):
+                size = len(inp.raw_text)
+                if batch and (
+                    batch_chars + size > settings.SUMMARY_BATCH_MAX_CHARS
+                    or len(batch) >= settings.SUMMARY_BATCH_MAX_ITEMS
+                ):
+                    batches.append(batch)
+                    batch, batch_chars = [], 0
+                batch.append(inp)
+                batch_chars += size
+            if batch:
+                batches.append(batch)
+        return batches
+
+    async def _summarize_one(self, raw_input: RawInput, max_length: int) -> str:
         prompt = f"""Summarize the following story input in {max_length} characters or less.
         Focus on the key events, people, and emotions.
 
@@ -120,8 +318,44 @@ class AIService:
 
         Summary:"""
 
-        response = await self._generate_text(prompt, max_tokens=100)
-        return response["content"]
+        response = await self._generate_text(
+            prompt,
+            max_tokens=100,
+            user_id=raw_input.user_id,
+            priority=Priority.BACKGROUND
+        )
+        return response["content"].strip()
+
+    async def _summarize_batch(self, batch: List[RawInput], max_length: int) -> Dict[int, str]:
+        items = "\n\n".join(f"[{inp.id}]\n{inp.raw_text}" for inp in batch)
+        prompt = f"""Summarize each of the following story inputs separately, in {max_length} characters or less each.
+        Focus on the key events, people, and emotions.
+
+        Inputs (each starts with its [id]):
+        {items}
+
+        Respond in JSON format, with one entry per input:
+        {{"summaries": [{{"id": 0, "summary": ""}}]}}
+        """
+
+        response = await self._generate_text(
+            prompt,
+            max_tokens=100 * len(batch),
+            user_id=batch[0].user_id,
+            priority=Priority.BACKGROUND
+        )
+
+        try:
+            parsed = json.loads(response["content"])
+            entries = parsed.get("summaries", []) if isinstance(parsed, dict) else parsed
+            wanted = {inp.id for inp in batch}
+            return {
+                int(entry["id"]): str(entry["summary"]).strip()
+                for entry in entries
+                if int(entry.get("id", -1)) in wanted and entry.get("summary")
+            }
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return {}
 
     def _create_story_prompt(
         self,
@@ -154,31 +388,42 @@ Generated Story:"""
 
         return prompt
 
-    async def _generate_text(self, prompt: str, max_tokens: int = 1000) -> dict:
-        """Generate text using OpenAI"""
+    async def _generate_text(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        user_id: Optional[int] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> dict:
+        """Generate text through the global LLM scheduler"""
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a compassionate storyteller helping preserve family memories."},
-                    {"role": "user", "content": prompt}
-                ],
+            return await llm_scheduler.submit(LLMRequest(
+                prompt=prompt,
                 max_tokens=max_tokens,
-                temperature=0.7
-            )
-
-            return {
-                "content": response.choices[0].message.content,
-                "tokens": response.usage.total_tokens
-            }
+                user_id=user_id,
+                priority=priority
+            ))
         except Exception as e:
             # Log error to Comet
             if self.comet_experiment:
                 self.comet_experiment.log_other("error", str(e))
             raise
 
-    async def _extract_story_metadata(self, story_content: str) -> dict:
-        """Extract themes, people, and time period from story"""
+    async def _extract_story_metadata(self, story_content: str, user_id: Optional[int] = None) -> dict:
+        """
+        Extract themes, people, and time period from story
+        Rules first unless METADATA_EXTRACTOR is "llm" (see services/metadata_extractor.py)
+        """
+        mode = settings.METADATA_EXTRACTOR
+        if mode in ("local", "local_first"):
+            local = local_extractor.extract(story_content)
+            if mode == "local" or local.confident:
+                METADATA_EXTRACTIONS.inc(extractor="local", outcome="ok")
+                return local.to_dict()
+            METADATA_EXTRACTIONS.inc(extractor="local", outcome="insufficient")
+        return await self._extract_story_metadata_llm(story_content, user_id=user_id)
+
+    async def _extract_story_metadata_llm(self, story_content: str, user_id: Optional[int] = None) -> dict:
         prompt = f"""Analyze this story and extract:
         1. Key themes (list 3-5 themes)
         2. People mentioned (list names)
@@ -192,22 +437,23 @@ Generated Story:"""
         {{"themes": [], "people": [], "time_period": "", "summary": ""}}
         """
 
-        response = await self._generate_text(prompt, max_tokens=300)
+        response = await self._generate_text(prompt, max_tokens=300, user_id=user_id)
 
-        # Parse JSON response
+        # Parse JSON response; anything unusable falls back to the rules
         try:
-            import json
             metadata = json.loads(response["content"])
+            if not isinstance(metadata, dict):
+                raise ValueError(f"expected an object, got {type(metadata).__name__}")
+            METADATA_EXTRACTIONS.inc(extractor="llm", outcome="ok")
             return metadata
-        except:
-            return {
-                "themes": [],
-                "people": [],
-                "time_period": None,
-                "summary": story_content[:200]
-            }
+        except ValueError as e:
+            print(f"Story metadata: unparseable LLM response ({e}), using local extractor")
+            METADATA_EXTRACTIONS.inc(extractor="llm", outcome="parse_error")
+            if self.comet_experiment:
+                self.comet_experiment.log_other("metadata_parse_error", str(e))
+            return local_extractor.extract(story_content).to_dict()
 
-    async def _generate_title(self, story_content: str) -> str:
+    async def _generate_title(self, story_content: str, user_id: Optional[int] = None) -> str:
         """Generate a compelling title for the story"""
         prompt = f"""Generate a short, meaningful title (max 8 words) for this family story:
 
@@ -215,5 +461,29 @@ Generated Story:"""
 
         Title:"""
 
-        response = await self._generate_text(prompt, max_tokens=20)
+        response = await self._generate_text(prompt, max_tokens=20, user_id=user_id)
         return response["content"].strip().strip('"')
+
+
+def generate_story_job(
+    user_id: int,
+    input_ids: List[int],
+    memory_branch_id: Optional[int] = None,
+    style: str = "narrative",
+    collapse_duplicates: bool = True
+):
+    """Job work (job_service.run_async_job) for POST /stories/generate/jobs"""
+    async def work(job) -> dict:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            story = await AIService(db).generate_story(
+                user_id=user_id,
+                input_ids=input_ids,
+                memory_branch_id=memory_branch_id,
+                style=style,
+                collapse_duplicates=collapse_duplicates
+            )
+            return {"story_id": story.id}
+        finally:
+            db.close()
+    return work
@@ -0,0 +1,124 @@
+"""
+Content-addressed blob store on the local filesystem
+Blobs are keyed by the sha256 of their content and sharded two levels deep:
+
+    <root>/ab/cd/abcd1234...   (key = full hex digest)
+
+Writes stream into <root>/tmp while hashing, then os.replace() into place,
+so readers never see partial files. Identical content is stored once.
+Blobs are immutable; a key always names the same bytes.
+"""
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterable, Iterable, Optional
+from app.db.config import settings
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass
+class BlobInfo:
+    key: str
+    size: int
+    created: bool  # False when identical content was already stored
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path(key))
+
+    def put_bytes(self, data: bytes) -> BlobInfo:
+        return self.put_chunks([data])
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> BlobInfo:
+        writer = _BlobWriter(self)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    async def put_async_chunks(self, chunks: AsyncIterable[bytes]) -> BlobInfo:
+        """Store a streamed download without holding it in memory (file I/O and fsync run in a thread)"""
+        writer = await asyncio.to_thread(_BlobWriter, self)
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(writer.write, chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return await asyncio.to_thread(writer.commit)
+
+    def open_mmap(self, key: str) -> Optional[mmap.mmap]:
+        """Read-only mapping of a blob (None for empty blobs, which can't be mapped)"""
+        with open(self.path(key), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_bytes(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class _BlobWriter:
+    def __init__(self, store: BlobStore):
+        self.store = store
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def commit(self) -> BlobInfo:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        key = self.hasher.hexdigest()
+        final_path = self.store.path(key)
+        if os.path.exists(final_path):
+            os.remove(self.tmp_path)
+            return BlobInfo(key=key, size=self.size, created=False)
+
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.chmod(self.tmp_path, 0o644)
+        os.replace(self.tmp_path, final_path)
+        return BlobInfo(key=key, size=self.size, created=True)
+
+
+blob_store = BlobStore(settings.BLOB_STORE_PATH)
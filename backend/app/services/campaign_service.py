@@ -0,0 +1,466 @@
+"""
+Outbound interview-call campaigns
+A campaign is a set of users to call, call windows in the campaign's time
+zone and a retry policy. create_campaign() stores one campaign_calls row per
+user; the CampaignDispatcher task then places due calls:
+
+- only while one of the campaign's windows is open (and after starts_at)
+- at most CAMPAIGN_MAX_CONCURRENT_CALLS calls dialing or answered at once,
+  counted in the database
+- at most CAMPAIGN_CALLS_PER_SECOND new calls (the carrier's CPS limit),
+  pausing for Retry-After when Telnyx answers 429
+
+Calls are claimed with a conditional UPDATE before dialing, so two
+dispatchers never place the same call, but the rate limit is per
+dispatcher: enable CAMPAIGN_DISPATCHER_ENABLED on one process.
+
+Call state follows Telnyx webhook events (record_call_event(), called by the
+webhook consumer). The call and attempt travel in client_state, so late
+events of an earlier attempt are ignored and redelivered events change
+nothing. Unanswered and busy calls are retried after retry_backoff_minutes,
+doubling each time, up to max_attempts. Answered calls are recorded from
+answer; the recording arrives as call.recording.saved like any other call.
+"""
+import asyncio
+import base64
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import exists, func, insert, update
+from sqlalchemy.orm import Session
+from app.db.config import settings
+from app.db.session import SessionLocal
+from app.models.database import Campaign, CampaignCall, CampaignCallStatus, CampaignStatus, User
+from app.services.llm_scheduler import TokenBucket
+from app.services.metrics import registry
+from app.services.telnyx_service import TelnyxAPIError, TelnyxService
+
+CAMPAIGN_CALLS = registry.counter(
+    "campaign_call_attempts_total",
+    "Finished campaign call attempts by outcome",
+    ("outcome",)
+)
+CAMPAIGN_CALLS_IN_FLIGHT = registry.gauge(
+    "campaign_calls_in_flight",
+    "Campaign calls dialing or answered"
+)
+CAMPAIGN_DIAL_LATENCY = registry.histogram(
+    "campaign_dial_seconds",
+    "Telnyx dial request latency",
+    ("outcome",)
+)
+
+CALL_EVENTS = {"call.initiated", "call.answered", "call.hangup"}
+OPEN = (CampaignCallStatus.PENDING, CampaignCallStatus.DIALING, CampaignCallStatus.ANSWERED)
+IN_FLIGHT = (CampaignCallStatus.DIALING, CampaignCallStatus.ANSWERED)
+# Hangup causes after which calling the number again is pointless
+UNREACHABLE_CAUSES = {"not_found", "unallocated_number", "invalid_number_format"}
+CLIENT_STATE_PREFIX = "campaign_call"
+
+
+# Call windows
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def window_open(campaign: Campaign, now: datetime) -> bool:
+    """Whether the campaign may place calls at `now` (naive UTC)"""
+    if campaign.starts_at and now < campaign.starts_at:
+        return False
+    if not campaign.windows:
+        return True
+    local = now.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(campaign.timezone))
+    minute = local.hour * 60 + local.minute
+    weekday = local.weekday()
+    for window in campaign.windows:
+        days = window.get("days") or range(7)
+        start, end = _minutes(window["start"]), _minutes(window["end"])
+        if start <= end:
+            if weekday in days and start <= minute < end:
+                return True
+        elif (weekday in days and minute >= start) or ((weekday - 1) % 7 in days and minute < end):
+            return True  # spans midnight: belongs to the day it starts on
+    return False
+
+
+# Campaigns
+
+def create_campaign(db: Session, data) -> Tuple[Campaign, List[int]]:
+    """Store a campaign (CampaignCreate) and one call per user; returns it with the user ids that were skipped"""
+    query = db.query(User.id, User.phone_number).filter(User.phone_number.isnot(None))
+    if data.user_ids is not None:
+        query = query.filter(User.id.in_(data.user_ids))
+    users = query.order_by(User.id).all()
+
+    campaign = Campaign(
+        name=data.name,
+        timezone=data.timezone,
+        windows=[window.model_dump() for window in data.windows] or None,
+        starts_at=data.starts_at,
+        max_attempts=data.max_attempts,
+        retry_backoff_minutes=data.retry_backoff_minutes,
+        status=CampaignStatus.ACTIVE
+    )
+    db.add(campaign)
+    db.flush()
+
+    now = datetime.utcnow()
+    if users:
+        # One executemany for the whole user set
+        db.execute(insert(CampaignCall.__table__), [
+            {
+                "campaign_id": campaign.id, "user_id": user.id, "phone_number": user.phone_number,
+                "status": CampaignCallStatus.PENDING, "attempts": 0, "next_attempt_at": now, "updated_at": now
+            }
+            for user in users
+        ])
+    db.commit()
+
+    found = {user.id for user in users}
+    skipped = [user_id for user_id in dict.fromkeys(data.user_ids or []) if user_id not in found]
+    return campaign, skipped
+
+
+def campaign_progress(db: Session, campaign_ids: Iterable[int]) -> Dict[int, dict]:
+    """Per campaign: calls by status, attempts so far and the share of calls with a final outcome"""
+    campaign_ids = list(campaign_ids)
+    progress = {campaign_id: {"total": 0, "by_status": {}, "attempts": 0, "progress": 0.0} for campaign_id in campaign_ids}
+    if not campaign_ids:
+        return progress
+    rows = db.query(
+        CampaignCall.campaign_id, CampaignCall.status, func.count(), func.sum(CampaignCall.attempts)
+    ).filter(CampaignCall.campaign_id.in_(campaign_ids)).group_by(CampaignCall.campaign_id, CampaignCall.status)
+    for campaign_id, status, count, attempts in rows:
+        entry = progress[campaign_id]
+        entry["total"] += count
+        entry["by_status"][status] = count
+        entry["attempts"] += attempts or 0
+    for entry in progress.values():
+        if entry["total"]:
+            still_open = sum(entry["by_status"].get(status, 0) for status in OPEN)
+            entry["progress"] = round(1 - still_open / entry["total"], 4)
+    return progress
+
+
+def set_campaign_status(db: Session, campaign: Campaign, status: CampaignStatus):
+    """Pause, resume or cancel; cancelling drops calls not yet placed (calls in progress finish)"""
+    campaign.status = status
+    if status == CampaignStatus.CANCELLED:
+        db.execute(
+            update(CampaignCall)
+            .where(CampaignCall.campaign_id == campaign.id, CampaignCall.status == CampaignCallStatus.PENDING)
+            .values(status=CampaignCallStatus.CANCELLED, updated_at=datetime.utcnow())
+        )
+        campaign.finished_at = datetime.utcnow()
+    db.commit()
+
+
+# Call state
+
+def client_state(call_id: int, attempt: int) -> str:
+    return f"{CLIENT_STATE_PREFIX}:{call_id}:{attempt}"
+
+
+def _parse_client_state(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(call id, attempt) from a webhook's base64 client_state; None for calls that aren't ours"""
+    if not value:
+        return None
+    try:
+        prefix, call_id, attempt = base64.b64decode(value).decode().split(":")
+        if prefix == CLIENT_STATE_PREFIX:
+            return int(call_id), int(attempt)
+    except ValueError:
+        pass
+    return None
+
+
+def _finish_attempt(call: CampaignCall, campaign: Campaign, outcome: str, now: datetime, error: Optional[str] = None):
+    """Close the current attempt: done, given up, or pending again after the backoff"""
+    call.last_outcome = outcome
+    call.last_error = error
+    if outcome == "answered":
+        call.status = CampaignCallStatus.COMPLETED
+    elif outcome == "failed":
+        call.status = CampaignCallStatus.FAILED
+    elif call.attempts >= campaign.max_attempts:
+        call.status = CampaignCallStatus.NO_ANSWER
+    else:
+        call.status = CampaignCallStatus.PENDING
+        call.next_attempt_at = now + timedelta(minutes=campaign.retry_backoff_minutes * 2 ** (call.attempts - 1))
+    CAMPAIGN_CALLS.inc(outcome=outcome)
+
+
+def hangup_outcome(call: CampaignCall, cause: Optional[str]) -> str:
+    if call.status == CampaignCallStatus.ANSWERED:
+        return "answered"
+    if cause == "user_busy":
+        return "busy"
+    if cause in UNREACHABLE_CAUSES:
+        return "failed"
+    return "no_answer"
+
+
+def record_call_event(db: Session, event_type: str, payload: dict) -> bool:
+    """Apply a Telnyx call event to its campaign call; False for events of other calls or earlier attempts"""
+    ref = _parse_client_state(payload.get("client_state"))
+    if ref is None:
+        return False
+    call_id, attempt = ref
+    row = db.query(CampaignCall, Campaign).join(Campaign, Campaign.id == CampaignCall.campaign_id).filter(
+        CampaignCall.id == call_id
+    ).first()
+    if row is None or row[0].attempts != attempt:
+        return False
+    call, campaign = row
+
+    now = datetime.utcnow()
+    if event_type == "call.initiated":
+        if call.status == CampaignCallStatus.DIALING and not call.call_control_id:
+            call.call_control_id = payload.get("call_control_id")  # can beat the dial response
+    elif event_type == "call.answered":
+        if call.status == CampaignCallStatus.DIALING:
+            call.status = CampaignCallStatus.ANSWERED
+            call.answered_at = now
+    elif event_type == "call.hangup":
+        if call.status in IN_FLIGHT:
+            _finish_attempt(call, campaign, hangup_outcome(call, payload.get("hangup_cause")), now)
+    db.commit()
+    return True
+
+
+def expire_stale_calls(db: Session, now: datetime) -> int:
+    """Close attempts whose webhooks never came: unanswered after the ring timeout, or answered for too long"""
+    dial_deadline = now - timedelta(seconds=settings.CAMPAIGN_RING_TIMEOUT * 2 + 60)
+    talk_deadline = now - timedelta(minutes=settings.CAMPAIGN_MAX_CALL_MINUTES)
+    rows = db.query(CampaignCall, Campaign).join(Campaign, Campaign.id == CampaignCall.campaign_id).filter(
+        ((CampaignCall.status == CampaignCallStatus.DIALING) & (CampaignCall.updated_at < dial_deadline))
+        | ((CampaignCall.status == CampaignCallStatus.ANSWERED) & (CampaignCall.answered_at < talk_deadline))
+    ).all()
+    for call, campaign in rows:
+        outcome = "answered" if call.status == CampaignCallStatus.ANSWERED else "no_answer"
+        _finish_attempt(call, campaign, outcome, now, error="no hangup event received")
+    db.commit()
+    return len(rows)
+
+
+def complete_finished_campaigns(db: Session) -> int:
+    """Mark active campaigns without open calls completed"""
+    result = db.execute(
+        update(Campaign)
+        .where(
+            Campaign.status == CampaignStatus.ACTIVE,
+            ~exists().where(CampaignCall.campaign_id == Campaign.id, CampaignCall.status.in_(OPEN))
+        )
+        .values(status=CampaignStatus.COMPLETED, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+# Dispatch
+
+@dataclass
+class ClaimedCall:
+    id: int
+    attempt: int
+    phone_number: str
+
+
+def claim_due_calls(db: Session, limit: int, max_in_flight: int, now: datetime) -> List[ClaimedCall]:
+    """Move up to `limit` due calls of campaigns in their call window to DIALING (within the concurrency cap)"""
+    in_flight = db.query(func.count(CampaignCall.id)).filter(CampaignCall.status.in_(IN_FLIGHT)).scalar()
+    CAMPAIGN_CALLS_IN_FLIGHT.set(in_flight)
+    limit = min(limit, max_in_flight - in_flight)
+    if limit <= 0:
+        return []
+    campaign_ids = [
+        campaign.id for campaign in db.query(Campaign).filter(Campaign.status == CampaignStatus.ACTIVE)
+        if window_open(campaign, now)
+    ]
+    if not campaign_ids:
+        return []
+    due = db.query(CampaignCall.id, CampaignCall.attempts, CampaignCall.phone_number).filter(
+        CampaignCall.status == CampaignCallStatus.PENDING,
+        CampaignCall.next_attempt_at <= now,
+        CampaignCall.campaign_id.in_(campaign_ids)
+    ).order_by(CampaignCall.next_attempt_at, CampaignCall.id).limit(limit).all()
+
+    claimed = []
+    for row in due:
+        # Only if nobody else claimed it since the SELECT
+        result = db.execute(
+            update(CampaignCall)
+            .where(CampaignCall.id == row.id, CampaignCall.status == CampaignCallStatus.PENDING,
+                   CampaignCall.attempts == row.attempts)
+            .values(status=CampaignCallStatus.DIALING, attempts=row.attempts + 1, call_control_id=None,
+                    answered_at=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append(ClaimedCall(row.id, row.attempts + 1, row.phone_number))
+    db.commit()
+    return claimed
+
+
+class CampaignDispatcher:
+    """
+    Places due campaign calls on the event loop, within the rate and concurrency limits
+    Database work runs in worker threads; each dial is its own task, so a slow
+    Telnyx response doesn't hold up the next call.
+    """
+
+    def __init__(
+        self,
+        telnyx_service: TelnyxService,
+        calls_per_second: float = 1.0,
+        max_concurrent_calls: int = 20,
+        poll_interval: float = 1.0,
+        sweep_interval: float = 5.0
+    ):
+        self.telnyx = telnyx_service
+        # Bursts of a fifth of a second's calls: batches that reach the carrier late
+        # would otherwise run into the next second's
+        self.bucket = TokenBucket(calls_per_second * 60, burst=max(1.0, calls_per_second / 5))
+        self.max_concurrent_calls = max_concurrent_calls
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.paused_until = 0.0  # monotonic time; set by a 429
+        self._dials = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stop placing calls; waits for dial requests already sent"""
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._dials:
+            await asyncio.gather(*self._dials, return_exceptions=True)
+
+    async def run(self):
+        last_sweep = 0.0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - last_sweep > self.sweep_interval:
+                    await asyncio.to_thread(self._sweep)
+                    last_sweep = time.monotonic()
+                placed = await self.dispatch_due()
+                if not placed:
+                    await self._sleep(self.poll_interval)
+            except Exception as e:
+                print(f"Error dispatching campaign calls: {e}")
+                await self._sleep(self.poll_interval)
+
+    async def _sleep(self, seconds: float):
+        """Sleep, waking early on stop()"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def dispatch_due(self) -> int:
+        """Claim as many due calls as the rate limit allows right now and dial them; returns how many"""
+        paused = self.paused_until - time.monotonic()
+        if paused > 0:
+            await self._sleep(paused)
+            return 0
+        wait = self.bucket.wait_time(1)
+        if wait:
+            await self._sleep(wait)
+        claimed = await asyncio.to_thread(self._claim, max(1, int(self.bucket.available())))
+        for call in claimed:
+            self.bucket.consume(1)
+            task = asyncio.get_running_loop().create_task(self._dial(call))
+            self._dials.add(task)
+            task.add_done_callback(self._dials.discard)
+        return len(claimed)
+
+    def _claim(self, limit: int) -> List[ClaimedCall]:
+        db = SessionLocal()
+        try:
+            return claim_due_calls(db, limit, self.max_concurrent_calls, datetime.utcnow())
+        finally:
+            db.close()
+
+    def _sweep(self):
+        db = SessionLocal()
+        try:
+            expire_stale_calls(db, datetime.utcnow())
+            complete_finished_campaigns(db)
+        finally:
+            db.close()
+
+    async def _dial(self, call: ClaimedCall):
+        started = time.perf_counter()
+        try:
+            data = await self.telnyx.make_call(
+                to_number=call.phone_number,
+                from_number=settings.TELNYX_PHONE_NUMBER,
+                client_state=client_state(call.id, call.attempt),
+                record=settings.CAMPAIGN_RECORD_CALLS,
+                timeout_secs=settings.CAMPAIGN_RING_TIMEOUT
+            )
+        except TelnyxAPIError as e:
+            CAMPAIGN_DIAL_LATENCY.observe(time.perf_counter() - started, outcome="error")
+            if e.status_code == 429:
+                self.paused_until = max(self.paused_until, time.monotonic() + (e.retry_after or 1.0))
+            await asyncio.to_thread(self._dial_failed, call, e)
+            return
+        CAMPAIGN_DIAL_LATENCY.observe(time.perf_counter() - started, outcome="ok")
+        await asyncio.to_thread(self._dial_placed, call, data.get("call_control_id"))
+
+    def _dial_placed(self, call: ClaimedCall, call_control_id: Optional[str]):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(CampaignCall)
+                .where(CampaignCall.id == call.id, CampaignCall.attempts == call.attempt,
+                       CampaignCall.call_control_id.is_(None))
+                .values(call_control_id=call_control_id)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _dial_failed(self, call: ClaimedCall, error: TelnyxAPIError):
+        db = SessionLocal()
+        try:
+            row = db.query(CampaignCall, Campaign).join(Campaign, Campaign.id == CampaignCall.campaign_id).filter(
+                CampaignCall.id == call.id
+            ).first()
+            if row is None or row[0].attempts != call.attempt or row[0].status != CampaignCallStatus.DIALING:
+                return
+            db_call, campaign = row
+            now = datetime.utcnow()
+            if error.status_code == 429:
+                # Not the callee's fault: give the attempt back
+                db_call.status = CampaignCallStatus.PENDING
+                db_call.attempts -= 1
+                db_call.next_attempt_at = now + timedelta(seconds=error.retry_after or 1.0)
+                CAMPAIGN_CALLS.inc(outcome="rate_limited")
+            else:
+                outcome = "error" if error.retryable else "failed"
+                _finish_attempt(db_call, campaign, outcome, now, error=str(error)[:1000])
+            db.commit()
+        finally:
+            db.close()
+
+
+campaign_dispatcher = CampaignDispatcher(
+    TelnyxService(api_key=settings.TELNYX_API_KEY, api_base=settings.TELNYX_API_BASE),
+    calls_per_second=settings.CAMPAIGN_CALLS_PER_SECOND,
+    max_concurrent_calls=settings.CAMPAIGN_MAX_CONCURRENT_CALLS
+)
@@ -0,0 +1,280 @@
+"""
+Near-duplicate detection for raw inputs (MinHash + LSH, per user)
+Storytellers often retell the same story on another call. Each input gets a
+MinHash signature of its 3-word shingles when it's ingested; an LSH index
+per user finds earlier inputs with an estimated Jaccard similarity of at
+least DEDUP_THRESHOLD, and the input is flagged `duplicate_of_id` = the
+first telling. generate_story() can then send one telling per story.
+
+Signatures use one-permutation hashing: each shingle is hashed once into
+one of NUM_HASHES bins (min per bin), and empty bins borrow from the next
+filled one. That's O(shingles) instead of O(shingles x hashes).
+
+The index lives in process memory. Every lookup first pulls rows signed
+since this worker last looked (by minhash_signed_at, so inputs signed late
+by enrichment or the backfill are seen too; with SIGNED_AT_MARGIN of overlap
+for transactions that commit after we looked) and drops deleted candidates,
+in a single indexed query, so workers agree without sharing state.
+"""
+import hashlib
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.db.config import settings
+from app.models.database import RawInput
+from app.services.entity_cache import CACHE_LATENCY_BUCKETS
+from app.services.llm_scheduler import estimate_tokens
+from app.services.metrics import registry
+
+NUM_HASHES = 128
+BANDS = 32  # x 4 rows: inputs at 0.6 similarity become candidates ~99% of the time
+ROWS = NUM_HASHES // BANDS
+SHINGLE_WORDS = 3
+MASK32 = 0xFFFFFFFF
+EMPTY = 1 << 64
+SIGNED_AT_MARGIN = timedelta(minutes=5)  # rows signed this long before a lookup are loaded again
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+DEDUP_LOOKUP = registry.histogram(
+    "dedup_lookup_seconds",
+    "In-memory LSH lookup time per ingested input",
+    buckets=CACHE_LATENCY_BUCKETS,
+    quantiles=(0.5, 0.99)
+)
+DEDUP_FLAGGED = registry.counter(
+    "dedup_inputs_flagged_total",
+    "Raw inputs flagged as near-duplicates of an earlier input"
+)
+DEDUP_COLLAPSED = registry.counter(
+    "dedup_inputs_collapsed_total",
+    "Duplicate inputs left out of story generation prompts"
+)
+DEDUP_TOKENS_SAVED = registry.counter(
+    "dedup_prompt_tokens_saved_total",
+    "Estimated prompt tokens saved by collapsing duplicate inputs"
+)
+
+
+def _shingles(text: str) -> Set[str]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash_signature(text: Optional[str]) -> Optional[array]:
+    """NUM_HASHES uint32 values, or None for inputs without words"""
+    shingles = _shingles(text or "")
+    if not shingles:
+        return None
+
+    bins = [EMPTY] * NUM_HASHES
+    for shingle in shingles:
+        hashed = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+        slot, value = hashed % NUM_HASHES, hashed // NUM_HASHES
+        if value < bins[slot]:
+            bins[slot] = value
+
+    # Densify by rotation: an empty bin takes the next filled bin's value,
+    # offset by the distance so borrowed values don't collide with real ones
+    signature = array("I", bytes(4 * NUM_HASHES))
+    for slot in range(NUM_HASHES):
+        distance = 0
+        while bins[(slot + distance) % NUM_HASHES] == EMPTY:
+            distance += 1
+        value = bins[(slot + distance) % NUM_HASHES]
+        signature[slot] = (value + distance * 0x9E3779B1) & MASK32
+    return signature
+
+
+def signature_from_bytes(data: bytes) -> array:
+    signature = array("I")
+    signature.frombytes(data)
+    return signature
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity (fraction of equal MinHash values)"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def _band_keys(signature: array) -> List[bytes]:
+    return [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+
+class UserIndex:
+    def __init__(self):
+        self.bands: List[Dict[bytes, Set[int]]] = [{} for _ in range(BANDS)]
+        self.signatures: Dict[int, array] = {}
+        self.roots: Dict[int, int] = {}  # input id -> first telling it duplicates
+        self.loaded_at: Optional[datetime] = None  # rows signed before this (less the margin) are loaded
+
+    def add(self, input_id: int, signature: array, root: Optional[int]):
+        # Re-adding refreshes the root (deleting a first telling sets it to NULL)
+        if root:
+            self.roots[input_id] = root
+        else:
+            self.roots.pop(input_id, None)
+        if input_id in self.signatures:
+            return
+        self.signatures[input_id] = signature
+        for band, key in enumerate(_band_keys(signature)):
+            self.bands[band].setdefault(key, set()).add(input_id)
+
+    def remove(self, input_id: int):
+        signature = self.signatures.pop(input_id, None)
+        self.roots.pop(input_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(_band_keys(signature)):
+            bucket = self.bands[band].get(key)
+            if bucket:
+                bucket.discard(input_id)
+                if not bucket:
+                    del self.bands[band][key]
+
+    def candidates(self, signature: array) -> Set[int]:
+        found = set()
+        for band, key in enumerate(_band_keys(signature)):
+            found.update(self.bands[band].get(key, ()))
+        return found
+
+    def best_match(
+        self,
+        signature: array,
+        threshold: float,
+        before_id: Optional[int] = None
+    ) -> Optional[Tuple[int, float]]:
+        best = None
+        for input_id in self.candidates(signature):
+            if before_id is not None and input_id >= before_id:
+                continue
+            score = similarity(signature, self.signatures[input_id])
+            if score >= threshold and (best is None or score > best[1] or (score == best[1] and input_id < best[0])):
+                best = (input_id, score)
+        return best
+
+
+class DuplicateIndex:
+    def __init__(self, threshold: float, max_users: int):
+        self.threshold = threshold
+        self.max_users = max_users
+        self._users: "OrderedDict[int, UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user_index(self, user_id: int) -> UserIndex:
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._users[user_id] = UserIndex()
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return index
+
+    def find_duplicate(
+        self,
+        db: Session,
+        user_id: int,
+        signature: array,
+        before_id: Optional[int] = None
+    ) -> Optional[Tuple[int, float]]:
+        """
+        (first telling, similarity) of the closest earlier input above the threshold
+        Pass before_id for an input that's already stored: only lower ids count as earlier.
+        """
+        with self._lock:
+            index = self._user_index(user_id)
+            known_candidates = index.candidates(signature)
+            loaded_at = index.loaded_at
+
+        # One query: rows signed since we last looked, plus a check that the
+        # candidates we already know about haven't been deleted
+        looked_at = datetime.utcnow()
+        filters = [RawInput.user_id == user_id, RawInput.minhash_signature.isnot(None)]
+        if loaded_at is not None:
+            recent = RawInput.minhash_signed_at >= loaded_at - SIGNED_AT_MARGIN
+            filters.append(or_(recent, RawInput.id.in_(known_candidates)) if known_candidates else recent)
+        rows = db.query(RawInput.id, RawInput.duplicate_of_id, RawInput.minhash_signature).filter(*filters).all()
+
+        with self._lock:
+            present = {row.id for row in rows}
+            for input_id in known_candidates - present:
+                index.remove(input_id)
+            for row in rows:
+                index.add(row.id, signature_from_bytes(row.minhash_signature), row.duplicate_of_id)
+            if index.loaded_at is None or looked_at > index.loaded_at:
+                index.loaded_at = looked_at
+
+            started = time.perf_counter()
+            match = index.best_match(signature, self.threshold, before_id)
+            DEDUP_LOOKUP.observe(time.perf_counter() - started)
+            if match is None:
+                return None
+            input_id, score = match
+            return index.roots.get(input_id, input_id), score
+
+    def record(self, raw_input: RawInput, signature: array):
+        """Add a committed input so lookups before the next load see it"""
+        with self._lock:
+            index = self._users.get(raw_input.user_id)
+            if index is not None:
+                index.add(raw_input.id, signature, raw_input.duplicate_of_id)
+
+
+duplicate_index = DuplicateIndex(settings.DEDUP_THRESHOLD, settings.DEDUP_INDEX_MAX_USERS)
+
+
+def flag_duplicate(db: Session, raw_input: RawInput) -> Optional[array]:
+    """
+    Sign an input (new, or stored without a signature) and flag it if it
+    retells an earlier one
+    Returns the signature, to pass to duplicate_index.record() after commit.
+    """
+    if not settings.DEDUP_ENABLED:
+        return None
+    signature = minhash_signature(raw_input.raw_text)
+    if signature is None:
+        return None
+    raw_input.minhash_signature = signature.tobytes()
+    raw_input.minhash_signed_at = datetime.utcnow()
+
+    match = duplicate_index.find_duplicate(db, raw_input.user_id, signature, before_id=raw_input.id)
+    if match:
+        raw_input.duplicate_of_id, score = match
+        raw_input.input_metadata = {**(raw_input.input_metadata or {}), "duplicate_similarity": round(score, 3)}
+        DEDUP_FLAGGED.inc()
+    return signature
+
+
+def collapse_duplicates(inputs: Iterable[RawInput]) -> Tuple[List[RawInput], List[RawInput]]:
+    """
+    One input per story: inputs flagged as retellings of the same first
+    telling are grouped, and only the longest (most detailed) is kept
+    Returns (kept in original order, dropped).
+    """
+    inputs = list(inputs)
+    chosen: Dict[int, RawInput] = {}
+    for inp in inputs:
+        group = inp.duplicate_of_id or inp.id
+        current = chosen.get(group)
+        if current is None or len(inp.raw_text or "") > len(current.raw_text or ""):
+            chosen[group] = inp
+
+    kept_ids = {inp.id for inp in chosen.values()}
+    kept = [inp for inp in inputs if inp.id in kept_ids]
+    dropped = [inp for inp in inputs if inp.id not in kept_ids]
+    if dropped:
+        DEDUP_COLLAPSED.inc(len(dropped))
+        DEDUP_TOKENS_SAVED.inc(prompt_tokens(dropped))
+    return kept, dropped
+
+
+def prompt_tokens(inputs: Iterable[RawInput]) -> int:
+    return sum(estimate_tokens(inp.raw_text) for inp in inputs if inp.raw_text)
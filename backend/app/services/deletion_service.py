@@ -0,0 +1,109 @@
+"""
+Deletes of users and memory branches
+Children go away through ON DELETE CASCADE in a single statement. Above
+DELETE_INLINE_MAX_ROWS dependent rows the delete runs as a background job
+instead, removing children in batches (short transactions, progress after
+each batch) before the parent row.
+"""
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.config import settings
+from app.models.database import Job, User, MemoryBranch, RawInput, Story
+from app.services.entity_cache import mark_changed
+from app.services.job_service import report_progress
+from app.services.story_tags import forget_stories
+
+
+def count_rows(db: Session, *queries) -> int:
+    """Sum of several count(*) selects in one round trip"""
+    return sum(db.query(*[query.scalar_subquery() for query in queries]).one())
+
+
+def branch_dependents(db: Session, branch_id: int) -> int:
+    return count_rows(
+        db,
+        select(func.count(RawInput.id)).where(RawInput.memory_branch_id == branch_id),
+        select(func.count(Story.id)).where(Story.memory_branch_id == branch_id),
+    )
+
+
+def user_dependents(db: Session, user_id: int) -> int:
+    return count_rows(
+        db,
+        select(func.count(MemoryBranch.id)).where(MemoryBranch.user_id == user_id),
+        select(func.count(RawInput.id)).where(RawInput.user_id == user_id),
+        select(func.count(Story.id)).where(Story.user_id == user_id),
+    )
+
+
+def _ids(db: Session, model, criteria: list, limit: Optional[int] = None) -> List[int]:
+    query = db.query(model.id).filter(*criteria)
+    if limit:
+        query = query.limit(limit)
+    return [row[0] for row in query]
+
+
+def delete_branch_now(db: Session, branch: MemoryBranch):
+    """Single DELETE; the database removes the branch's inputs and stories"""
+    story_ids = _ids(db, Story, [Story.memory_branch_id == branch.id])
+    mark_changed(db, "story", story_ids)
+    forget_stories(db, story_ids)
+    db.delete(branch)
+    db.commit()
+
+
+def delete_user_now(db: Session, user: User):
+    """Single DELETE; the database removes the user's branches, inputs and stories"""
+    mark_changed(db, "story", _ids(db, Story, [Story.user_id == user.id]))
+    mark_changed(db, "branch", _ids(db, MemoryBranch, [MemoryBranch.user_id == user.id]))
+    db.delete(user)
+    db.commit()
+
+
+def delete_in_batches(
+    db: Session,
+    job: Job,
+    model,
+    criteria: list,
+    cache_kind: Optional[str] = None,
+    done: int = 0
+) -> int:
+    """Delete matching rows DELETE_BATCH_SIZE at a time, reporting progress after each batch"""
+    while True:
+        ids = _ids(db, model, criteria, settings.DELETE_BATCH_SIZE)
+        if not ids:
+            return done
+        if model is Story:
+            forget_stories(db, ids)
+        # criteria repeated so a per-user delete reads one partition (app/db/partitioning.py)
+        db.query(model).filter(model.id.in_(ids), *criteria).delete(synchronize_session=False)
+        if cache_kind:
+            mark_changed(db, cache_kind, ids)
+        done += len(ids)
+        report_progress(db, job, done)
+
+
+def delete_branch_job(branch_id: int):
+    def work(db: Session, job: Job) -> dict:
+        done = delete_in_batches(db, job, Story, [Story.memory_branch_id == branch_id], "story")
+        done = delete_in_batches(db, job, RawInput, [RawInput.memory_branch_id == branch_id], done=done)
+        branch = db.query(MemoryBranch).filter(MemoryBranch.id == branch_id).first()
+        if branch:
+            delete_branch_now(db, branch)  # anything added meanwhile goes with the cascade
+            done += 1
+        return {"deleted_rows": done}
+    return work
+
+
+def delete_user_job(user_id: int):
+    def work(db: Session, job: Job) -> dict:
+        done = delete_in_batches(db, job, Story, [Story.user_id == user_id], "story")
+        done = delete_in_batches(db, job, RawInput, [RawInput.user_id == user_id], done=done)
+        done = delete_in_batches(db, job, MemoryBranch, [MemoryBranch.user_id == user_id], "branch", done)
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            delete_user_now(db, user)
+            done += 1
+        return {"deleted_rows": done}
+    return work
@@ -0,0 +1,143 @@
+"""
+Background enrichment of raw inputs after ingest
+Everything generate_story() would otherwise work out on the request path is
+computed once per input, right after it's stored:
+- token_count (estimated prompt tokens of raw_text)
+- people_mentioned / time_period (local rules, services/metadata_extractor.py)
+- summary (batched LLM calls at background priority)
+- MinHash signature and duplicate flag, for inputs ingested without one (bulk)
+- embedding, with ENRICH_EMBEDDINGS
+
+enriched_at marks inputs that are done; enrich_inputs() skips them, so it's
+safe to call again (e.g. from scripts/enrich_inputs.py).
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Set
+from sqlalchemy import update
+from app.db.config import settings
+from app.db.profiler import profile_queries
+from app.db.session import SessionLocal
+from app.models.database import RawInput
+from app.services.ai_service import AIService
+from app.services.dedup_service import flag_duplicate, duplicate_index
+from app.services.llm_scheduler import llm_scheduler, estimate_tokens
+from app.services.metadata_extractor import local_extractor
+from app.services.metrics import registry
+
+ENRICHED_INPUTS = registry.counter(
+    "input_enrichments_total",
+    "Raw inputs processed by background enrichment, by outcome",
+    ("outcome",)
+)
+ENRICHMENT_DURATION = registry.histogram(
+    "input_enrichment_seconds",
+    "Time to enrich one batch of raw inputs"
+)
+
+
+async def enrich_inputs(input_ids: List[int]):
+    """
+    Background task: enrich the given inputs
+    No connection is held during LLM calls, which can wait a long time in the
+    scheduler queue: the database work runs in short sessions of its own on a
+    worker thread before and after them.
+    """
+    # Background tasks inherit the request's context; profile on our own so
+    # these queries don't count against the endpoint's query budget
+    with profile_queries(f"enrich {len(input_ids)} inputs"):
+        started = time.perf_counter()
+        try:
+            enriched = await _enrich(input_ids)
+            ENRICHED_INPUTS.inc(enriched, outcome="enriched")
+        except Exception as e:
+            print(f"Error enriching inputs {input_ids[:10]}{'...' if len(input_ids) > 10 else ''}: {e}")
+            ENRICHED_INPUTS.inc(len(input_ids), outcome="failed")
+        finally:
+            ENRICHMENT_DURATION.observe(time.perf_counter() - started)
+
+
+_pending_tasks: Set[asyncio.Task] = set()
+
+
+def enrich_later(input_ids: List[int]):
+    """Enrich in a task of its own, for callers that shouldn't wait (the voice webhook path)"""
+    task = asyncio.get_running_loop().create_task(enrich_inputs(input_ids))
+    _pending_tasks.add(task)  # the loop only keeps a weak reference
+    task.add_done_callback(_pending_tasks.discard)
+
+
+async def _enrich(input_ids: List[int]) -> int:
+    inputs = await asyncio.to_thread(_enrich_locally, input_ids)
+    if not inputs:
+        return 0
+
+    # Detached inputs: their loaded attributes are all the LLM calls need
+    summaries = await AIService(None).summarize_loaded([inp for inp in inputs if not inp.summary])
+    vectors = []
+    if settings.ENRICH_EMBEDDINGS:
+        vectors = await llm_scheduler.embed([inp.raw_text for inp in inputs])
+
+    now = datetime.utcnow()
+    updates = []
+    for i, inp in enumerate(inputs):
+        values = {"id": inp.id, "enriched_at": now}
+        if not inp.summary:
+            values["summary"] = summaries.get(inp.id)
+        if vectors:
+            values["embedding"] = vectors[i]
+        updates.append(values)
+    await asyncio.to_thread(_store, updates)
+    return len(inputs)
+
+
+def _enrich_locally(input_ids: List[int]) -> List[RawInput]:
+    """Local metadata and duplicate flags, committed; returns the inputs still to enrich"""
+    # expire_on_commit=False: the inputs stay readable after the session closes
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        inputs = db.query(RawInput).filter(
+            RawInput.id.in_(input_ids),
+            RawInput.enriched_at.is_(None),
+            RawInput.raw_text.isnot(None)
+        ).order_by(RawInput.id).all()
+        inputs = [inp for inp in inputs if inp.raw_text.strip()]
+        if not inputs:
+            return []
+
+        # Local work first: no LLM calls, one pass over the whole batch
+        for inp, metadata in zip(inputs, local_extractor.extract_batch([inp.raw_text for inp in inputs])):
+            inp.token_count = estimate_tokens(inp.raw_text)
+            inp.people_mentioned = metadata.people
+            inp.time_period = metadata.time_period
+
+        # Inputs stored without a signature (bulk import); in id order so the
+        # first telling stays the original. Flushing makes each one visible to
+        # the next lookup within this transaction.
+        for inp in inputs:
+            if inp.minhash_signature is None:
+                signature = flag_duplicate(db, inp)
+                if signature is not None:
+                    db.flush()
+                    duplicate_index.record(inp, signature)
+        db.commit()
+        return inputs
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _store(updates: List[dict]):
+    """Summaries, embeddings and enriched_at, one UPDATE ... WHERE id = :id per batch"""
+    db = SessionLocal()
+    try:
+        db.execute(update(RawInput), updates)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
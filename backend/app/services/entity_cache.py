@@ -0,0 +1,254 @@
+"""
+Read-through cache for single-entity GETs (stories, memory branches, users)
+Serialized response bytes live in MemVergeService under versioned keys:
+
+    <kind>:<id>:v<version>
+
+A write bumps the entity's version, so every worker stops reading the old
+entry without needing to reach the others. Versions are kept in a small
+SQLite (WAL) file shared by all uvicorn workers on the host, or in-process
+when CACHE_VERSION_STORE=local (single worker / tests).
+
+Readers take the version *before* loading from the database and store
+under that version, so an entry written by a reader that raced a write is
+never served: the write's bump makes it unreachable.
+"""
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.db.config import settings
+from app.models.database import Story, MemoryBranch, User
+from app.services.memverge_service import MemVergeService
+from app.services.metrics import registry
+
+# Cache hits are served in well under a millisecond
+CACHE_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0
+)
+
+ENTITY_CACHE_REQUESTS = registry.counter(
+    "entity_cache_requests_total",
+    "Entity cache lookups by result (hit, miss)",
+    ("kind", "result")
+)
+ENTITY_CACHE_SERVE = registry.histogram(
+    "entity_cache_serve_seconds",
+    "Time to build a single-entity GET response, by cache result",
+    ("kind", "result"),
+    buckets=CACHE_LATENCY_BUCKETS,
+    quantiles=(0.5, 0.95, 0.99)
+)
+ENTITY_CACHE_INVALIDATIONS = registry.counter(
+    "entity_cache_invalidations_total",
+    "Entity versions bumped after committed writes",
+    ("kind",)
+)
+
+# Models whose single-entity GETs go through the cache
+CACHED_KINDS = {
+    Story: "story",
+    MemoryBranch: "branch",
+    User: "user",
+}
+
+
+class LocalVersionStore:
+    """Version counters for a single process"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def bump(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class SQLiteVersionStore:
+    """
+    Version counters shared by every worker on the host
+    One connection per thread; WAL lets readers run alongside the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entity_versions "
+                "(key TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> int:
+        row = self._connect().execute(
+            "SELECT version FROM entity_versions WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, keys: Iterable[str]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO entity_versions (key, version) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET version = version + 1",
+                [(key,) for key in keys]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+@dataclass
+class CachedEntity:
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime]
+
+
+class EntityCache:
+    """Serialized entity responses keyed by (kind, id, version)"""
+
+    def __init__(self, backend: MemVergeService, versions, ttl: int = 300, enabled: bool = True):
+        self.backend = backend
+        self.versions = versions
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @staticmethod
+    def _key(kind: str, entity_id: int) -> str:
+        return f"{kind}:{entity_id}"
+
+    def lookup(self, kind: str, entity_id: int) -> Tuple[Optional[CachedEntity], int]:
+        """
+        Return (cached entity or None, current version)
+        Pass the version back to store() after loading from the database.
+        """
+        if not self.enabled:
+            return None, 0
+        key = self._key(kind, entity_id)
+        try:
+            version = self.versions.get(key)
+        except sqlite3.Error as e:
+            print(f"Error reading cache version for {key}: {e}")
+            return None, -1
+        cached = self.backend.get_cached_data(f"{key}:v{version}")
+        ENTITY_CACHE_REQUESTS.inc(kind=kind, result="hit" if cached else "miss")
+        return cached, version
+
+    def store(self, kind: str, entity_id: int, version: int, entity: CachedEntity):
+        if not self.enabled or version < 0:
+            return
+        key = self._key(kind, entity_id)
+        if version > 0:
+            # The previous version can never be read again
+            self.backend.delete_cached_data(f"{key}:v{version - 1}")
+        self.backend.cache_story_data(f"{key}:v{version}", entity, ttl=self.ttl)
+
+    def invalidate(self, entities: Iterable[Tuple[str, int]]):
+        keys = [self._key(kind, entity_id) for kind, entity_id in entities]
+        if not keys or not self.enabled:
+            return
+        try:
+            self.versions.bump(keys)
+        except sqlite3.Error as e:
+            # Stale entries age out after ttl; nothing else we can do here
+            print(f"Error bumping cache versions: {e}")
+            return
+        for kind, _ in entities:
+            ENTITY_CACHE_INVALIDATIONS.inc(kind=kind)
+
+    def get_stats(self) -> dict:
+        stats = {}
+        for kind in CACHED_KINDS.values():
+            hits = ENTITY_CACHE_REQUESTS.get(kind=kind, result="hit")
+            misses = ENTITY_CACHE_REQUESTS.get(kind=kind, result="miss")
+            stats[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else 0.0
+            }
+        return stats
+
+
+def create_version_store():
+    if settings.CACHE_VERSION_STORE == "local":
+        return LocalVersionStore()
+    return SQLiteVersionStore(settings.CACHE_VERSION_PATH)
+
+
+def _memverge_config() -> dict:
+    config = {
+        "backend": settings.CACHE_BACKEND,
+        "shm_path": settings.CACHE_SHM_PATH,
+        "shm_buckets": settings.CACHE_SHM_BUCKETS,
+        "shm_slot_size": settings.CACHE_SHM_SLOT_SIZE,
+    }
+    if settings.MEMVERGE_CONFIG:
+        try:
+            config.update(json.loads(settings.MEMVERGE_CONFIG))
+        except ValueError as e:
+            print(f"Ignoring invalid MEMVERGE_CONFIG: {e}")
+    return config
+
+
+entity_cache = EntityCache(
+    MemVergeService(_memverge_config()),
+    create_version_store(),
+    ttl=settings.ENTITY_CACHE_TTL,
+    enabled=settings.ENTITY_CACHE_ENABLED
+)
+
+
+def _changed_entities(session: Session) -> Set[Tuple[str, int]]:
+    return session.info.setdefault("entity_cache_changes", set())
+
+
+def mark_changed(session: Session, kind: str, entity_ids: Iterable[int]):
+    """
+    Invalidate entities the ORM doesn't see change (bulk deletes, ON DELETE
+    CASCADE children) when `session` commits
+    """
+    _changed_entities(session).update((kind, entity_id) for entity_id in entity_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    """Remember which cached entities this transaction touched"""
+    changes = _changed_entities(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        kind = CACHED_KINDS.get(type(obj))
+        if kind and obj.id is not None:
+            changes.add((kind, obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    """Bump versions only once the new rows are visible to other workers"""
+    changes = session.info.pop("entity_cache_changes", None)
+    if changes:
+        entity_cache.invalidate(sorted(changes))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("entity_cache_changes", None)
@@ -0,0 +1,133 @@
+"""
+Background jobs with progress, stored in the `jobs` table
+Rows are visible to every worker, so a client can poll GET /jobs/{id}
+regardless of which process runs the job.
+
+    job = create_job(db, "delete_branch", params={"branch_id": 1}, total=5000)
+    background_tasks.add_task(run_job, job.id, work)
+
+`work(db, job)` does the work in its own session and calls
+report_progress() as it goes; its return value is stored as the job result.
+Coroutine work (e.g. story generation) goes through run_async_job() instead:
+`work(job)` opens sessions of its own, and none is held while it awaits.
+"""
+import asyncio
+import traceback
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+from sqlalchemy.orm import Session
+from app.db.profiler import profile_queries
+from app.db.session import SessionLocal
+from app.models.database import Job, JobStatus
+from app.services.metrics import registry
+
+JOBS_TOTAL = registry.counter(
+    "jobs_total",
+    "Finished background jobs by kind and status",
+    ("kind", "status")
+)
+JOB_DURATION = registry.histogram(
+    "job_duration_seconds",
+    "Background job run time",
+    ("kind",)
+)
+
+
+def create_job(db: Session, kind: str, params: Optional[dict] = None, total: Optional[int] = None) -> Job:
+    job = Job(kind=kind, params=params, total=total, status=JobStatus.PENDING)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def report_progress(db: Session, job: Job, completed: int, total: Optional[int] = None):
+    """Record progress; commits, so call it between units of work"""
+    job.completed = completed
+    if total is not None:
+        job.total = total
+    db.commit()
+
+
+def run_job(job_id: int, work: Callable[[Session, Job], Optional[dict]]):
+    """Run `work` for a pending job and record the outcome"""
+    # Background tasks inherit the request's context; profile the job on its own
+    # so its queries don't count against the endpoint's query budget
+    with profile_queries(f"job {job_id}"):
+        _run_job(job_id, work)
+
+
+async def run_async_job(job_id: int, work: Callable[[Job], Awaitable[Optional[dict]]]):
+    """
+    run_job() for coroutine work (LLM calls), on the event loop
+    The job is started and finished in short sessions on a worker thread; no
+    connection is held while the work waits (e.g. in the LLM scheduler queue).
+    """
+    with profile_queries(f"job {job_id}"):
+        job = await asyncio.to_thread(_in_session, _start_job, job_id)
+        if not job:
+            return
+        started = datetime.utcnow()
+        try:
+            result = await work(job)
+        except Exception as e:
+            await asyncio.to_thread(_in_session, _finish_job, job, started, error=e)
+        else:
+            await asyncio.to_thread(_in_session, _finish_job, job, started, result=result)
+
+
+def _in_session(function, *args, **kwargs):
+    """Call function(db, ...) in a session of its own; returned rows stay readable (detached)"""
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        return function(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+def _run_job(job_id: int, work: Callable[[Session, Job], Optional[dict]]):
+    # Progress commits shouldn't reload the job row each time
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        job = _start_job(db, job_id)
+        if not job:
+            return
+        started = datetime.utcnow()
+        try:
+            result = work(db, job)
+        except Exception as e:
+            _finish_job(db, job, started, error=e)
+        else:
+            _finish_job(db, job, started, result=result)
+    finally:
+        db.close()
+
+
+def _start_job(db: Session, job_id: int) -> Optional[Job]:
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        print(f"Job {job_id} not found")
+        return None
+    job.status = JobStatus.RUNNING
+    db.commit()
+    return job
+
+
+def _finish_job(db: Session, job: Job, started: datetime, result: Optional[dict] = None,
+                error: Optional[Exception] = None):
+    if error is not None:
+        db.rollback()
+        print(f"Job {job.id} ({job.kind}) failed: {error}")
+        job.status = JobStatus.FAILED
+        job.error = "".join(traceback.format_exception_only(type(error), error)).strip()
+    else:
+        job.status = JobStatus.COMPLETED
+        job.result = result
+        if job.total is not None:
+            job.completed = job.total
+
+    db.add(job)  # detached when started in another session (run_async_job)
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    JOBS_TOTAL.inc(kind=job.kind, status=job.status.value)
+    JOB_DURATION.observe((job.finished_at - started).total_seconds(), kind=job.kind)
@@ -0,0 +1,444 @@
+"""
+Global LLM scheduler
+Every LLM call goes through one queue so a single family bulk-generating
+stories can't exhaust the provider rate limit for everyone else.
+
+- Global tokens-per-minute and requests-per-minute budgets (token buckets)
+- Priority classes: interactive generation is served before background work
+- Round-robin fairness across user_ids within a priority class
+- Queue-wait metrics per priority class
+"""
+import asyncio
+import enum
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+import openai
+from app.db.config import settings
+from app.services.metrics import registry, TOKEN_BUCKETS
+
+LLM_CALL_LATENCY = registry.histogram(
+    "llm_call_duration_seconds",
+    "LLM provider call latency (excluding queue wait)",
+    ("priority",),
+    quantiles=(0.5, 0.95, 0.99)
+)
+LLM_TOKENS = registry.histogram(
+    "llm_call_tokens",
+    "Total tokens (prompt + completion) per LLM call",
+    ("priority",),
+    buckets=TOKEN_BUCKETS
+)
+LLM_QUEUE_WAIT = registry.histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM requests spent queued in the scheduler",
+    ("priority",)
+)
+LLM_CALLS = registry.counter(
+    "llm_calls_total",
+    "LLM calls by priority and outcome",
+    ("priority", "outcome")
+)
+LLM_SCHEDULER_STATE = registry.gauge(
+    "llm_scheduler_requests",
+    "LLM requests pending in the queue or in flight",
+    ("state",)
+)
+
+SYSTEM_PROMPT = "You are a compassionate storyteller helping preserve family memories."
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # user is waiting on the response (story generation)
+    BACKGROUND = 1  # summaries, enrichment, backfills
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Continuously refilling budget of `per_minute` units, at most `burst` (default: a minute's worth) at once"""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.capacity = float(burst or per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """Give back (or, if negative, take more of) an earlier estimate"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class LLMRequest:
+    prompt: str
+    max_tokens: int = 1000
+    user_id: Optional[int] = None
+    priority: Priority = Priority.INTERACTIVE
+    system_prompt: str = SYSTEM_PROMPT
+    temperature: float = 0.7
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def estimated_tokens(self) -> int:
+        return estimate_tokens(self.system_prompt) + estimate_tokens(self.prompt) + self.max_tokens
+
+
+class OpenAIProvider:
+    """Chat completions against the OpenAI API"""
+
+    def __init__(self, model: str = "gpt-4"):
+        self.model = model
+        self._client: Optional[openai.AsyncOpenAI] = None
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        # Created on first use: the constructor rejects a missing API key, and the
+        # client's connection pool belongs to the event loop that first uses it
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._client
+
+    async def complete(self, request: LLMRequest) -> dict:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": request.system_prompt},
+                {"role": "user", "content": request.prompt}
+            ],
+            max_tokens=request.max_tokens,
+            temperature=request.temperature
+        )
+        return {
+            "content": response.choices[0].message.content,
+            "tokens": response.usage.total_tokens if response.usage else 0
+        }
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.embeddings.create(model=settings.EMBEDDING_MODEL, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class FakeLLMProvider:
+    """
+    Local stand-in for the LLM used in tests and benchmarks
+    Simulates a fixed request latency plus a per-token generation rate.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        tokens_per_second: float = 0.0,
+        completion_tokens: int = 200,
+        response_text: Optional[str] = None
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.response_text = response_text
+        self.calls = 0
+
+    async def complete(self, request: LLMRequest) -> dict:
+        self.calls += 1
+        completion_tokens = min(self.completion_tokens, request.max_tokens)
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += completion_tokens / self.tokens_per_second
+        await asyncio.sleep(delay)
+
+        content = self.response_text
+        if content is None:
+            content = self._fake_content(request, completion_tokens)
+        return {
+            "content": content,
+            "tokens": estimate_tokens(request.prompt) + completion_tokens
+        }
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Hashed bag-of-words vectors: deterministic, and similar texts come out similar"""
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        vectors = []
+        for text in texts:
+            vector = [0.0] * 64
+            for word in re.findall(r"[a-z']+", text.lower()):
+                vector[hashlib.blake2b(word.encode(), digest_size=2).digest()[0] % 64] += 1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+    def _fake_content(self, request: LLMRequest, completion_tokens: int) -> str:
+        """Plausibly shaped output, so JSON-parsing code paths are exercised too"""
+        if '"summaries"' in request.prompt:
+            ids = re.findall(r"^\s*\[(\d+)\]\s*$", request.prompt, re.MULTILINE)
+            return json.dumps({"summaries": [{"id": int(i), "summary": "A remembered moment."} for i in ids]})
+        if '"themes"' in request.prompt:
+            return json.dumps({
+                "themes": ["family"],
+                "people": [],
+                "time_period": "childhood",
+                "summary": "A remembered moment."
+            })
+        return " ".join(["memory"] * completion_tokens)
+
+
+class _Ticket:
+    __slots__ = ("request", "future")
+
+    def __init__(self, request: LLMRequest, future: asyncio.Future):
+        self.request = request
+        self.future = future
+
+
+class QueueWaitStats:
+    """Queue wait times for one priority class"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "max": self.max
+        }
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        provider,
+        tokens_per_minute: float,
+        requests_per_minute: float,
+        max_concurrency: int = 16,
+        background_max_wait: float = 30.0
+    ):
+        self.provider = provider
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.max_concurrency = max_concurrency
+        self.background_max_wait = background_max_wait
+
+        # priority -> user_id -> pending tickets; OrderedDict order is the round-robin order
+        self._queues: Dict[Priority, "OrderedDict[Optional[int], Deque[_Ticket]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._pending = 0
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.wait_stats = {priority: QueueWaitStats() for priority in Priority}
+        self.completed = 0
+        self.failed = 0
+        self.tokens_used = 0
+
+    async def submit(self, request: LLMRequest) -> dict:
+        """Queue a request and wait for its completion"""
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        user_queues = self._queues[request.priority]
+        user_queues.setdefault(request.user_id, deque()).append(_Ticket(request, future))
+        self._pending += 1
+        self._wakeup.set()
+        return await future
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+
+    def _peek_ticket(self) -> Optional[_Ticket]:
+        """
+        The next request: highest priority, round-robin across users
+        Stays queued until _take(); callers that gave up are dropped on the way.
+        """
+        background = self._queues[Priority.BACKGROUND]
+        order = list(Priority)
+        if background:
+            # Aging: don't let background work starve behind a steady interactive load
+            oldest = min(queue[0].request.enqueued_at for queue in background.values())
+            if time.monotonic() - oldest > self.background_max_wait:
+                order = [Priority.BACKGROUND, Priority.INTERACTIVE]
+
+        for priority in order:
+            user_queues = self._queues[priority]
+            while user_queues:
+                user_id, queue = next(iter(user_queues.items()))
+                if not queue[0].future.done():
+                    return queue[0]
+                queue.popleft()
+                self._pending -= 1
+                if not queue:
+                    del user_queues[user_id]
+        return None
+
+    def _take(self, ticket: _Ticket):
+        """Dequeue the ticket _peek_ticket() returned (its user goes to the back of the line)"""
+        user_queues = self._queues[ticket.request.priority]
+        user_id, queue = user_queues.popitem(last=False)
+        queue.popleft()
+        if queue:
+            user_queues[user_id] = queue
+        self._pending -= 1
+
+    async def _dispatch_loop(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            await self._slots.acquire()
+
+            ticket = self._peek_ticket()
+            if ticket is None:
+                self._slots.release()
+                continue
+
+            # Wait for global budget before taking the request off the queue,
+            # so that fairness decisions are made as late as possible; the
+            # ticket is picked again afterwards (aging or new arrivals may change it)
+            delay = max(
+                self.request_bucket.wait_time(1),
+                self.token_bucket.wait_time(ticket.request.estimated_tokens)
+            )
+            if delay > 0:
+                self._slots.release()
+                await asyncio.sleep(delay)
+                continue
+
+            self._take(ticket)
+            request = ticket.request
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(request.estimated_tokens)
+            waited = time.monotonic() - request.enqueued_at
+            self.wait_stats[request.priority].observe(waited)
+            LLM_QUEUE_WAIT.observe(waited, priority=request.priority.name.lower())
+            self._in_flight += 1
+            asyncio.get_running_loop().create_task(self._run(ticket))
+
+    async def _run(self, ticket: _Ticket):
+        request = ticket.request
+        priority = request.priority.name.lower()
+        start = time.perf_counter()
+        try:
+            result = await self.provider.complete(request)
+        except Exception as e:
+            self.failed += 1
+            LLM_CALLS.inc(priority=priority, outcome="error")
+            self.token_bucket.refund(request.estimated_tokens)
+            if not ticket.future.done():
+                ticket.future.set_exception(e)
+        else:
+            self.completed += 1
+            tokens = result.get("tokens") or request.estimated_tokens
+            self.tokens_used += tokens
+            LLM_CALLS.inc(priority=priority, outcome="ok")
+            LLM_TOKENS.observe(tokens, priority=priority)
+            self.token_bucket.refund(request.estimated_tokens - tokens)
+            if not ticket.future.done():
+                ticket.future.set_result(result)
+        finally:
+            LLM_CALL_LATENCY.observe(time.perf_counter() - start, priority=priority)
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeddings skip the completion queue: they're cheap, and upstream
+        limits them separately from chat completions
+        """
+        return await self.provider.embed(texts)
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "tokens_used": self.tokens_used,
+            "queue_wait_seconds": {
+                priority.name.lower(): stats.to_dict()
+                for priority, stats in self.wait_stats.items()
+            }
+        }
+
+
+def create_provider():
+    """Build the provider configured by LLM_PROVIDER"""
+    if settings.LLM_PROVIDER == "fake":
+        return FakeLLMProvider(
+            latency=settings.LLM_FAKE_LATENCY,
+            tokens_per_second=settings.LLM_FAKE_TOKENS_PER_SECOND
+        )
+    return OpenAIProvider(model=settings.LLM_MODEL)
+
+
+llm_scheduler = LLMScheduler(
+    provider=create_provider(),
+    # Buckets are per process: each of LLM_RATE_LIMIT_PROCESSES gets its share
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE / settings.LLM_RATE_LIMIT_PROCESSES,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE / settings.LLM_RATE_LIMIT_PROCESSES,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    background_max_wait=settings.LLM_BACKGROUND_MAX_WAIT
+)
+
+
+def _collect_scheduler_metrics():
+    LLM_SCHEDULER_STATE.set(llm_scheduler._pending, state="pending")
+    LLM_SCHEDULER_STATE.set(llm_scheduler._in_flight, state="in_flight")
+
+
+registry.add_collector(_collect_scheduler_metrics)
@@ -4,6 +4,8 @@ MemVerge provides memory-semantic storage and optimization
 """
 from typing import Any, Optional
 import json
+import time
+from app.services.shm_cache import SharedMemoryCache
 
 
 class MemVergeService:
@@ -17,24 +19,53 @@ class MemVergeService:
 
     def __init__(self, config: Optional[dict] = None):
         self.config = config or {}
+        self.max_items = self.config.get("max_items", 10000)
         self.cache = {}  # Simple in-memory cache as fallback
 
+        # "shm": one cache shared by all worker processes on the host (see shm_cache.py)
+        self.shared = None
+        if self.config.get("backend") == "shm":
+            self.shared = SharedMemoryCache(
+                self.config.get("shm_path", "/dev/shm/story_ai_cache"),
+                buckets=self.config.get("shm_buckets", 1024),
+                ways=self.config.get("shm_ways", 4),
+                slot_size=self.config.get("shm_slot_size", 16384)
+            )
+
     def cache_story_data(self, key: str, data: Any, ttl: int = 3600):
         """Cache story data for fast retrieval"""
+        if self.shared:
+            return self.shared.set(key, data, ttl)
+        if key not in self.cache and len(self.cache) >= self.max_items:
+            # Evict the oldest entry (dicts keep insertion order)
+            self.cache.pop(next(iter(self.cache)), None)
         self.cache[key] = {
             "data": data,
-            "ttl": ttl
+            "ttl": ttl,
+            "expires_at": time.monotonic() + ttl
         }
         # TODO: Integrate with actual MemVerge API
         return True
 
     def get_cached_data(self, key: str) -> Optional[Any]:
         """Retrieve cached data"""
+        if self.shared:
+            return self.shared.get(key)
         cached = self.cache.get(key)
         if cached:
+            if cached["expires_at"] < time.monotonic():
+                self.cache.pop(key, None)
+                return None
             return cached["data"]
         return None
 
+    def delete_cached_data(self, key: str):
+        """Remove an entry from the cache"""
+        if self.shared:
+            self.shared.delete(key)
+            return
+        self.cache.pop(key, None)
+
     def optimize_storage(self, story_id: int, content: str):
         """
         Optimize storage for large story content
@@ -61,6 +92,12 @@ class MemVergeService:
 
     def get_memory_stats(self) -> dict:
         """Get memory usage statistics"""
+        if self.shared:
+            return {
+                **self.shared.get_stats(),
+                "cached_items": self.shared.count(),
+                "status": "operational"
+            }
         return {
             "cached_items": len(self.cache),
             "total_size": sum(len(str(v)) for v in self.cache.values()),
@@ -0,0 +1,298 @@
+"""
+Rule-based story metadata extraction (no LLM call)
+- people: kinship terms ("my mother", "Aunt Rose"), honorifics ("Mr. Alvarez")
+  and capitalized names, checked against a first-name gazetteer
+- time_period: decades and years ("1962" -> "1960s"), else a life stage
+  ("when I was 7" -> "childhood", "first job" -> "early career")
+- themes: keyword hits mapped onto StoryBranchType values
+
+extract_batch() runs each pattern once over the whole batch (texts joined
+with a separator, matches assigned back by offset) instead of once per
+story, so backfilling thousands of stories costs a handful of regex scans.
+"""
+import bisect
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from app.models.database import StoryBranchType
+
+SEPARATOR = "\n\x00\n"
+MAX_PEOPLE = 10
+MAX_THEMES = 5
+
+KIN_TERMS = (
+    "mother", "father", "mom", "dad", "mama", "papa", "grandmother", "grandfather", "grandma",
+    "grandpa", "granny", "nana", "brother", "sister", "aunt", "uncle", "cousin", "son", "daughter",
+    "wife", "husband", "niece", "nephew", "grandson", "granddaughter", "stepmother", "stepfather",
+)
+# Kin words that can title a name: "Aunt Rose", "Grandpa Joe"
+KIN_TITLES = ("Aunt", "Auntie", "Uncle", "Grandma", "Grandpa", "Granny", "Nana", "Cousin")
+HONORIFICS = ("Mr", "Mrs", "Ms", "Miss", "Dr", "Father", "Sister", "Reverend", "Coach")
+
+FIRST_NAMES = frozenset("""
+Ada Agnes Al Albert Alice Allen Alma Ann Anna Anne Annie Arthur Barbara Bea Ben Bernard Bess Betty
+Beverly Bill Billy Bob Bobby Bonnie Carl Carol Caroline Catherine Charles Charlie Clara Clarence
+Dan Daniel David Dennis Diane Dolores Don Donald Donna Doris Dorothy Earl Ed Eddie Edith Edna Edward
+Eileen Eleanor Elizabeth Ella Ellen Elmer Elsie Emma Ernest Esther Ethel Eugene Eva Evelyn Florence
+Frances Francis Frank Fred Gary George Georgia Gerald Gladys Glen Gloria Grace Hank Harold Harry
+Hazel Helen Henry Herbert Howard Ida Irene Jack Jackie Jacob James Jane Janet Jean Jerry Jim Jimmy
+Joan Joe John Johnny Joseph Josephine Joyce Juan Judy Julia June Karen Kate Kathleen Kenneth Larry
+Laura Lawrence Leo Leonard Lillian Lily Linda Lloyd Lois Lorraine Louis Louise Lucille Lucy Mabel
+Margaret Maria Marie Marilyn Marion Martha Martin Mary Maurice Max Michael Mike Mildred Minnie Nancy
+Norma Norman Pat Patricia Paul Pauline Pearl Peggy Peter Phyllis Ralph Ray Raymond Richard Robert
+Roger Ron Ronald Rosa Rose Roy Russell Ruth Sally Sam Samuel Sarah Shirley Stanley Steve Susan Ted
+Thelma Theodore Thomas Tom Tommy Vera Victor Viola Virginia Walter Wanda Warren Wayne Wilma William
+Willie
+""".split())
+
+# Capitalized words that aren't names when they start a name match
+NOT_NAMES = frozenset("""
+I I'm I'd I've I'll We Our My Your His Her Their The A An And But Or So Then When While After Before
+That This These Those There Here It It's He She They You Every Each Some One Two Three Back Later Now
+Christmas Easter Thanksgiving Sunday Sunday's Monday Tuesday Wednesday Thursday Friday Saturday
+January February March April May June July August September October November December
+God Lord Church America American English Depression War Army Navy Marines
+""".split()) | frozenset(KIN_TITLES) | frozenset(HONORIFICS)
+
+DECADE_WORDS = {
+    "twenties": 1920, "thirties": 1930, "forties": 1940, "fifties": 1950,
+    "sixties": 1960, "seventies": 1970, "eighties": 1980, "nineties": 1990,
+}
+
+# (pattern, life stage); an age mention is mapped by AGE_STAGES instead
+LIFE_STAGES: List[Tuple[str, str]] = [
+    (r"as a (?:little )?(?:kid|child|boy|girl)|when I was (?:a )?(?:little|small|young|a kid|a child|a boy|a girl)"
+     r"|growing up|grade school|elementary school|kindergarten", "childhood"),
+    (r"high school|as a teenager|in my teens|when I was a teenager|junior high", "teens"),
+    (r"in college|at college|university|freshman year|graduated from college|my dorm", "college"),
+    (r"first job|right out of school|starting out|early in my career"
+     r"|(?:first day|new) at the (?:plant|factory|office|company|mill|store)",
+     "early career"),
+    (r"after (?:the|we got) married|newlyweds?|our wedding|first year of marriage", "early marriage"),
+    (r"when (?:the kids|our kids|the children|our children) were (?:little|small|young)|raising (?:the )?kids"
+     r"|new baby|first baby", "raising a family"),
+    (r"after the war|during the war|in the (?:army|navy|service|marines)|overseas in|deployed", "wartime"),
+    (r"retired|retirement|after I stopped working", "retirement"),
+]
+AGE_STAGES = [(12, "childhood"), (19, "teens"), (29, "young adulthood"), (59, "middle age"), (200, "later life")]
+
+# Keywords match whole words; a trailing * makes one a prefix ("graduat*")
+THEME_KEYWORDS: Dict[StoryBranchType, Tuple[str, ...]] = {
+    StoryBranchType.CHILDHOOD: ("as a kid", "as a child", "growing up", "playground", "toys", "when I was little"),
+    StoryBranchType.EDUCATION: ("school", "teacher*", "college", "university", "class*", "graduat*", "exam*",
+                                "homework"),
+    StoryBranchType.CAREER: ("job*", "work*", "boss", "factory", "office", "promot*", "career", "hired", "plant",
+                             "shift*"),
+    StoryBranchType.FAMILY: ("mother*", "father*", "grandm*", "grandp*", "family", "families", "brother*", "sister*",
+                             "children", "aunt", "uncle", "cousin*", "mom", "dad"),
+    StoryBranchType.TRAVEL: ("trip*", "drove", "train", "flight", "flew", "travel*", "abroad", "visit*", "road trip"),
+    StoryBranchType.HOBBIES: ("fishing", "garden*", "knit*", "painting", "baseball", "music", "dancing", "piano",
+                              "hunting", "cards"),
+    StoryBranchType.RELATIONSHIPS: ("met", "married", "marriage", "love*", "dating", "friend*", "wedding",
+                                    "proposed", "sweetheart"),
+    StoryBranchType.LEARNINGS: ("learned", "lesson*", "taught me", "realized", "never forget", "always said"),
+    StoryBranchType.ADVENTURES: ("adventure*", "camping", "hiking", "explor*", "wilderness", "storm"),
+    StoryBranchType.SKILLS: ("fix*", "build*", "built", "repair*", "sew*", "cook*", "how to", "engine*", "carpent*"),
+    StoryBranchType.ACCOMPLISHMENTS: ("proud", "award*", "won", "achiev*", "first in", "finally made it"),
+    StoryBranchType.FAILURES: ("failed", "mistake*", "regret*", "should have", "fired", "gave up"),
+    StoryBranchType.CHALLENGES: ("hard times", "struggl*", "flood*", "war", "sick", "depression", "tough",
+                                 "didn't have much", "lost"),
+}
+
+
+@dataclass
+class LocalMetadata:
+    people: List[str] = field(default_factory=list)
+    time_period: Optional[str] = None
+    themes: List[str] = field(default_factory=list)
+    summary: Optional[str] = None
+
+    @property
+    def confident(self) -> bool:
+        """Enough was found to skip the LLM (local_first mode)"""
+        return self.time_period is not None and bool(self.themes)
+
+    def to_dict(self) -> dict:
+        return {"people": self.people, "time_period": self.time_period, "themes": self.themes, "summary": self.summary}
+
+
+def _alternation(words) -> str:
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+NAME = r"[A-Z][a-z]+"
+# Second words that make a capitalized pair a place, not a person ("Rose Street")
+PLACE_NOUNS = frozenset("Street Avenue Road Lane Church School County Lake River Park Hall Hospital Mill".split())
+BARE_KIN_TITLES = ("Mom", "Dad", "Mother", "Father", "Mama", "Papa", "Grandma", "Grandpa", "Granny", "Nana")
+
+TITLED_NAME_PATTERN = re.compile(
+    rf"\b(?:(?P<kin>{_alternation(KIN_TITLES)})|(?P<hon>{_alternation(HONORIFICS)})\.?)\s+(?P<name>{NAME}(?:\s+{NAME})?)"
+)
+KIN_PATTERN = re.compile(
+    rf"\b(?:(?i:my|our|your|his|her)\s+(?i:late\s+|older\s+|younger\s+|little\s+|big\s+)?"
+    rf"(?P<kin>(?i:{_alternation(KIN_TERMS)}))|(?P<bare>{_alternation(BARE_KIN_TITLES)})(?!\s+{NAME}))\b"
+)
+CAPITALIZED_PATTERN = re.compile(rf"\b{NAME}(?:\s+{NAME})?\b")
+YEAR_PATTERN = re.compile(r"\b(?P<year>19\d\d|20[0-2]\d)\b")
+# The patterns below run against the lowercased batch (much faster than re.IGNORECASE)
+DECADE_PATTERN = re.compile(
+    rf"(?:\b(?P<full>19\d0|20[0-2]0)'?s|(?:\bthe\s+|')(?P<short>[2-9]0)'?s|\b(?P<word>{_alternation(DECADE_WORDS)}))\b"
+)
+AGE_PATTERN = re.compile(r"\b(?:when i was|i was|at age|aged|the year i turned)\s+(?P<age>\d{1,2})\b")
+STAGE_PATTERN = re.compile(
+    r"\b(?:" + "|".join(f"(?P<stage{i}>{pattern.lower()})" for i, (pattern, _) in enumerate(LIFE_STAGES)) + ")"
+)
+
+
+def _keyword_pattern(keyword: str) -> str:
+    if keyword.endswith("*"):
+        return re.escape(keyword[:-1])
+    return re.escape(keyword) + r"\b"
+
+
+THEME_PATTERN = re.compile(
+    r"\b(?:" + "|".join(
+        f"(?P<{theme.value}>{'|'.join(_keyword_pattern(k.lower()) for k in sorted(keywords, key=len, reverse=True))})"
+        for theme, keywords in THEME_KEYWORDS.items()
+    ) + ")"
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+NOT_SENTENCE_END = frozenset(f"{title}." for title in HONORIFICS)  # "Mr. Alvarez", plus initials ("J. Smith")
+
+
+def _first_sentence(text: str) -> str:
+    for match in SENTENCE_END.finditer(text):
+        word = text[:match.start()].rsplit(" ", 1)[-1].lstrip("(\"'")
+        if word in NOT_SENTENCE_END or (len(word) == 2 and word[0].isupper() and word != "I."):
+            continue
+        return text[:match.start()]
+    return text
+
+
+class _Batch:
+    """Texts joined into one string; maps a match offset back to its text"""
+
+    def __init__(self, texts: List[str]):
+        self.starts = []
+        position = 0
+        for text in texts:
+            self.starts.append(position)
+            position += len(text) + len(SEPARATOR)
+        self.joined = SEPARATOR.join(texts)
+        self.lowered = self.joined.lower()
+        if len(self.lowered) != len(self.joined):
+            # A few non-ASCII characters change length when lowercased; offsets must line up
+            self.lowered = self.joined.encode("ascii", "replace").decode().lower()
+
+    def scan(self, pattern: re.Pattern, lowered: bool = False):
+        for match in pattern.finditer(self.lowered if lowered else self.joined):
+            yield bisect.bisect_right(self.starts, match.start()) - 1, match
+
+
+class LocalMetadataExtractor:
+    def extract(self, text: str) -> LocalMetadata:
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: List[str]) -> List[LocalMetadata]:
+        texts = [text or "" for text in texts]
+        batch = _Batch(texts)
+        people = self._people(batch, len(texts))
+        periods = self._time_periods(batch, len(texts))
+        themes = self._themes(batch, len(texts))
+        return [
+            LocalMetadata(people=people[i], time_period=periods[i], themes=themes[i], summary=self._summary(texts[i]))
+            for i in range(len(texts))
+        ]
+
+    def _people(self, batch: _Batch, count: int) -> List[List[str]]:
+        found: List[Dict[str, str]] = [{} for _ in range(count)]  # lowercased -> display form, in order
+
+        def add(index: int, person: str):
+            key = person.lower()
+            if key not in found[index] and len(found[index]) < MAX_PEOPLE:
+                found[index][key] = person
+
+        for index, match in batch.scan(TITLED_NAME_PATTERN):
+            words = match.group("name").split()
+            if words[0] in NOT_NAMES:
+                continue
+            if words[-1] in PLACE_NOUNS:
+                words = words[:-1]
+            title = match.group("kin") or f"{match.group('hon')}."
+            add(index, " ".join([title, *words]))
+
+        for index, match in batch.scan(KIN_PATTERN):
+            add(index, (match.group("kin") or match.group("bare")).lower())
+
+        # Bare capitalized words are too often places or sentence starts;
+        # only names whose first word is in the gazetteer count
+        for index, match in batch.scan(CAPITALIZED_PATTERN):
+            words = match.group(0).split()
+            if words[0] not in FIRST_NAMES or words[0] in NOT_NAMES or words[-1] in PLACE_NOUNS:
+                continue
+            if len(words) == 2 and words[1] in NOT_NAMES:
+                words = words[:1]  # "Rose And ..." at a line break
+            add(index, " ".join(words))
+
+        # "Rose" adds nothing when "Aunt Rose" or "Rose Miller" is already there,
+        # nor "grandma" next to "Grandma Ruth"
+        results = []
+        for people in found:
+            names = list(people.values())
+            results.append([
+                name for name in names
+                if not any(
+                    other != name and name.lower() in other.lower().split()
+                    for other in names
+                )
+            ])
+        return results
+
+    def _time_periods(self, batch: _Batch, count: int) -> List[Optional[str]]:
+        decades = [Counter() for _ in range(count)]
+        for index, match in batch.scan(DECADE_PATTERN, lowered=True):
+            if match.group("full"):
+                decade = int(match.group("full"))
+            elif match.group("short"):
+                decade = 1900 + int(match.group("short"))
+            else:
+                decade = DECADE_WORDS[match.group("word")]
+            decades[index][f"{decade}s"] += 2  # an explicit decade outweighs a stray year
+        for index, match in batch.scan(YEAR_PATTERN):
+            year = int(match.group("year"))
+            decades[index][f"{year - year % 10}s"] += 1
+
+        stages = [Counter() for _ in range(count)]
+        for index, match in batch.scan(STAGE_PATTERN, lowered=True):
+            stage = LIFE_STAGES[int(match.lastgroup[len("stage"):])][1]
+            stages[index][stage] += 1
+        for index, match in batch.scan(AGE_PATTERN, lowered=True):
+            age = int(match.group("age"))
+            stages[index][next(stage for limit, stage in AGE_STAGES if age <= limit)] += 1
+
+        periods = []
+        for index in range(count):
+            if decades[index]:
+                periods.append(decades[index].most_common(1)[0][0])
+            elif stages[index]:
+                periods.append(stages[index].most_common(1)[0][0])
+            else:
+                periods.append(None)
+        return periods
+
+    def _themes(self, batch: _Batch, count: int) -> List[List[str]]:
+        hits = [Counter() for _ in range(count)]
+        for index, match in batch.scan(THEME_PATTERN, lowered=True):
+            hits[index][match.lastgroup] += 1
+        return [[theme for theme, _ in counter.most_common(MAX_THEMES)] for counter in hits]
+
+    def _summary(self, text: str) -> Optional[str]:
+        text = " ".join(text.split())
+        if not text:
+            return None
+        first = _first_sentence(text)
+        return first if len(first) <= 200 else first[:197].rsplit(" ", 1)[0] + "..."
+
+
+local_extractor = LocalMetadataExtractor()
@@ -0,0 +1,410 @@
+"""
+SMS notifications to relatives
+Events (a newly generated story) are stored as notifications rows, one per
+recipient, and sent by the NotificationDispatcher task:
+
+- Coalescing: an event waits NOTIFY_COALESCE_SECONDS, then everything
+  pending for the same phone number goes out as one SMS ("Rose shared 3 new
+  stories, including ...")
+- Per-recipient limit: a number that got an SMS within
+  NOTIFY_RECIPIENT_INTERVAL_MINUTES waits, and its events keep coalescing
+- Global limit: NOTIFY_SMS_PER_SECOND (token bucket); a 429 pauses sending
+  for its Retry-After
+- Retries: failed sends are retried after NOTIFY_RETRY_BACKOFF_SECONDS,
+  doubling, up to NOTIFY_MAX_ATTEMPTS; numbers Telnyx refuses (4xx) fail at once
+
+Status goes pending -> sending -> sent -> delivered/undelivered (from the
+message.finalized webhook, see record_message_event()). Sends are never on a
+request's path. SMS_SENDER=fake swaps Telnyx for a local stand-in.
+"""
+import asyncio
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import exists, func, insert, update
+from sqlalchemy.orm import Session, aliased
+from app.db.config import settings
+from app.db.session import SessionLocal
+from app.models.database import Notification, NotificationRecipient, NotificationStatus, Story, User
+from app.services.llm_scheduler import TokenBucket
+from app.services.metrics import registry
+from app.services.telnyx_service import TelnyxAPIError, TelnyxService
+
+NOTIFICATIONS_ENQUEUED = registry.counter(
+    "notifications_enqueued_total",
+    "Notification events queued, one per recipient",
+    ("kind",)
+)
+SMS_SENDS = registry.counter(
+    "notification_sms_total",
+    "SMS send attempts by outcome (sent, retry, failed, rate_limited)",
+    ("outcome",)
+)
+SMS_DELIVERIES = registry.counter(
+    "notification_sms_deliveries_total",
+    "Delivery receipts by status",
+    ("status",)
+)
+EVENTS_PER_SMS = registry.histogram(
+    "notification_events_per_sms",
+    "Notification events coalesced into one SMS",
+    buckets=(1, 2, 3, 5, 10, 25, 50)
+)
+SMS_SEND_LATENCY = registry.histogram(
+    "notification_sms_send_seconds",
+    "SMS send request latency"
+)
+QUEUE_PENDING = registry.gauge(
+    "notification_queue_pending",
+    "Notification events waiting to be sent"
+)
+QUEUE_LAG = registry.gauge(
+    "notification_queue_lag_seconds",
+    "Age of the oldest notification event that is due but not sent"
+)
+
+STORY_GENERATED = "story_generated"
+MESSAGE_EVENTS = {"message.finalized"}
+MAX_SMS_LENGTH = 306  # two concatenated segments
+MAX_TITLE_LENGTH = 60
+SENDING_TIMEOUT = timedelta(minutes=5)  # a batch still "sending" after this was lost with its process
+
+
+# Queueing
+
+def notify_story(db: Session, story: Story) -> int:
+    """Queue a story_generated event for each of the user's recipients; caller commits"""
+    recipients = db.query(NotificationRecipient.id, NotificationRecipient.phone_number).filter(
+        NotificationRecipient.user_id == story.user_id
+    ).all()
+    if not recipients:
+        return 0
+    now = datetime.utcnow()
+    due = now + timedelta(seconds=settings.NOTIFY_COALESCE_SECONDS)
+    db.execute(insert(Notification.__table__), [
+        {
+            "recipient_id": recipient.id, "phone_number": recipient.phone_number, "user_id": story.user_id,
+            "story_id": story.id, "kind": STORY_GENERATED, "status": NotificationStatus.PENDING, "attempts": 0,
+            "next_attempt_at": due, "created_at": now, "updated_at": now
+        }
+        for recipient in recipients
+    ])
+    NOTIFICATIONS_ENQUEUED.inc(len(recipients), kind=STORY_GENERATED)
+    return len(recipients)
+
+
+def compose_message(items: List[tuple]) -> str:
+    """One SMS for (storyteller name, story title) pairs, grouped by storyteller"""
+    titles_by_name = OrderedDict()
+    for name, title in items:
+        titles_by_name.setdefault(name, []).append(title)
+    parts = []
+    for name, titles in titles_by_name.items():
+        first = titles[0] if len(titles[0]) <= MAX_TITLE_LENGTH else titles[0][:MAX_TITLE_LENGTH - 1] + "…"
+        if len(titles) == 1:
+            parts.append(f'{name} shared a new story: "{first}"')
+        else:
+            parts.append(f'{name} shared {len(titles)} new stories, including "{first}"')
+    text = "Story AI: " + "; ".join(parts) + "."
+    return text if len(text) <= MAX_SMS_LENGTH else text[:MAX_SMS_LENGTH - 1] + "…"
+
+
+# Sending
+
+@dataclass
+class ClaimedMessage:
+    batch_id: str
+    phone_number: str
+    text: str
+    events: int
+
+
+def claim_due_messages(db: Session, limit: int, now: datetime) -> List[ClaimedMessage]:
+    """Claim everything pending for up to `limit` numbers that are due and outside their rate limit"""
+    recently_sent = aliased(Notification)
+    cutoff = now - timedelta(minutes=settings.NOTIFY_RECIPIENT_INTERVAL_MINUTES)
+    phones = db.query(Notification.phone_number).filter(
+        Notification.status == NotificationStatus.PENDING,
+        Notification.next_attempt_at <= now,
+        ~exists().where(recently_sent.phone_number == Notification.phone_number, recently_sent.sent_at > cutoff)
+    ).group_by(Notification.phone_number).order_by(func.min(Notification.next_attempt_at)).limit(limit).all()
+
+    batches = {}
+    for (phone_number,) in phones:
+        batch_id = str(uuid.uuid4())
+        # Newer events for the number ride along (that's the coalescing)
+        result = db.execute(
+            update(Notification)
+            .where(Notification.phone_number == phone_number, Notification.status == NotificationStatus.PENDING)
+            .values(status=NotificationStatus.SENDING, batch_id=batch_id, attempts=Notification.attempts + 1,
+                    updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            batches[batch_id] = phone_number
+    db.commit()
+    if not batches:
+        return []
+
+    items = {}
+    rows = db.query(Notification.batch_id, User.name, Story.title).join(
+        User, User.id == Notification.user_id
+    ).join(Story, Story.id == Notification.story_id).filter(
+        Notification.batch_id.in_(list(batches))
+    ).order_by(Notification.id)
+    for batch_id, name, title in rows:
+        items.setdefault(batch_id, []).append((name, title))
+    return [
+        ClaimedMessage(batch_id, phone_number, compose_message(items[batch_id]), len(items[batch_id]))
+        for batch_id, phone_number in batches.items() if batch_id in items
+    ]
+
+
+def finish_batch(db: Session, batch_id: str, now: datetime, message_id: Optional[str] = None,
+                 error: Optional[TelnyxAPIError] = None):
+    """Record a send's outcome for every event of the batch"""
+    if error is None:
+        db.execute(
+            update(Notification).where(Notification.batch_id == batch_id)
+            .values(status=NotificationStatus.SENT, message_id=message_id, sent_at=now, error=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        SMS_SENDS.inc(outcome="sent")
+        db.commit()
+        return
+
+    outcome = "rate_limited" if error.status_code == 429 else "retry"
+    for notification in db.query(Notification).filter(Notification.batch_id == batch_id):
+        notification.batch_id = None
+        notification.error = str(error)[:1000]
+        if error.status_code == 429:
+            # Not the recipient's fault: give the attempt back
+            notification.status = NotificationStatus.PENDING
+            notification.attempts -= 1
+            notification.next_attempt_at = now + timedelta(seconds=error.retry_after or 1.0)
+        elif error.retryable and notification.attempts < settings.NOTIFY_MAX_ATTEMPTS:
+            notification.status = NotificationStatus.PENDING
+            backoff = settings.NOTIFY_RETRY_BACKOFF_SECONDS * 2 ** (notification.attempts - 1)
+            notification.next_attempt_at = now + timedelta(seconds=backoff)
+        else:
+            notification.status = NotificationStatus.FAILED
+            outcome = "failed"
+    SMS_SENDS.inc(outcome=outcome)
+    db.commit()
+
+
+def release_stale_batches(db: Session, now: datetime) -> int:
+    """Put events of sends that never finished (process died) back in the queue; the SMS may go out twice"""
+    result = db.execute(
+        update(Notification)
+        .where(Notification.status == NotificationStatus.SENDING, Notification.updated_at < now - SENDING_TIMEOUT)
+        .values(status=NotificationStatus.PENDING, batch_id=None, next_attempt_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def record_message_event(db: Session, event_type: str, payload: dict) -> int:
+    """Apply a Telnyx delivery receipt (message.finalized) to the events sent in that SMS"""
+    if event_type not in MESSAGE_EVENTS or not payload.get("id"):
+        return 0
+    to = (payload.get("to") or [{}])[0]
+    delivered = to.get("status") == "delivered"
+    errors = payload.get("errors") or []
+    result = db.execute(
+        update(Notification)
+        .where(Notification.message_id == payload["id"], Notification.status == NotificationStatus.SENT)
+        .values(
+            status=NotificationStatus.DELIVERED if delivered else NotificationStatus.UNDELIVERED,
+            error=None if delivered else (errors[0].get("detail") if errors else to.get("status")),
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        SMS_DELIVERIES.inc(status="delivered" if delivered else "undelivered")
+    return result.rowcount
+
+
+def queue_stats(db: Session, now: datetime) -> dict:
+    pending, oldest_due = db.query(
+        func.count(Notification.id),
+        func.min(Notification.next_attempt_at)
+    ).filter(Notification.status == NotificationStatus.PENDING).one()
+    return {
+        "pending": pending,
+        "lag_seconds": max(0.0, (now - oldest_due).total_seconds()) if oldest_due else 0.0
+    }
+
+
+# Senders
+
+class TelnyxSmsSender:
+    def __init__(self, telnyx_service: TelnyxService, from_number: str):
+        self.telnyx = telnyx_service
+        self.from_number = from_number
+
+    async def send(self, to_number: str, text: str) -> str:
+        """Returns the Telnyx message id"""
+        return (await self.telnyx.send_sms(to_number, self.from_number, text))["message_id"]
+
+
+class FakeSmsSender:
+    """
+    Local stand-in for Telnyx messaging used in tests and benchmarks
+    Waits `latency`, fails a `failure_rate` share of sends (retryable) and
+    keeps the most recent messages in `sent`.
+    """
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.sent = deque(maxlen=10000)  # (to, text, message id)
+        self.calls = 0
+
+    async def send(self, to_number: str, text: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise TelnyxAPIError("Failed to send SMS: fake failure", status_code=503)
+        message_id = f"fake-{uuid.uuid4().hex}"
+        self.sent.append((to_number, text, message_id))
+        return message_id
+
+
+def create_sender():
+    """Build the sender configured by SMS_SENDER"""
+    if settings.SMS_SENDER == "fake":
+        return FakeSmsSender(latency=settings.SMS_FAKE_LATENCY, failure_rate=settings.SMS_FAKE_FAILURE_RATE)
+    return TelnyxSmsSender(
+        TelnyxService(api_key=settings.TELNYX_API_KEY, api_base=settings.TELNYX_API_BASE),
+        settings.TELNYX_PHONE_NUMBER
+    )
+
+
+class NotificationDispatcher:
+    """
+    Sends due notifications on the event loop, within the rate limits
+    Database work runs in worker threads; each SMS is its own task.
+    """
+
+    def __init__(self, sender, sms_per_second: float = 1.0, poll_interval: float = 1.0, sweep_interval: float = 60.0):
+        self.sender = sender
+        # Bursts of a fifth of a second's messages, as for campaign calls
+        self.bucket = TokenBucket(sms_per_second * 60, burst=max(1.0, sms_per_second / 5))
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.paused_until = 0.0  # monotonic time; set by a 429
+        self._sends = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        registry.add_collector(self._collect)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stop sending; waits for sends in progress"""
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+    async def run(self):
+        last_sweep = 0.0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - last_sweep > self.sweep_interval:
+                    await asyncio.to_thread(self._sweep)
+                    last_sweep = time.monotonic()
+                if not await self.dispatch_due():
+                    await self._sleep(self.poll_interval)
+            except Exception as e:
+                print(f"Error dispatching notifications: {e}")
+                await self._sleep(self.poll_interval)
+
+    async def _sleep(self, seconds: float):
+        """Sleep, waking early on stop()"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def dispatch_due(self) -> int:
+        """Claim as many due messages as the rate limit allows right now and send them; returns how many"""
+        paused = self.paused_until - time.monotonic()
+        if paused > 0:
+            await self._sleep(paused)
+            return 0
+        wait = self.bucket.wait_time(1)
+        if wait:
+            await self._sleep(wait)
+        claimed = await asyncio.to_thread(self._claim, max(1, int(self.bucket.available())))
+        for message in claimed:
+            self.bucket.consume(1)
+            task = asyncio.get_running_loop().create_task(self._send(message))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+        return len(claimed)
+
+    def _claim(self, limit: int) -> List[ClaimedMessage]:
+        db = SessionLocal()
+        try:
+            return claim_due_messages(db, limit, datetime.utcnow())
+        finally:
+            db.close()
+
+    def _sweep(self):
+        db = SessionLocal()
+        try:
+            release_stale_batches(db, datetime.utcnow())
+        finally:
+            db.close()
+
+    async def _send(self, message: ClaimedMessage):
+        EVENTS_PER_SMS.observe(message.events)
+        started = time.perf_counter()
+        message_id, error = None, None
+        try:
+            message_id = await self.sender.send(message.phone_number, message.text)
+        except TelnyxAPIError as e:
+            error = e
+        except Exception as e:
+            error = TelnyxAPIError(f"Failed to send SMS: {e}")
+        SMS_SEND_LATENCY.observe(time.perf_counter() - started)
+        if error is not None and error.status_code == 429:
+            self.paused_until = max(self.paused_until, time.monotonic() + (error.retry_after or 1.0))
+        await asyncio.to_thread(self._finish, message.batch_id, message_id, error)
+
+    def _finish(self, batch_id: str, message_id: Optional[str], error: Optional[TelnyxAPIError]):
+        db = SessionLocal()
+        try:
+            finish_batch(db, batch_id, datetime.utcnow(), message_id=message_id, error=error)
+        finally:
+            db.close()
+
+    def _collect(self):
+        db = SessionLocal()
+        try:
+            stats = queue_stats(db, datetime.utcnow())
+        except Exception:
+            return  # e.g. tables not created yet
+        finally:
+            db.close()
+        QUEUE_PENDING.set(stats["pending"])
+        QUEUE_LAG.set(stats["lag_seconds"])
+
+
+notification_dispatcher = NotificationDispatcher(create_sender(), sms_per_second=settings.NOTIFY_SMS_PER_SECOND)
@@ -0,0 +1,192 @@
+"""
+Caller phone number normalization and lookup
+Maps inbound caller numbers to users without hitting the database on every webhook
+"""
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models.database import User
+from app.db.config import settings
+from app.services.entity_cache import entity_cache
+
+_STRIP_CHARS = re.compile(r"[\s\-\.\(\)/]")
+_E164_MAX_DIGITS = 15
+_E164_MIN_DIGITS = 8
+
+
+def normalize_phone_number(
+    number: Optional[str],
+    default_country_code: Optional[str] = None
+) -> Optional[str]:
+    """
+    Normalize a phone number to E.164 (e.g. "+15551234567")
+    Raises ValueError if the number cannot be normalized
+    """
+    if number is None:
+        return None
+
+    country_code = default_country_code or settings.DEFAULT_PHONE_COUNTRY_CODE
+    cleaned = _STRIP_CHARS.sub("", number.strip())
+    if not cleaned:
+        return None
+
+    if cleaned.startswith("+"):
+        digits = cleaned[1:]
+    elif cleaned.startswith("00"):
+        digits = cleaned[2:]
+    elif len(cleaned) == 11 and cleaned.startswith(country_code) and country_code == "1":
+        # North American numbers dialled with the leading 1
+        digits = cleaned
+    else:
+        digits = country_code + cleaned.lstrip("0")
+
+    if not digits.isdigit() or not _E164_MIN_DIGITS <= len(digits) <= _E164_MAX_DIGITS:
+        raise ValueError(f"Invalid phone number: {number}")
+
+    return f"+{digits}"
+
+
+def try_normalize_phone_number(number: Optional[str]) -> Optional[str]:
+    """Normalize a phone number, returning None instead of raising"""
+    try:
+        return normalize_phone_number(number)
+    except ValueError:
+        return None
+
+
+class CallerCache:
+    """
+    Per-process cache of normalized caller number -> user_id
+    Unknown numbers are cached too (as None) so repeated calls from
+    unregistered numbers don't hit the database either.
+
+    Entries are stored under the number's version in the entity cache's
+    version store (shared by all workers on the host, see entity_cache.py).
+    A committed change to a number bumps its version, so every worker stops
+    serving the old mapping, negative entries included.
+    """
+
+    def __init__(self, versions, ttl: int = 300, negative_ttl: int = 60):
+        self.versions = versions
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[str, Tuple[Optional[int], float, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(number: str) -> str:
+        return f"caller:{number}"
+
+    def version(self, number: str) -> int:
+        """Current version of a number; -1 (don't cache) if the store can't be read"""
+        try:
+            return self.versions.get(self._key(number))
+        except sqlite3.Error as e:
+            print(f"Error reading caller cache version for {number}: {e}")
+            return -1
+
+    def get(self, number: str) -> Tuple[bool, Optional[int], int]:
+        """Return (found, user_id, version) for a normalized number; pass the version to set()"""
+        version = self.version(number)
+        entry = self._entries.get(number)
+        if entry is None or entry[1] < time.monotonic() or entry[2] != version or version < 0:
+            self.misses += 1
+            return False, None, version
+        self.hits += 1
+        return True, entry[0], version
+
+    def set(self, number: str, user_id: Optional[int], version: int):
+        if version < 0:
+            return
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        with self._lock:
+            self._entries[number] = (user_id, time.monotonic() + ttl, version)
+
+    def invalidate_numbers(self, numbers: Iterable[str]):
+        """Make every worker's entries for these numbers stale"""
+        numbers = sorted({number for number in numbers if number})
+        if not numbers:
+            return
+        with self._lock:
+            for number in numbers:
+                self._entries.pop(number, None)
+        try:
+            self.versions.bump([self._key(number) for number in numbers])
+        except sqlite3.Error as e:
+            # Other workers' entries age out after ttl
+            print(f"Error bumping caller cache versions: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+caller_cache = CallerCache(entity_cache.versions, ttl=settings.CALLER_CACHE_TTL)
+
+
+def resolve_user_id(db: Session, phone_number: Optional[str]) -> Optional[int]:
+    """
+    Resolve a caller number to a user_id
+    Served from the cache when possible (no round-trip to the main database)
+    """
+    number = try_normalize_phone_number(phone_number)
+    if not number:
+        return None
+
+    # Version taken before the query: a change committed meanwhile makes this entry stale
+    found, user_id, version = caller_cache.get(number)
+    if found:
+        return user_id
+
+    row = db.query(User.id).filter(User.phone_number == number).first()
+    user_id = row[0] if row else None
+    caller_cache.set(number, user_id, version)
+    return user_id
+
+
+def _changed_numbers(session: Session) -> Set[str]:
+    return session.info.setdefault("caller_cache_changes", set())
+
+
+def mark_numbers_changed(session: Session, numbers: Iterable[str]):
+    """Invalidate caller numbers the ORM doesn't see change (bulk updates) when `session` commits"""
+    _changed_numbers(session).update(number for number in numbers if number)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_numbers(session, flush_context):
+    """Old and new numbers of users this transaction inserted, changed or deleted"""
+    numbers = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User):
+            continue
+        history = inspect(obj).attrs.phone_number.history
+        if numbers is None:
+            numbers = _changed_numbers(session)
+        numbers.update(n for n in (*history.added, *history.unchanged, *history.deleted) if n)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    """Only once the change is visible to other workers' queries"""
+    numbers = session.info.pop("caller_cache_changes", None)
+    if numbers:
+        caller_cache.invalidate_numbers(numbers)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_numbers(session):
+    session.info.pop("caller_cache_changes", None)
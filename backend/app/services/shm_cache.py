@@ -0,0 +1,254 @@
+"""
+Cache shared by every worker process on a host, in a memory-mapped file
+(/dev/shm by default, so it never touches disk)
+
+Layout: a header, then `buckets` x `ways` fixed-size slots (set-associative).
+A key hashes (blake2b) to one bucket and may live in any of its slots:
+
+    slot = [seq u32][pad][hash u64][expires f64][value_len u32][key_len u16][pad] key value
+
+- Readers take no locks: each slot is a seqlock. Writers make `seq` odd while
+  writing and even again when done; a reader that sees an odd or changed seq
+  retries, then treats the lookup as a miss.
+- Writers lock only their bucket's byte range with fcntl, so writes to
+  different buckets never contend. fcntl locks are per process, so threads
+  of one worker also take a striped threading lock.
+- Full buckets evict the slot closest to expiry.
+
+Values are pickled; ones bigger than a slot are not cached (counted in stats).
+
+The file name carries a hash of the layout (`<path>-<layout>.shm`), so workers
+started with another config or code version get their own file instead of
+reformatting one that others still have mapped. A new file is formatted under
+a temporary name and linked into place, and an existing one is never resized.
+"""
+import fcntl
+import glob
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Any, Optional
+
+MAGIC = 0x53544F52  # "STOR"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<IIIIQ")  # magic, layout version, buckets, ways, slot size
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<I4xQdIH2x")  # seq, hash, expires, value_len, key_len
+SEQ = struct.Struct("<I")
+MAX_KEY_SIZE = 256
+READ_RETRIES = 3
+
+
+def key_hash(key: bytes) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def layout_path(path: str, buckets: int, ways: int, slot_size: int) -> str:
+    layout = HEADER.pack(MAGIC, LAYOUT_VERSION, buckets, ways, slot_size)
+    return f"{path}-{hashlib.blake2b(layout, digest_size=6).hexdigest()}.shm"
+
+
+class SharedMemoryCache:
+    def __init__(self, path: str, buckets: int = 1024, ways: int = 4, slot_size: int = 16384):
+        self.buckets = buckets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.size = HEADER_SIZE + buckets * ways * slot_size
+        self.hits = 0
+        self.misses = 0
+        self.too_large = 0
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+
+        self.path = layout_path(path, buckets, ways, slot_size)
+        self._fd = self._open(path)
+        self._mm = mmap.mmap(self._fd, self.size)
+
+    def _open(self, base_path: str) -> int:
+        """Open this layout's file, creating it fully formatted if nobody has yet"""
+        while True:
+            try:
+                fd = os.open(self.path, os.O_RDWR)
+            except FileNotFoundError:
+                pass
+            else:
+                if self._valid_header(fd):
+                    return fd
+                os.close(fd)
+                raise RuntimeError(f"{self.path} is not a cache file for this layout; remove it and restart")
+
+            temp_path = f"{self.path}.{os.urandom(4).hex()}.tmp"
+            fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, HEADER.pack(MAGIC, LAYOUT_VERSION, self.buckets, self.ways, self.slot_size), 0)
+                os.link(temp_path, self.path)  # unlike rename, fails if another worker got there first
+            except FileExistsError:
+                os.close(fd)
+                continue
+            except BaseException:
+                os.close(fd)
+                raise
+            finally:
+                os.unlink(temp_path)
+            self._remove_stale(base_path)
+            return fd
+
+    def _remove_stale(self, base_path: str):
+        # Files of older layouts: workers still mapping one keep it until they exit
+        for stale in glob.glob(f"{glob.escape(base_path)}-*.shm"):
+            if stale != self.path:
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+
+    def _valid_header(self, fd: int) -> bool:
+        if os.fstat(fd).st_size != self.size:
+            return False
+        header = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        return header == (MAGIC, LAYOUT_VERSION, self.buckets, self.ways, self.slot_size)
+
+    def _bucket_offset(self, hashed: int) -> int:
+        return HEADER_SIZE + (hashed % self.buckets) * self.ways * self.slot_size
+
+    def _slot_offsets(self, bucket: int):
+        return [bucket + way * self.slot_size for way in range(self.ways)]
+
+    def get(self, key: str) -> Optional[Any]:
+        raw_key = key.encode()
+        hashed = key_hash(raw_key)
+        for offset in self._slot_offsets(self._bucket_offset(hashed)):
+            value = self._read_slot(offset, hashed, raw_key)
+            if value is not None:
+                self.hits += 1
+                return pickle.loads(value)
+        self.misses += 1
+        return None
+
+    def _read_slot(self, offset: int, hashed: int, raw_key: bytes) -> Optional[bytes]:
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            seq, slot_hash, expires, value_len, key_len = SLOT_HEADER.unpack_from(mm, offset)
+            if slot_hash != hashed:
+                return None
+            if seq & 1:
+                continue  # being written
+            start = offset + SLOT_HEADER.size
+            stored_key = mm[start:start + key_len]
+            value = mm[start + key_len:start + key_len + value_len]
+            if SEQ.unpack_from(mm, offset)[0] != seq:
+                continue  # changed while we copied it
+            if stored_key != raw_key or expires < time.time():
+                return None
+            return value
+        return None
+
+    def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
+        raw_key = key.encode()
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(raw_key) > MAX_KEY_SIZE or SLOT_HEADER.size + len(raw_key) + len(payload) > self.slot_size:
+            self.too_large += 1
+            return False
+
+        hashed = key_hash(raw_key)
+        bucket = self._bucket_offset(hashed)
+        with self._locked(bucket):
+            offset = self._choose_slot(bucket, hashed, raw_key)
+            self._write_slot(offset, hashed, time.time() + ttl, raw_key, payload)
+        return True
+
+    def delete(self, key: str):
+        raw_key = key.encode()
+        hashed = key_hash(raw_key)
+        bucket = self._bucket_offset(hashed)
+        with self._locked(bucket):
+            for offset in self._slot_offsets(bucket):
+                _, slot_hash, _, _, key_len = SLOT_HEADER.unpack_from(self._mm, offset)
+                start = offset + SLOT_HEADER.size
+                if slot_hash == hashed and self._mm[start:start + key_len] == raw_key:
+                    self._write_slot(offset, 0, 0.0, b"", b"")
+
+    def _choose_slot(self, bucket: int, hashed: int, raw_key: bytes) -> int:
+        """Same key, else an empty or expired slot, else the one expiring soonest"""
+        now = time.time()
+        victim, victim_expires = None, None
+        for offset in self._slot_offsets(bucket):
+            _, slot_hash, expires, _, key_len = SLOT_HEADER.unpack_from(self._mm, offset)
+            start = offset + SLOT_HEADER.size
+            if slot_hash == hashed and self._mm[start:start + key_len] == raw_key:
+                return offset
+            if slot_hash == 0 or expires < now:
+                expires = 0.0
+            if victim is None or expires < victim_expires:
+                victim, victim_expires = offset, expires
+        return victim
+
+    def _write_slot(self, offset: int, hashed: int, expires: float, raw_key: bytes, payload: bytes):
+        mm = self._mm
+        seq = SEQ.unpack_from(mm, offset)[0]
+        SEQ.pack_into(mm, offset, seq + 1)  # odd: readers back off
+        start = offset + SLOT_HEADER.size
+        mm[start:start + len(raw_key)] = raw_key
+        mm[start + len(raw_key):start + len(raw_key) + len(payload)] = payload
+        SLOT_HEADER.pack_into(mm, offset, seq + 1, hashed, expires, len(payload), len(raw_key))
+        SEQ.pack_into(mm, offset, seq + 2)
+
+    def _locked(self, bucket: int):
+        thread_lock = self._thread_locks[(bucket // (self.ways * self.slot_size)) % len(self._thread_locks)]
+        return _RangeLock(self._fd, bucket, self.ways * self.slot_size, thread_lock)
+
+    def clear(self):
+        with _RangeLock(self._fd, HEADER_SIZE, self.size - HEADER_SIZE):
+            for bucket in range(self.buckets):
+                for offset in self._slot_offsets(HEADER_SIZE + bucket * self.ways * self.slot_size):
+                    if SLOT_HEADER.unpack_from(self._mm, offset)[1]:
+                        self._write_slot(offset, 0, 0.0, b"", b"")
+
+    def count(self) -> int:
+        """Live entries (scans every slot header)"""
+        now = time.time()
+        live = 0
+        for index in range(self.buckets * self.ways):
+            _, slot_hash, expires, _, _ = SLOT_HEADER.unpack_from(self._mm, HEADER_SIZE + index * self.slot_size)
+            if slot_hash and expires >= now:
+                live += 1
+        return live
+
+    def get_stats(self) -> dict:
+        return {
+            "path": self.path,
+            "capacity": self.buckets * self.ways,
+            "size_bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "too_large": self.too_large,
+        }
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+class _RangeLock:
+    """Exclusive fcntl lock on a byte range of the cache file, plus a thread lock within the process"""
+
+    def __init__(self, fd: int, start: int, length: int, thread_lock: Optional[threading.Lock] = None):
+        self.fd = fd
+        self.start = start
+        self.length = length
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        if self.thread_lock:
+            self.thread_lock.acquire()
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.start)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
+        if self.thread_lock:
+            self.thread_lock.release()
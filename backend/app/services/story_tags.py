@@ -0,0 +1,216 @@
+"""
+Normalized people/theme index for stories
+Story.people_mentioned and key_themes are JSON lists, which no index can
+look into portably. Each value is also stored as a story_tags row
+(story, kind, normalized key), so "stories mentioning Aunt Rose" is an
+indexed lookup, and user_tag_counts keeps stories per person/theme for the
+frequency lists.
+
+Both tables are maintained from the session: after every flush, the old and
+new values of created, updated and deleted stories are diffed (Story loads
+the old value on assignment, see active_history) and only the difference is
+written, with counts adjusted by upsert. Writes the ORM doesn't see must
+call reindex_stories() (bulk updates) or forget_stories() (bulk deletes,
+ON DELETE CASCADE from a memory branch), like entity_cache.mark_changed().
+Deleting a user removes both through the user_id foreign keys.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, event, inspect, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.database import Story, StoryTag, UserTagCount
+
+PERSON = "person"
+THEME = "theme"
+MAX_KEY_LENGTH = 255
+POSSESSIVES = {"my", "our", "your", "his", "her", "their"}
+
+TagMap = Dict[Tuple[str, str], str]  # (kind, key) -> label
+
+
+def tag_key(kind: str, name: str) -> str:
+    """Normalized lookup key: "My Aunt Rose" and "aunt rose" are the same person"""
+    words = re.sub(r"[.,;:!?\"]", " ", name or "").lower().split()
+    if kind == PERSON:
+        while len(words) > 1 and words[0] in POSSESSIVES:
+            words = words[1:]
+    return " ".join(words)[:MAX_KEY_LENGTH]
+
+
+def story_tags(people: Optional[list], themes: Optional[list]) -> TagMap:
+    tags: TagMap = {}
+    for kind, values in ((PERSON, people), (THEME, themes)):
+        for value in values or []:
+            if not isinstance(value, str):
+                continue
+            key = tag_key(kind, value)
+            if key:
+                tags.setdefault((kind, key), value.strip()[:MAX_KEY_LENGTH])
+    return tags
+
+
+# (story id, user id, tags before, tags after, story deleted)
+Change = Tuple[int, int, TagMap, TagMap, bool]
+
+
+def _apply(connection, changes: List[Change]):
+    """Write the difference: at most one statement each for removed tags, added tags, counts and cleanup"""
+    removed, added = [], []
+    deltas: Dict[Tuple[int, str, str], list] = {}
+    for story_id, user_id, old, new, deleted in changes:
+        for tag in old.keys() - new.keys():
+            if not deleted:  # a deleted story's rows go with ON DELETE CASCADE
+                removed.append((story_id, *tag))
+            deltas.setdefault((user_id, *tag), [0, old[tag]])[0] -= 1
+        for tag in new.keys() - old.keys():
+            added.append({"story_id": story_id, "kind": tag[0], "key": tag[1], "user_id": user_id, "label": new[tag]})
+            deltas.setdefault((user_id, *tag), [0, new[tag]])[0] += 1
+
+    tags = StoryTag.__table__
+    if removed:
+        connection.execute(delete(tags).where(tuple_(tags.c.story_id, tags.c.kind, tags.c.key).in_(removed)))
+    if added:
+        connection.execute(insert(tags), added)
+
+    counts = [
+        {"user_id": user_id, "kind": kind, "key": key, "label": label, "story_count": delta}
+        for (user_id, kind, key), (delta, label) in deltas.items() if delta
+    ]
+    if counts:
+        _upsert_counts(connection, counts)
+    decremented_users = {row["user_id"] for row in counts if row["story_count"] < 0}
+    if decremented_users:
+        table = UserTagCount.__table__
+        connection.execute(delete(table).where(table.c.user_id.in_(decremented_users), table.c.story_count <= 0))
+
+
+def _upsert_counts(connection, rows: List[dict]):
+    """story_count += delta, inserting missing rows"""
+    table = UserTagCount.__table__
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(connection.dialect.name)
+    if dialect:
+        statement = dialect.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.kind, table.c.key],
+            set_={"story_count": table.c.story_count + statement.excluded.story_count}
+        )
+        connection.execute(statement, rows)
+        return
+
+    # Other databases: update, then insert what didn't exist
+    for row in rows:
+        result = connection.execute(
+            update(table).where(
+                table.c.user_id == row["user_id"], table.c.kind == row["kind"], table.c.key == row["key"]
+            ).values(story_count=table.c.story_count + row["story_count"])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table), row)
+
+
+def _value(history, before: bool):
+    """A column's value before or after the flush, from its attribute history"""
+    changed = history.deleted if before else history.added
+    if changed:
+        return changed[0]
+    return history.unchanged[0] if history.unchanged else None
+
+
+def _tags_from_history(state, before: bool) -> TagMap:
+    return story_tags(
+        _value(state.attrs.people_mentioned.history, before),
+        _value(state.attrs.key_themes.history, before)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_tags(session, flush_context, instances):
+    """Deleted stories need their values for the counts; load them while the row still exists"""
+    for obj in session.deleted:
+        if isinstance(obj, Story):
+            unloaded = inspect(obj).unloaded
+            if "people_mentioned" in unloaded or "key_themes" in unloaded:
+                session.refresh(obj, ["people_mentioned", "key_themes"])
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_story_tags(session, flush_context):
+    """Bring story_tags/user_tag_counts in line with the stories this flush wrote"""
+    changes: List[Change] = []
+    # session.new/dirty/deleted and attribute histories still describe the flush here
+    for obj in session.new:
+        if isinstance(obj, Story):
+            changes.append((obj.id, obj.user_id, {}, story_tags(obj.people_mentioned, obj.key_themes), False))
+    for obj in session.dirty:
+        if isinstance(obj, Story):
+            state = inspect(obj)
+            if state.attrs.people_mentioned.history.has_changes() or state.attrs.key_themes.history.has_changes():
+                changes.append((
+                    obj.id, obj.user_id, _tags_from_history(state, True), _tags_from_history(state, False), False
+                ))
+    for obj in session.deleted:
+        if isinstance(obj, Story):
+            changes.append((obj.id, obj.user_id, _tags_from_history(inspect(obj), True), {}, True))
+    if changes:
+        _apply(session.connection(), changes)
+
+
+def _indexed_tags(db: Session, story_ids: List[int]) -> Dict[int, Tuple[int, TagMap]]:
+    """story id -> (user id, tags currently in story_tags)"""
+    indexed: Dict[int, Tuple[int, TagMap]] = {}
+    rows = db.query(StoryTag.story_id, StoryTag.user_id, StoryTag.kind, StoryTag.key, StoryTag.label).filter(
+        StoryTag.story_id.in_(story_ids)
+    )
+    for row in rows:
+        indexed.setdefault(row.story_id, (row.user_id, {}))[1][(row.kind, row.key)] = row.label
+    return indexed
+
+
+def reindex_stories(db: Session, story_ids: Iterable[int]):
+    """Re-sync stories whose people/themes were changed outside the ORM (bulk UPDATE); caller commits"""
+    story_ids = list(story_ids)
+    if not story_ids:
+        return
+    indexed = _indexed_tags(db, story_ids)
+    stories = db.query(Story.id, Story.user_id, Story.people_mentioned, Story.key_themes).filter(
+        Story.id.in_(story_ids)
+    ).all()
+    _apply(db.connection(), [
+        (story.id, story.user_id, indexed.get(story.id, (None, {}))[1],
+         story_tags(story.people_mentioned, story.key_themes), False)
+        for story in stories
+    ])
+
+
+def forget_stories(db: Session, story_ids: Iterable[int]):
+    """Take stories that are about to be deleted outside the ORM out of the counts"""
+    story_ids = list(story_ids)
+    if not story_ids:
+        return
+    _apply(db.connection(), [
+        (story_id, user_id, tags, {}, True)
+        for story_id, (user_id, tags) in _indexed_tags(db, story_ids).items()
+    ])
+
+
+def tagged_story_criteria(user_id: int, kind: str, name: str) -> list:
+    """Filter for a user's stories tagged with a person/theme (index lookup on story_tags)"""
+    return [
+        Story.user_id == user_id,
+        Story.id.in_(select(StoryTag.story_id).where(
+            StoryTag.user_id == user_id,
+            StoryTag.kind == kind,
+            StoryTag.key == tag_key(kind, name)
+        ))
+    ]
+
+
+def tag_counts(db: Session, user_id: int, kind: str, limit: int = 100) -> List[dict]:
+    """Most frequent people/themes of a user, from the maintained counts"""
+    rows = db.query(UserTagCount.label, UserTagCount.story_count).filter(
+        UserTagCount.user_id == user_id,
+        UserTagCount.kind == kind,
+        UserTagCount.story_count > 0
+    ).order_by(UserTagCount.story_count.desc(), UserTagCount.key).limit(limit)
+    return [{"name": row.label, "story_count": row.story_count} for row in rows]
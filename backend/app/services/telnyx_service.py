@@ -1,37 +1,90 @@
+import asyncio
+import base64
 import telnyx
 import httpx
-from typing import Dict
+from time import perf_counter
+from typing import Dict, Optional
+from app.db.config import settings
+from app.services.blob_store import blob_store, BlobInfo
+from app.services.metrics import registry
+
+TRANSCRIPTION_LATENCY = registry.histogram(
+    "transcription_duration_seconds",
+    "Time to download and transcribe a recording",
+    ("outcome",)
+)
+
+
+class TelnyxAPIError(Exception):
+    """A Telnyx API request that was refused (status_code) or didn't get through (None)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after  # seconds, from a 429's Retry-After
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
 
 
 class TelnyxService:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, api_base: str = "https://api.telnyx.com"):
         self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
         telnyx.api_key = api_key
 
-    async def make_call(self, to_number: str, from_number: str) -> Dict:
-        """Initiate an outbound call"""
-        try:
-            call = telnyx.Call.create(
-                connection_id="your_connection_id",  # Configure in settings
-                to=to_number,
-                from_=from_number,
-                webhook_url="https://your-domain.com/api/v1/voice/webhook"
-            )
-            return call
-        except Exception as e:
-            raise Exception(f"Failed to initiate call: {e}")
+    async def make_call(
+        self,
+        to_number: str,
+        from_number: str,
+        client_state: Optional[str] = None,
+        record: bool = False,
+        timeout_secs: int = 60
+    ) -> Dict:
+        """
+        Initiate an outbound call (Call Control dial); returns the call's data
+        (call_control_id, ...). client_state comes back on every webhook event
+        of the call; record=True records from answer, so the recording arrives
+        as a call.recording.saved event.
+        """
+        body = {
+            "connection_id": settings.TELNYX_CONNECTION_ID,
+            "to": to_number,
+            "from": from_number,
+            "webhook_url": settings.TELNYX_WEBHOOK_URL,
+            "timeout_secs": timeout_secs,
+        }
+        if client_state:
+            body["client_state"] = base64.b64encode(client_state.encode()).decode()
+        if record:
+            body["record"] = "record-from-answer"
+            body["record_format"] = "mp3"
+
+        return await self._post("/v2/calls", body, "Failed to initiate call")
 
-    async def transcribe_audio(self, audio_url: str) -> Dict:
+    async def download_recording(self, recording_url: str) -> BlobInfo:
+        """Stream a recording into the local blob store (deduplicated by content)"""
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            async with client.stream("GET", recording_url) as response:
+                response.raise_for_status()
+                return await blob_store.put_async_chunks(response.aiter_bytes())
+
+    async def transcribe_audio(self, audio_url: str, audio_blob_key: Optional[str] = None) -> Dict:
         """
-        Transcribe audio from URL
+        Transcribe audio from URL, or from the blob store when already downloaded
         You can use Telnyx's transcription or integrate with OpenAI Whisper
         """
+        start = perf_counter()
         try:
             # Option 1: Use OpenAI Whisper API
             # Download audio and send to Whisper
-            async with httpx.AsyncClient() as client:
-                audio_response = await client.get(audio_url)
-                audio_data = audio_response.content
+            if audio_blob_key:
+                audio_data = await asyncio.to_thread(blob_store.read_bytes, audio_blob_key)
+            else:
+                async with httpx.AsyncClient() as client:
+                    audio_response = await client.get(audio_url)
+                    audio_data = audio_response.content
 
             # Use OpenAI Whisper or similar service
             # This is a placeholder - integrate with your preferred transcription service
@@ -42,19 +95,35 @@ class TelnyxService:
                 "language": "en"
             }
 
+            TRANSCRIPTION_LATENCY.observe(perf_counter() - start, outcome="ok")
             return transcription
 
         except Exception as e:
+            TRANSCRIPTION_LATENCY.observe(perf_counter() - start, outcome="error")
             raise Exception(f"Failed to transcribe audio: {e}")
 
     async def send_sms(self, to_number: str, from_number: str, text: str) -> Dict:
-        """Send SMS notification"""
+        """Send an SMS; delivery is reported later by a message.finalized webhook"""
+        body = {"from": from_number, "to": to_number, "text": text, "webhook_url": settings.TELNYX_WEBHOOK_URL}
+        data = await self._post("/v2/messages", body, "Failed to send SMS")
+        return {"status": "sent", "message_id": data.get("id")}
+
+    async def _post(self, path: str, body: dict, failure: str) -> Dict:
+        """POST to the Telnyx API; returns the response's data, raises TelnyxAPIError"""
         try:
-            message = telnyx.Message.create(
-                from_=from_number,
-                to=to_number,
-                text=text
+            async with httpx.AsyncClient(timeout=15.0) as client:
+                response = await client.post(
+                    f"{self.api_base}{path}",
+                    json=body,
+                    headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+                )
+        except httpx.HTTPError as e:
+            raise TelnyxAPIError(f"{failure}: {e}")
+        if response.status_code >= 400:
+            retry_after = response.headers.get("Retry-After")
+            raise TelnyxAPIError(
+                f"{failure}: {response.status_code} {response.text[:200]}",
+                status_code=response.status_code,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
             )
-            return {"status": "sent", "message_id": message.id}
-        except Exception as e:
-            raise Exception(f"Failed to send SMS: {e}")
+        return response.json().get("data", {})
@@ -0,0 +1,281 @@
+"""
+Materialized per-user timeline of stories
+Story.time_period is free text ("1960s", "early career", "when I was 7").
+parse_time_period() turns it into a year range: absolute periods (years,
+decades, named eras) directly, life stages and ages as an age range that
+resolve_period() places using the user's birth_year.
+
+Each story has one timeline_entries row with its range and a sort_year,
+indexed per user, so GET /users/{id}/timeline is a keyset range scan and
+nothing is sorted on read. Rows are kept current from the session like
+story_tags: after a flush, created and updated stories are re-placed, deleted
+stories go with ON DELETE CASCADE, and a changed birth_year re-places all of
+the user's stories. Bulk UPDATEs of stories must call refresh_timeline().
+"""
+import base64
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, event, inspect, insert, select, tuple_
+from sqlalchemy.orm import Session
+from app.models.database import Story, TimelineEntry, User
+
+UNDATED_SORT_YEAR = 9999  # undated stories come last
+TIMELINE_FIELDS = ("title", "time_period", "memory_branch_id")
+
+# Ages (inclusive) covered by a life stage; names match metadata_extractor's
+STAGE_AGES: Dict[str, Tuple[int, int]] = {
+    "childhood": (0, 12),
+    "teens": (13, 19),
+    "college": (18, 22),
+    "young adulthood": (20, 29),
+    "early career": (22, 30),
+    "early marriage": (22, 30),
+    "raising a family": (25, 45),
+    "middle age": (30, 59),
+    "retirement": (62, 85),
+    "later life": (60, 85),
+    "wartime": (17, 35),  # resolved to the war the user was of service age in
+}
+# Free-text spellings of the stages, checked in order
+STAGE_WORDS: List[Tuple[str, str]] = [
+    (r"young adult", "young adulthood"),
+    (r"middle age|midlife|mid-life", "middle age"),
+    (r"later life|old age|golden years", "later life"),
+    (r"retire", "retirement"),
+    (r"teen|high school|junior high|adolescen", "teens"),
+    (r"college|university", "college"),
+    (r"career|first job|working years", "early career"),
+    (r"marri|wedding|newlywed", "early marriage"),
+    (r"raising|kids were|children were|parenthood|family years", "raising a family"),
+    (r"child|growing up|kid|grade school|elementary|kindergarten|boyhood|girlhood|youth", "childhood"),
+    (r"war\b|wartime|army|navy|military|the service|deployed", "wartime"),
+]
+STAGE_PATTERN = re.compile("|".join(f"(?P<s{i}>{pattern})" for i, (pattern, _) in enumerate(STAGE_WORDS)))
+
+# Named eras (checked before stages: "world war ii" is absolute, "the war" is not)
+ERAS: List[Tuple[str, Tuple[int, int]]] = [
+    (r"great depression|the depression", (1929, 1939)),
+    (r"world war (?:ii|2|two)|second world war|ww ?(?:ii|2)", (1939, 1945)),
+    (r"world war (?:i|1|one)\b|first world war|great war|ww ?(?:i|1)\b", (1914, 1918)),
+    (r"korean war|korea", (1950, 1953)),
+    (r"vietnam", (1964, 1975)),
+    (r"gulf war", (1990, 1991)),
+]
+ERA_PATTERN = re.compile("|".join(f"(?P<e{i}>{pattern})" for i, (pattern, _) in enumerate(ERAS)))
+WARS = sorted(years for _, years in ERAS if years != (1929, 1939))
+
+DECADE_WORDS = {
+    "twenties": 1920, "thirties": 1930, "forties": 1940, "fifties": 1950,
+    "sixties": 1960, "seventies": 1970, "eighties": 1980, "nineties": 1990,
+}
+_DECADE = rf"(?:(?P<{{n}}full>1[89]\d0|20[0-2]0)'?s|(?:the\s+|')?(?P<{{n}}short>[2-9]0)'?s|(?P<{{n}}word>{'|'.join(DECADE_WORDS)}))"
+PART_PATTERN = re.compile(r"\b(?P<part>early|mid|late)[\s-]+" + _DECADE.format(n="a") + r"\b")
+DECADE_RANGE_PATTERN = re.compile(r"\b" + _DECADE.format(n="a") + r"\s*(?:-|–|to|through|and)\s*" + _DECADE.format(n="b") + r"\b")
+DECADE_PATTERN = re.compile(r"\b" + _DECADE.format(n="a") + r"\b")
+YEAR_RANGE_PATTERN = re.compile(r"\b(?P<start>1[89]\d\d|20\d\d)\s*(?:-|–|to|through)\s*(?P<end>1[89]\d\d|20\d\d|\d\d)\b")
+YEAR_PATTERN = re.compile(r"\b(?P<year>1[89]\d\d|20\d\d)\b")
+AGE_PATTERN = re.compile(r"\b(?:age|aged|when i was|i was|at)\s+(?P<age>\d{1,2})\b|\b(?P<age2>\d{1,2})\s+years?\s+old\b")
+PARTS = {"early": (0, 3), "mid": (4, 6), "late": (7, 9)}
+
+
+@dataclass
+class Period:
+    start: int
+    end: int
+    precision: str  # year, range, decade, era, age, stage
+    relative: bool = False  # start/end are ages, not years
+
+
+def _decade(match, n: str = "a") -> int:
+    if match.group(f"{n}full"):
+        return int(match.group(f"{n}full"))
+    if match.group(f"{n}short"):
+        return 1900 + int(match.group(f"{n}short"))
+    return DECADE_WORDS[match.group(f"{n}word")]
+
+
+def parse_time_period(text: Optional[str]) -> Optional[Period]:
+    """Year (or age) range of a free-text time period, or None if it can't be placed"""
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+
+    match = YEAR_RANGE_PATTERN.search(text)
+    if match:
+        start, end = int(match.group("start")), match.group("end")
+        end = int(end) if len(end) == 4 else start - start % 100 + int(end)  # "1955-58"
+        if end >= start:
+            return Period(start, end, "range")
+    match = PART_PATTERN.search(text)
+    if match:
+        decade = _decade(match)
+        low, high = PARTS[match.group("part")]
+        return Period(decade + low, decade + high, "decade")
+    match = DECADE_RANGE_PATTERN.search(text)
+    if match:
+        start, end = _decade(match, "a"), _decade(match, "b")
+        if end >= start:
+            return Period(start, end + 9, "range")
+    match = YEAR_PATTERN.search(text)
+    if match:
+        year = int(match.group("year"))
+        return Period(year, year, "year")
+    match = DECADE_PATTERN.search(text)
+    if match:
+        decade = _decade(match)
+        return Period(decade, decade + 9, "decade")
+    match = ERA_PATTERN.search(text)
+    if match:
+        start, end = ERAS[int(match.lastgroup[1:])][1]
+        return Period(start, end, "era")
+    match = AGE_PATTERN.search(text)
+    if match:
+        age = int(match.group("age") or match.group("age2"))
+        return Period(age, age, "age", relative=True)
+    match = STAGE_PATTERN.search(text)
+    if match:
+        stage = STAGE_WORDS[int(match.lastgroup[1:])][1]
+        start, end = STAGE_AGES[stage]
+        return Period(start, end, stage, relative=True)
+    return None
+
+
+def resolve_period(period: Optional[Period], birth_year: Optional[int]) -> Optional[Period]:
+    """Absolute years; age-based periods need the user's birth year"""
+    if period is None or not period.relative:
+        return period
+    if not birth_year:
+        return None
+    if period.precision == "wartime":
+        for start, end in WARS:
+            if start <= birth_year + period.end and end >= birth_year + period.start:
+                return Period(start, end, "era")
+        return None
+    precision = "age" if period.precision == "age" else "stage"
+    return Period(birth_year + period.start, birth_year + period.end, precision)
+
+
+def _entry(story_id: int, user_id: int, title: str, time_period: Optional[str],
+           memory_branch_id: Optional[int], birth_year: Optional[int]) -> dict:
+    period = resolve_period(parse_time_period(time_period), birth_year)
+    return {
+        "story_id": story_id,
+        "user_id": user_id,
+        "memory_branch_id": memory_branch_id,
+        "title": title,
+        "time_period": time_period,
+        "start_year": period.start if period else None,
+        "end_year": period.end if period else None,
+        "precision": period.precision if period else None,
+        "sort_year": period.start if period else UNDATED_SORT_YEAR,
+    }
+
+
+def _birth_years(session: Session, user_ids: Iterable[int]) -> Dict[int, Optional[int]]:
+    """From users already loaded in the session where possible, one query for the rest"""
+    found, missing = {}, []
+    for user_id in set(user_ids):
+        user = session.identity_map.get(inspect(User).identity_key_from_primary_key((user_id,)))
+        if user is not None and "birth_year" not in inspect(user).unloaded:
+            found[user_id] = user.birth_year
+        else:
+            missing.append(user_id)
+    if missing:
+        rows = session.connection().execute(select(User.id, User.birth_year).where(User.id.in_(missing)))
+        found.update({row.id: row.birth_year for row in rows})
+    return found
+
+
+def _needs_birth_year(time_period: Optional[str]) -> bool:
+    period = parse_time_period(time_period)
+    return period is not None and period.relative
+
+
+def _write_entries(session: Session, stories: List[tuple], replace: bool):
+    """(id, user_id, title, time_period, memory_branch_id) -> timeline rows"""
+    if not stories:
+        return
+    relative_users = [story[1] for story in stories if _needs_birth_year(story[3])]
+    birth_years = _birth_years(session, relative_users) if relative_users else {}
+    connection = session.connection()
+    table = TimelineEntry.__table__
+    if replace:
+        connection.execute(delete(table).where(table.c.story_id.in_([story[0] for story in stories])))
+    connection.execute(insert(table), [
+        _entry(story_id, user_id, title, time_period, branch_id, birth_years.get(user_id))
+        for story_id, user_id, title, time_period, branch_id in stories
+    ])
+
+
+def _story_row(story: Story) -> tuple:
+    return (story.id, story.user_id, story.title, story.time_period, story.memory_branch_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_timeline(session, flush_context):
+    """Place stories this flush created or re-dated; re-place a user's stories when birth_year changed"""
+    new, changed, rebuild_users = [], [], set()
+    for obj in session.new:
+        if isinstance(obj, Story):
+            new.append(_story_row(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Story):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in TIMELINE_FIELDS):
+                changed.append(_story_row(obj))
+        elif isinstance(obj, User) and inspect(obj).attrs.birth_year.history.has_changes():
+            rebuild_users.add(obj.id)
+
+    if rebuild_users:
+        changed = [row for row in changed if row[1] not in rebuild_users]
+        changed += session.connection().execute(
+            select(Story.id, Story.user_id, Story.title, Story.time_period, Story.memory_branch_id).where(
+                Story.user_id.in_(rebuild_users)
+            )
+        ).all()
+    _write_entries(session, new, replace=False)
+    _write_entries(session, changed, replace=True)
+
+
+def refresh_timeline(db: Session, story_ids: Iterable[int]):
+    """Re-place stories changed outside the ORM (bulk UPDATE, backfills); caller commits"""
+    story_ids = list(story_ids)
+    if not story_ids:
+        return
+    stories = db.query(Story.id, Story.user_id, Story.title, Story.time_period, Story.memory_branch_id).filter(
+        Story.id.in_(story_ids)
+    ).all()
+    _write_entries(db, [tuple(story) for story in stories], replace=True)
+
+
+def encode_cursor(entry: TimelineEntry) -> str:
+    return base64.urlsafe_b64encode(f"{entry.sort_year}:{entry.story_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """(sort_year, story_id) of the last entry of the previous page; ValueError if malformed"""
+    try:
+        sort_year, story_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(sort_year), int(story_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def timeline_page(
+    db: Session,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    include_undated: bool = True
+) -> Tuple[List[TimelineEntry], Optional[str]]:
+    """One page in chronological order (an index range scan), plus the cursor for the next"""
+    query = db.query(TimelineEntry).filter(TimelineEntry.user_id == user_id)
+    if cursor:
+        query = query.filter(tuple_(TimelineEntry.sort_year, TimelineEntry.story_id) > tuple_(*decode_cursor(cursor)))
+    if not include_undated:
+        query = query.filter(TimelineEntry.sort_year < UNDATED_SORT_YEAR)
+    entries = query.order_by(TimelineEntry.sort_year, TimelineEntry.story_id).limit(limit + 1).all()
+    if len(entries) > limit:
+        return entries[:limit], encode_cursor(entries[limit - 1])
+    return entries, None
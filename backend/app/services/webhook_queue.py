@@ -0,0 +1,495 @@
+"""
+Durable local queue for incoming webhooks
+The webhook endpoint only appends the raw event to a SQLite log (WAL mode) on
+local disk and returns; a consumer task drains the log in batches. Events
+accepted with 200 survive restarts, and a spike queues up instead of piling
+BackgroundTasks into the web workers.
+
+Writes use group commit: every append in a process goes through one writer
+thread, which writes everything that queued up while the previous commit
+was running as one transaction (one fsync with WEBHOOK_QUEUE_SYNCHRONOUS=FULL)
+and then resolves each caller's future with its offset.
+
+Offsets are the log's sequence numbers (events.seq). A consumer stores the
+offset it has processed up to; only one worker on the host holds a
+consumer's lease at a time, and replay() moves the offset back
+(scripts/webhook_queue.py). Processed events are kept for
+WEBHOOK_QUEUE_RETENTION_HOURS so they can be replayed.
+
+Failed events don't hold up the log: they're parked in a retries table and
+retried with exponential backoff; after max_attempts they stay there as dead
+letters (kept past retention) until retry_dead() requeues them. A handler
+raises DropEvent for an event that can never succeed.
+
+Backpressure: with more than WEBHOOK_QUEUE_MAX_BACKLOG unprocessed events,
+is_overloaded() is true and the endpoint answers 503 with Retry-After (Telnyx
+redelivers failed webhooks).
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.db.config import settings
+from app.services.metrics import registry
+
+APPENDED = registry.counter(
+    "webhook_queue_appended_total",
+    "Webhook events appended to the local queue"
+)
+REJECTED = registry.counter(
+    "webhook_queue_rejected_total",
+    "Webhook events refused with 503 because the queue was over its backlog limit"
+)
+PROCESSED = registry.counter(
+    "webhook_queue_processed_total",
+    "Webhook events handled by the consumer, by outcome (ok, dropped, retry, dead_letter)",
+    ("consumer", "outcome")
+)
+GROUP_COMMIT_SIZE = registry.histogram(
+    "webhook_queue_group_commit_events",
+    "Events written per queue transaction",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+APPEND_LATENCY = registry.histogram(
+    "webhook_queue_append_seconds",
+    "Time from append to durable commit",
+    quantiles=(0.5, 0.99)
+)
+LAG_EVENTS = registry.gauge(
+    "webhook_queue_lag_events",
+    "Events appended but not yet processed",
+    ("consumer",)
+)
+LAG_SECONDS = registry.gauge(
+    "webhook_queue_lag_seconds",
+    "Age of the oldest unprocessed event",
+    ("consumer",)
+)
+RETRYING = registry.gauge(
+    "webhook_queue_retrying_events",
+    "Failed events waiting for another attempt",
+    ("consumer",)
+)
+DEAD_LETTERS = registry.gauge(
+    "webhook_queue_dead_letters",
+    "Events that failed max_attempts times and are no longer retried",
+    ("consumer",)
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    " seq INTEGER PRIMARY KEY,"
+    " received_at REAL NOT NULL,"
+    " event_type TEXT,"
+    " payload BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS consumers ("
+    " name TEXT PRIMARY KEY,"
+    " committed_offset INTEGER NOT NULL DEFAULT 0,"
+    " lease_owner TEXT,"
+    " lease_expires REAL NOT NULL DEFAULT 0)",
+    # next_attempt_at NULL: a dead letter
+    "CREATE TABLE IF NOT EXISTS retries ("
+    " consumer TEXT NOT NULL,"
+    " seq INTEGER NOT NULL,"
+    " attempts INTEGER NOT NULL,"
+    " next_attempt_at REAL,"
+    " last_error TEXT,"
+    " PRIMARY KEY (consumer, seq))",
+)
+
+
+@dataclass
+class QueuedEvent:
+    offset: int
+    received_at: float
+    event_type: Optional[str]
+    payload: bytes
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DropEvent(Exception):
+    """Raised by a handler for an event that will never succeed: counted, not retried"""
+
+
+class WebhookQueue:
+    def __init__(
+        self,
+        path: str,
+        synchronous: str = "FULL",
+        max_backlog: int = 50000,
+        max_batch: int = 5000
+    ):
+        self.path = path
+        self.synchronous = synchronous
+        self.max_backlog = max_backlog
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._pending: List[Tuple[float, Optional[str], bytes, Future]] = []
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._backlog_checked = 0.0
+        self._backlog = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (the writer thread has its own)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    # --- producer side ---
+
+    def submit(self, payload: bytes, event_type: Optional[str] = None) -> Future:
+        """Queue an append; the future resolves to the event's offset once it's committed"""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("webhook queue is closed")
+            if len(self._pending) >= self.max_backlog:
+                raise QueueFull(f"{len(self._pending)} appends waiting for the writer")
+            self._pending.append((time.time(), event_type, payload, future))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="webhook-queue-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify()
+        return future
+
+    async def append(self, payload: bytes, event_type: Optional[str] = None) -> int:
+        return await asyncio.wrap_future(self.submit(payload, event_type))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            try:
+                offsets = self._write(conn, batch)
+            except Exception as e:
+                print(f"Error writing webhook queue: {e}")
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            now = time.time()
+            for (received_at, _, _, future), offset in zip(batch, offsets):
+                APPEND_LATENCY.observe(now - received_at)
+                future.set_result(offset)
+            APPENDED.inc(len(batch))
+            GROUP_COMMIT_SIZE.observe(len(batch))
+
+    def _write(self, conn: sqlite3.Connection, batch: list) -> List[int]:
+        # BEGIN IMMEDIATE takes the write lock, so offsets can be assigned here
+        # even with several processes appending to the same file
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            head = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+            offsets = list(range(head + 1, head + 1 + len(batch)))
+            conn.executemany(
+                "INSERT INTO events (seq, received_at, event_type, payload) VALUES (?, ?, ?, ?)",
+                [(offset, received_at, event_type, payload)
+                 for offset, (received_at, event_type, payload, _) in zip(offsets, batch)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return offsets
+
+    def backlog(self, consumer: str, max_age: float = 0.5) -> int:
+        """Unprocessed events (refreshed at most every max_age seconds; cheap enough per request)"""
+        now = time.monotonic()
+        if now - self._backlog_checked > max_age:
+            self._backlog = self.stats(consumer)["lag_events"]
+            self._backlog_checked = now
+        return self._backlog + len(self._pending)
+
+    def is_overloaded(self, consumer: str) -> bool:
+        return self.backlog(consumer) >= self.max_backlog
+
+    # --- consumer side ---
+
+    def read(self, after_offset: int, limit: int) -> List[QueuedEvent]:
+        rows = self._connect().execute(
+            "SELECT seq, received_at, event_type, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after_offset, limit)
+        ).fetchall()
+        return [QueuedEvent(*row) for row in rows]
+
+    def committed_offset(self, consumer: str) -> int:
+        row = self._connect().execute(
+            "SELECT committed_offset FROM consumers WHERE name = ?", (consumer,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def acquire_lease(self, consumer: str, owner: str, ttl: float) -> bool:
+        """Take or renew the consumer's lease; False while another owner's lease is live"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR IGNORE INTO consumers (name) VALUES (?)", (consumer,))
+        cursor = conn.execute(
+            "UPDATE consumers SET lease_owner = ?, lease_expires = ? "
+            "WHERE name = ? AND (lease_owner = ? OR lease_owner IS NULL OR lease_expires < ?)",
+            (owner, now + ttl, consumer, owner, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, consumer: str, owner: str):
+        self._connect().execute(
+            "UPDATE consumers SET lease_owner = NULL, lease_expires = 0 WHERE name = ? AND lease_owner = ?",
+            (consumer, owner)
+        )
+
+    def commit(self, consumer: str, offset: int, owner: Optional[str] = None) -> bool:
+        """Record progress; with `owner`, only while that owner still holds the lease"""
+        query = "UPDATE consumers SET committed_offset = ? WHERE name = ?"
+        params: tuple = (offset, consumer)
+        if owner:
+            query += " AND lease_owner = ?"
+            params += (owner,)
+        return self._connect().execute(query, params).rowcount == 1
+
+    def park(self, consumer: str, offset: int, attempts: int, error: str, retry_in: Optional[float]):
+        """Record a failed event for a retry in `retry_in` seconds (None: a dead letter)"""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO retries (consumer, seq, attempts, next_attempt_at, last_error) VALUES (?, ?, ?, ?, ?)",
+            (consumer, offset, attempts, None if retry_in is None else time.time() + retry_in, error[:1000])
+        )
+
+    def unpark(self, consumer: str, offset: int):
+        self._connect().execute("DELETE FROM retries WHERE consumer = ? AND seq = ?", (consumer, offset))
+
+    def due_retries(self, consumer: str, limit: int) -> List[Tuple[QueuedEvent, int]]:
+        """Parked events whose next attempt is due, with the attempts made so far"""
+        rows = self._connect().execute(
+            "SELECT e.seq, e.received_at, e.event_type, e.payload, r.attempts FROM retries r "
+            "JOIN events e ON e.seq = r.seq "
+            "WHERE r.consumer = ? AND r.next_attempt_at <= ? ORDER BY r.next_attempt_at LIMIT ?",
+            (consumer, time.time(), limit)
+        ).fetchall()
+        return [(QueuedEvent(*row[:4]), row[4]) for row in rows]
+
+    def retry_dead(self, consumer: str) -> int:
+        """Give dead letters another round of attempts, starting now"""
+        return self._connect().execute(
+            "UPDATE retries SET attempts = 0, next_attempt_at = ? WHERE consumer = ? AND next_attempt_at IS NULL",
+            (time.time(), consumer)
+        ).rowcount
+
+    def replay(self, consumer: str, from_offset: int):
+        """Process again from `from_offset` (inclusive), as far back as retention allows"""
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO consumers (name) VALUES (?)", (consumer,))
+        conn.execute("UPDATE consumers SET committed_offset = ? WHERE name = ?", (max(0, from_offset - 1), consumer))
+
+    def prune(self, consumer: str, retention_seconds: float) -> int:
+        """Delete processed events older than the retention window"""
+        cursor = self._connect().execute(
+            # The newest event stays: offsets continue from MAX(seq); parked events stay until they succeed
+            "DELETE FROM events WHERE seq <= ? AND received_at < ? AND seq < (SELECT MAX(seq) FROM events)"
+            " AND seq NOT IN (SELECT seq FROM retries)",
+            (self.committed_offset(consumer), time.time() - retention_seconds)
+        )
+        return cursor.rowcount
+
+    def stats(self, consumer: str) -> Dict[str, float]:
+        conn = self._connect()
+        committed = self.committed_offset(consumer)
+        head, first = conn.execute("SELECT COALESCE(MAX(seq), 0), COALESCE(MIN(seq), 0) FROM events").fetchone()
+        oldest = conn.execute(
+            "SELECT received_at FROM events WHERE seq > ? ORDER BY seq LIMIT 1", (committed,)
+        ).fetchone()
+        retrying, dead = conn.execute(
+            "SELECT COUNT(next_attempt_at), COUNT(*) - COUNT(next_attempt_at) FROM retries WHERE consumer = ?",
+            (consumer,)
+        ).fetchone()
+        return {
+            "head_offset": head,
+            "first_offset": first,  # replay can go back to here
+            "committed_offset": committed,
+            "lag_events": max(0, head - committed),
+            "lag_seconds": time.time() - oldest[0] if oldest else 0.0,
+            "retrying": retrying,
+            "dead_letters": dead,
+        }
+
+    def close(self):
+        """Let the writer finish what's queued, then stop it"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout=10)
+
+
+Handler = Callable[[QueuedEvent], Awaitable[None]]
+
+
+class QueueConsumer:
+    """
+    Drains a WebhookQueue in batches on the event loop
+    Events of a batch are handled concurrently; the offset is committed after
+    the whole batch, so a restart re-delivers at most one batch (handlers
+    must tolerate seeing an event twice). The lease is renewed every
+    lease_ttl / 3 while a batch runs; if a renewal fails, no further events
+    of the batch are started and its offset isn't committed.
+    """
+
+    def __init__(
+        self,
+        queue: WebhookQueue,
+        name: str,
+        handler: Handler,
+        batch_size: int = 200,
+        concurrency: int = 8,
+        poll_interval: float = 0.2,
+        lease_ttl: float = 30.0,
+        retention_seconds: float = 72 * 3600,
+        max_attempts: int = 8,
+        retry_backoff: float = 30.0
+    ):
+        self.queue = queue
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_ttl = lease_ttl
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        registry.add_collector(self._collect)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Finish the current batch, then give up the lease"""
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.queue.release_lease, self.name, self.owner)
+
+    async def run(self):
+        last_prune = 0.0
+        while not self._stopping.is_set():
+            try:
+                if not await asyncio.to_thread(self.queue.acquire_lease, self.name, self.owner, self.lease_ttl):
+                    await self._sleep(self.lease_ttl / 3)  # another worker is draining
+                    continue
+                processed = await self.drain_batch()
+                if time.monotonic() - last_prune > 60:
+                    await asyncio.to_thread(self.queue.prune, self.name, self.retention_seconds)
+                    last_prune = time.monotonic()
+                if not processed:
+                    await self._sleep(self.poll_interval)
+            except Exception as e:
+                print(f"Error draining webhook queue: {e}")
+                await self._sleep(self.poll_interval)
+
+    async def _sleep(self, seconds: float):
+        """Sleep, waking early on stop()"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain_batch(self) -> int:
+        """Handle the next batch (plus due retries) and commit its offset; returns the number of events"""
+        committed = await asyncio.to_thread(self.queue.committed_offset, self.name)
+        events = await asyncio.to_thread(self.queue.read, committed, self.batch_size)
+        retries = await asyncio.to_thread(self.queue.due_retries, self.name, self.batch_size)
+        if not events and not retries:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        lease_lost = asyncio.Event()
+
+        async def keep_lease():
+            # A batch can outlast lease_ttl (downloads, transcription): renew while it runs
+            while True:
+                await asyncio.sleep(self.lease_ttl / 3)
+                try:
+                    renewed = await asyncio.to_thread(self.queue.acquire_lease, self.name, self.owner, self.lease_ttl)
+                except Exception as e:
+                    print(f"Error renewing webhook consumer lease: {e}")
+                    renewed = False
+                if not renewed:
+                    lease_lost.set()
+                    return
+
+        async def handle(event: QueuedEvent, attempts: int = 0):
+            async with semaphore:
+                if lease_lost.is_set():
+                    return  # another worker may be handling these events now
+                try:
+                    await self.handler(event)
+                    outcome = "ok"
+                except DropEvent:
+                    outcome = "dropped"
+                except Exception as e:
+                    # Parked before the offset moves past it
+                    attempts += 1
+                    retry_in = None
+                    if attempts < self.max_attempts:
+                        retry_in = min(self.retry_backoff * 2 ** (attempts - 1), 3600.0)
+                    error = f"{type(e).__name__}: {e}"
+                    await asyncio.to_thread(self.queue.park, self.name, event.offset, attempts, error, retry_in)
+                    PROCESSED.inc(consumer=self.name, outcome="retry" if retry_in is not None else "dead_letter")
+                    return
+                if attempts:
+                    await asyncio.to_thread(self.queue.unpark, self.name, event.offset)
+                PROCESSED.inc(consumer=self.name, outcome=outcome)
+
+        renewer = asyncio.create_task(keep_lease())
+        try:
+            await asyncio.gather(
+                *(handle(event) for event in events),
+                *(handle(event, attempts) for event, attempts in retries)
+            )
+        finally:
+            renewer.cancel()
+        if not events:
+            return len(retries)
+        if lease_lost.is_set() or not await asyncio.to_thread(self.queue.commit, self.name, events[-1].offset, self.owner):
+            print(f"Webhook consumer {self.name} lost its lease; batch ending at {events[-1].offset} not committed")
+        return len(events) + len(retries)
+
+    def _collect(self):
+        stats = self.queue.stats(self.name)
+        LAG_EVENTS.set(stats["lag_events"], consumer=self.name)
+        LAG_SECONDS.set(stats["lag_seconds"], consumer=self.name)
+        RETRYING.set(stats["retrying"], consumer=self.name)
+        DEAD_LETTERS.set(stats["dead_letters"], consumer=self.name)
+
+
+webhook_queue = WebhookQueue(
+    settings.WEBHOOK_QUEUE_PATH,
+    synchronous=settings.WEBHOOK_QUEUE_SYNCHRONOUS,
+    max_backlog=settings.WEBHOOK_QUEUE_MAX_BACKLOG
+) if settings.WEBHOOK_QUEUE_ENABLED else None
@@ -0,0 +1,115 @@
+"""
+Cache backend comparison: per-process dicts vs the shared-memory cache
+Forks N worker processes that each run a read-through workload (Zipf-skewed
+keys, like hot stories) against MemVergeService, then reports the combined
+hit ratio and memory per backend. PSS splits shared pages between the
+processes that map them, so it is the fair number to sum across workers;
+RSS counts shared pages once per process.
+
+Usage:
+    python -m benchmarks.cache_backends --workers 4 --keys 5000 --requests 20000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.append('..')
+
+from app.services.memverge_service import MemVergeService
+
+
+def memory_kb() -> dict:
+    """Rss and Pss of this process from /proc (Linux)"""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    usage[name.lower()] = int(rest.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def zipf_cum_weights(keys: int, skew: float) -> list:
+    total, cum = 0.0, []
+    for rank in range(1, keys + 1):
+        total += 1.0 / rank ** skew
+        cum.append(total)
+    return cum
+
+
+def worker(index: int, args, config: dict, start_barrier, results):
+    service = MemVergeService(config)
+    rng = random.Random(args.seed + index)
+    cum_weights = zipf_cum_weights(args.keys, args.skew)
+    population = range(args.keys)
+    start_barrier.wait()
+
+    hits = 0
+    started = time.perf_counter()
+    for key in rng.choices(population, cum_weights=cum_weights, k=args.requests):
+        if service.get_cached_data(f"story:{key}:v0") is not None:
+            hits += 1
+        else:
+            # Stand-in for a DB load + serialization of one story response
+            body = (f"story {key} ".encode() * (args.value_size // 10 + 1))[:args.value_size]
+            service.cache_story_data(f"story:{key}:v0", body, ttl=3600)
+    elapsed = time.perf_counter() - started
+    results.put({"hits": hits, "requests": args.requests, "seconds": elapsed, **memory_kb()})
+
+
+def run(backend: str, args) -> dict:
+    # Same memory budget per host: per-process dicts split it between workers
+    config = {"backend": backend, "max_items": args.capacity // args.workers}
+    if backend == "shm":
+        config.update({"shm_path": f"/dev/shm/story_ai_cache_bench_{os.getpid()}",
+                       "shm_buckets": args.capacity // 4, "shm_ways": 4, "shm_slot_size": args.value_size + 512})
+        shared = MemVergeService(config).shared  # format once before the workers race to open it
+
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(i, args, config, barrier, results)) for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if backend == "shm":
+        shared.close()
+        os.unlink(shared.path)
+
+    requests = sum(s["requests"] for s in stats)
+    return {
+        "backend": backend,
+        "hit_ratio": sum(s["hits"] for s in stats) / requests,
+        "rss_mb": sum(s.get("rss", 0) for s in stats) / 1024,
+        "pss_mb": sum(s.get("pss", 0) for s in stats) / 1024,
+        "us_per_request": 1e6 * sum(s["seconds"] for s in stats) / requests,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-process and shared-memory cache backends")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--keys", type=int, default=5000, help="distinct stories")
+    parser.add_argument("--requests", type=int, default=20000, help="lookups per worker")
+    parser.add_argument("--capacity", type=int, default=4000, help="cached entries per host (split across workers for dicts)")
+    parser.add_argument("--value-size", type=int, default=4096, help="bytes per cached response")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("Story AI - Cache Backend Benchmark")
+    print(f"{args.workers} workers, {args.keys} keys, {args.requests} lookups/worker, "
+          f"{args.value_size}B values, {args.capacity} entries per host\n")
+    print(f"{'backend':<8} {'hit ratio':>10} {'RSS MB':>9} {'PSS MB':>9} {'us/req':>8}")
+    for backend in ("memory", "shm"):
+        result = run(backend, args)
+        print(f"{result['backend']:<8} {result['hit_ratio']:>10.3f} {result['rss_mb']:>9.1f} "
+              f"{result['pss_mb']:>9.1f} {result['us_per_request']:>8.1f}")
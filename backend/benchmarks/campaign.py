@@ -0,0 +1,159 @@
+"""
+Call campaign run against a fake Telnyx
+Boots the API with uvicorn, pointed at a local FakeTelnyxServer (and a fake
+recording server for answered calls), creates users with phone numbers and a
+campaign for all of them, then polls the campaign until it completes.
+
+Reports the dial rate and peak concurrent calls the fake saw against the
+configured limits, 429s, numbers dialed while already on a call, outcomes, and
+how many recordings became raw inputs.
+
+Usage (from backend/):
+    python -m benchmarks.campaign
+    python -m benchmarks.campaign --users 2000 --cps 50 --max-concurrent 200 --answer-rate 0.4
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.fakes import FakeRecordingServer, FakeTelnyxServer, apply_env, fake_service_env
+from benchmarks.run import BACKEND_DIR, free_port, wait_for_server
+
+
+def start_server(args, telnyx: FakeTelnyxServer, port: int) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="story_ai_campaign_")
+    overrides = fake_service_env()
+    overrides.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'campaign.db')}",
+        "DEBUG": "False",
+        "TELNYX_API_BASE": telnyx.base_url,
+        "TELNYX_WEBHOOK_URL": f"http://127.0.0.1:{port}/api/v1/voice/webhook",
+        "TELNYX_PHONE_NUMBER": "+18005550100",
+        "CAMPAIGN_CALLS_PER_SECOND": str(args.cps),
+        "CAMPAIGN_MAX_CONCURRENT_CALLS": str(args.max_concurrent),
+        "WEBHOOK_QUEUE_PATH": os.path.join(workdir, "webhooks.db"),
+        "BLOB_STORE_PATH": os.path.join(workdir, "blobs"),
+        "ENRICH_ON_INGEST": "False",
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=apply_env(overrides))
+
+
+async def seed_users(client: httpx.AsyncClient, count: int) -> list:
+    semaphore = asyncio.Semaphore(32)
+
+    async def create(i: int) -> int:
+        async with semaphore:
+            response = await client.post("/api/v1/users/", json={
+                "name": f"Caller {i}", "email": f"caller{i}@example.com", "phone_number": f"+1555{i:07d}"
+            })
+            response.raise_for_status()
+            return response.json()["id"]
+
+    return await asyncio.gather(*(create(i) for i in range(count)))
+
+
+async def count_inputs(client: httpx.AsyncClient, user_ids: list) -> int:
+    semaphore = asyncio.Semaphore(32)
+
+    async def count(user_id: int) -> int:
+        async with semaphore:
+            return len((await client.get(f"/api/v1/inputs/user/{user_id}", params={"limit": 1000})).json())
+
+    return sum(await asyncio.gather(*(count(user_id) for user_id in user_ids)))
+
+
+async def run_campaign(args, telnyx: FakeTelnyxServer, base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        user_ids = await seed_users(client, args.users)
+        response = await client.post("/api/v1/campaigns/", json={
+            "name": "Weekly story call (benchmark)",
+            "user_ids": user_ids,
+            "max_attempts": args.max_attempts,
+            "retry_backoff_minutes": args.retry_backoff / 60,
+        })
+        response.raise_for_status()
+        campaign_id = response.json()["id"]
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + args.timeout
+        dial_samples = []  # (seconds since start, dials so far)
+        while time.monotonic() < deadline:
+            campaign = (await client.get(f"/api/v1/campaigns/{campaign_id}")).json()
+            dial_samples.append((time.perf_counter() - started, telnyx.dials))
+            progress = campaign["progress"]
+            print(f"  {progress['progress']:6.1%}  attempts {progress['attempts']:>6}  {progress['by_status']}")
+            if campaign["status"] == "completed":
+                break
+            await asyncio.sleep(args.poll)
+        elapsed = time.perf_counter() - started
+        inputs = await count_inputs(client, user_ids)
+        return {"campaign": campaign, "elapsed": elapsed, "dial_samples": dial_samples, "inputs": inputs}
+
+
+def peak_rate(samples: list, window: float = 1.0) -> float:
+    """Highest dials/s over any `window`-second span between polls"""
+    best = 0.0
+    for i, (start, dials_start) in enumerate(samples):
+        for end, dials_end in samples[i + 1:]:
+            if end - start >= window:
+                best = max(best, (dials_end - dials_start) / (end - start))
+                break
+    return best
+
+
+async def main(args):
+    with FakeRecordingServer(size=16_000, latency=0.01) as recordings, \
+            FakeTelnyxServer(answer_rate=args.answer_rate, busy_rate=args.busy_rate, ring_time=args.ring_time,
+                             talk_time=args.talk_time, cps_limit=args.fake_cps_limit,
+                             recording_url=recordings.recording_url("call")) as telnyx:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(args, telnyx, port)
+        try:
+            await wait_for_server(base_url)
+            print("Story AI - Call Campaign Benchmark")
+            print(f"{args.users} users, limits {args.cps} calls/s and {args.max_concurrent} concurrent calls\n")
+            result = await run_campaign(args, telnyx, base_url)
+        finally:
+            server.terminate()
+            server.wait()
+
+    campaign = result["campaign"]
+    print(f"\nCampaign {campaign['status']} in {result['elapsed']:.1f}s")
+    print(f"  dials:               {telnyx.dials} ({telnyx.dials / result['elapsed']:.1f}/s average, "
+          f"{peak_rate(result['dial_samples']):.1f}/s peak; limit {args.cps})")
+    print(f"  peak live calls:     {telnyx.max_live} (limit {args.max_concurrent})")
+    print(f"  429s from carrier:   {telnyx.rate_limited}")
+    print(f"  overlapping dials:   {telnyx.overlapping}")
+    print(f"  fake call outcomes:  {dict(telnyx.outcomes)}")
+    print(f"  final call states:   {campaign['progress']['by_status']}")
+    print(f"  raw inputs stored:   {result['inputs']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a call campaign against a fake Telnyx")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--cps", type=float, default=20.0, help="CAMPAIGN_CALLS_PER_SECOND")
+    parser.add_argument("--max-concurrent", type=int, default=50, help="CAMPAIGN_MAX_CONCURRENT_CALLS")
+    parser.add_argument("--fake-cps-limit", type=float, help="fake carrier answers 429 above this (default: --cps)")
+    parser.add_argument("--answer-rate", type=float, default=0.6)
+    parser.add_argument("--busy-rate", type=float, default=0.1)
+    parser.add_argument("--ring-time", type=float, default=0.5, help="seconds")
+    parser.add_argument("--talk-time", type=float, default=1.0, help="seconds")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--retry-backoff", type=float, default=1.0, help="seconds before the first retry")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between progress polls")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    args = parser.parse_args()
+    if args.fake_cps_limit is None:
+        args.fake_cps_limit = args.cps
+    asyncio.run(main(args))
@@ -0,0 +1,162 @@
+"""
+Client throughput: scripts/example_client.py vs the story_ai_client package
+Boots the API with uvicorn (fake LLM, SQLite) and runs the same workloads
+through both clients:
+
+- ingest: text inputs one request each with the example client (a new
+  connection per call); with the async client as concurrent single creates
+  over its connection pool, and as bulk ingest (POST /inputs/bulk chunks)
+- reads: repeated story listings
+- generate: stories generated one after another through the synchronous
+  endpoint vs concurrent generation jobs
+
+Usage (from backend/):
+    python -m benchmarks.client
+    python -m benchmarks.client --inputs 2000 --reads 1000 --stories 20 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fakes import apply_env, fake_service_env
+from benchmarks.run import BACKEND_DIR, SAMPLE_SENTENCES, free_port, wait_for_server
+from story_ai_client import StoryAIClient
+
+try:
+    from scripts.example_client import StoryAIClient as ExampleClient
+except ImportError:  # the example client needs `requests`
+    ExampleClient = None
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="story_ai_client_")
+    overrides = fake_service_env(llm_latency=args.llm_latency)
+    overrides.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'client.db')}",
+        "DEBUG": "False",
+        "WEBHOOK_QUEUE_PATH": os.path.join(workdir, "webhooks.db"),
+        "ENRICH_ON_INGEST": "False",
+        "NOTIFY_DISPATCHER_ENABLED": "False",
+        "CAMPAIGN_DISPATCHER_ENABLED": "False",
+        "SQL_PROFILING": "False",  # SQLite write contention would flag every request as slow
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=apply_env(overrides))
+
+
+def text(i: int) -> str:
+    return f"{SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)]} ({i})"
+
+
+async def timed(results: dict, name: str, count: int, work):
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    results[name] = {"count": count, "seconds": elapsed, "per_second": count / elapsed}
+    print(f"  {name:<34} {count:>6} in {elapsed:7.2f}s  {count / elapsed:9.1f}/s")
+
+
+async def run_example_client(args, base_url: str, results: dict):
+    example = ExampleClient(f"{base_url}/api/v1")
+    user = await asyncio.to_thread(example.create_user, "Example Client", "example@example.com")
+    input_ids = []
+
+    def ingest():
+        for i in range(args.inputs):
+            input_ids.append(example.submit_text_input(user["id"], text(i))["id"])
+
+    def reads():
+        for _ in range(args.reads):
+            example.get_user_stories(user["id"])
+
+    def generate():
+        for i in range(args.stories):
+            example.generate_story(user["id"], input_ids[i * 3:i * 3 + 3])
+
+    print("example_client (requests, a connection per call, sequential)")
+    await timed(results, "example: ingest", args.inputs, lambda: asyncio.to_thread(ingest))
+    await timed(results, "example: reads", args.reads, lambda: asyncio.to_thread(reads))
+    await timed(results, "example: generate", args.stories, lambda: asyncio.to_thread(generate))
+
+
+async def run_async_client(args, base_url: str, results: dict):
+    async with StoryAIClient(base_url, max_connections=args.concurrency) as client:
+        user = await client.create_user("Async Client", "async@example.com")
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        async def ingest_each():
+            await asyncio.gather(*(bounded(client.create_input(user["id"], text(i))) for i in range(args.inputs)))
+
+        input_ids = []
+
+        async def ingest_bulk():
+            input_ids.extend(await client.create_inputs(
+                {"user_id": user["id"], "raw_text": text(i)} for i in range(args.inputs)
+            ))
+
+        async def reads():
+            await asyncio.gather(*(
+                bounded(client.request("GET", f"/stories/user/{user['id']}")) for _ in range(args.reads)
+            ))
+
+        async def generate():
+            await asyncio.gather(*(
+                bounded(client.generate_story(user["id"], input_ids[i * 3:i * 3 + 3])) for i in range(args.stories)
+            ))
+
+        print(f"story_ai_client (httpx pool of {args.concurrency}, concurrent)")
+        await timed(results, "async: ingest (single creates)", args.inputs, ingest_each)
+        await timed(results, "async: ingest (bulk)", args.inputs, ingest_bulk)
+        await timed(results, "async: reads", args.reads, reads)
+        await timed(results, "async: generate (jobs)", args.stories, generate)
+        print(f"  retried requests: {client.retries}")
+
+
+async def main(args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(args, port)
+    results = {}
+    try:
+        await wait_for_server(base_url)
+        print("Story AI - Client Throughput")
+        print(f"{args.inputs} inputs, {args.reads} reads, {args.stories} generated stories\n")
+        if ExampleClient is None:
+            print("example_client skipped: `requests` is not installed\n")
+        else:
+            await run_example_client(args, base_url, results)
+            print()
+        await run_async_client(args, base_url, results)
+    finally:
+        server.terminate()
+        server.wait()
+
+    if ExampleClient is not None:
+        print("\nSpeedup over example_client")
+        for example, ours in [("example: ingest", "async: ingest (single creates)"),
+                              ("example: ingest", "async: ingest (bulk)"),
+                              ("example: reads", "async: reads"),
+                              ("example: generate", "async: generate (jobs)")]:
+            print(f"  {ours:<34} {results[ours]['per_second'] / results[example]['per_second']:6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the example client with story_ai_client")
+    parser.add_argument("--inputs", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--stories", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    args = parser.parse_args()
+    asyncio.run(main(args))
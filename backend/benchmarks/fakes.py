@@ -0,0 +1,240 @@
+"""
+Local fakes for benchmarking without OpenAI, Telnyx or Comet
+- LLM: the app's own FakeLLMProvider, selected with LLM_PROVIDER=fake
+- Recordings: FakeRecordingServer serves fixed-size audio with configurable latency
+- Telnyx Call Control: FakeTelnyxServer accepts dials and plays back the calls' webhooks
+- Telemetry: an empty COMET_API_KEY disables Comet entirely (no-op)
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+import httpx
+
+
+def fake_service_env(
+    llm_latency: float = 0.2,
+    llm_tokens_per_second: float = 0.0,
+    llm_tokens_per_minute: int = 10_000_000,
+    llm_requests_per_minute: int = 100_000
+) -> Dict[str, str]:
+    """Environment overrides that point the app at local fakes"""
+    return {
+        "LLM_PROVIDER": "fake",
+        "LLM_FAKE_LATENCY": str(llm_latency),
+        "LLM_FAKE_TOKENS_PER_SECOND": str(llm_tokens_per_second),
+        "LLM_TOKENS_PER_MINUTE": str(llm_tokens_per_minute),
+        "LLM_REQUESTS_PER_MINUTE": str(llm_requests_per_minute),
+        "OPENAI_API_KEY": "",
+        "TELNYX_API_KEY": "",
+        "COMET_API_KEY": "",
+    }
+
+
+class FakeRecordingServer:
+    """
+    Serves /recordings/<anything> with `size` bytes of fake audio after `latency` seconds
+    Runs in a background thread; use as a context manager.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, size: int = 64_000, latency: float = 0.05):
+        self.size = size
+        self.latency = latency
+        self.requests = 0
+        payload = b"\x00" * size
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def recording_url(self, name: str) -> str:
+        return f"{self.base_url}/recordings/{name}.mp3"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeTelnyxServer:
+    """
+    Stand-in for the Telnyx Call Control API (POST /v2/calls)
+    Each dial gets a call_control_id back, then the call's webhooks are posted to
+    its webhook_url: call.initiated, and after `ring_time` either call.answered
+    (answer_rate), a busy hangup (busy_rate) or a ring-out hangup. Answered calls
+    hang up after `talk_time`, preceded by call.recording.saved when recording was
+    requested and a `recording_url` is set. Dials beyond `cps_limit` (a token
+    bucket of one second's worth, like carrier CPS limits) get 429 with
+    Retry-After. Use as a context manager.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        answer_rate: float = 0.6,
+        busy_rate: float = 0.1,
+        ring_time: float = 0.5,
+        talk_time: float = 1.0,
+        cps_limit: Optional[float] = None,
+        recording_url: Optional[str] = None,
+        seed: int = 42
+    ):
+        self.answer_rate = answer_rate
+        self.busy_rate = busy_rate
+        self.ring_time = ring_time
+        self.talk_time = talk_time
+        self.cps_limit = cps_limit
+        self.recording_url = recording_url
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.dials = 0
+        self.rate_limited = 0
+        self.outcomes = Counter()
+        self.live = set()  # numbers with a call in progress
+        self.max_live = 0
+        self.overlapping = 0  # dials to a number that was already on a call
+        self._allowance = cps_limit or 0.0  # cps_limit token bucket
+        self._allowance_at = time.monotonic()
+        self._webhooks = httpx.Client(timeout=30.0)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, response, headers = server.dial(body)
+                payload = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def dial(self, body: dict):
+        now = time.monotonic()
+        with self.lock:
+            if self.cps_limit:
+                self._allowance = min(self.cps_limit, self._allowance + (now - self._allowance_at) * self.cps_limit)
+                self._allowance_at = now
+                if self._allowance < 1.0:
+                    self.rate_limited += 1
+                    return 429, {"errors": [{"title": "Too many requests"}]}, {"Retry-After": "1"}
+                self._allowance -= 1.0
+            self.dials += 1
+            if body.get("to") in self.live:
+                self.overlapping += 1
+            self.live.add(body.get("to"))
+            self.max_live = max(self.max_live, len(self.live))
+            roll = self.random.random()
+        outcome = "answered" if roll < self.answer_rate else "busy" if roll < self.answer_rate + self.busy_rate else "no_answer"
+        call_control_id = f"v3:{uuid.uuid4().hex}"
+        threading.Thread(target=self._play_call, args=(body, call_control_id, outcome), daemon=True).start()
+        return 200, {"data": {"call_control_id": call_control_id, "call_leg_id": uuid.uuid4().hex,
+                              "call_session_id": uuid.uuid4().hex, "record_type": "call"}}, {}
+
+    def _play_call(self, body: dict, call_control_id: str, outcome: str):
+        payload = {
+            "call_control_id": call_control_id,
+            "client_state": body.get("client_state"),
+            "from": body.get("from"),
+            "to": body.get("to"),
+        }
+        url = body.get("webhook_url")
+        self._event(url, "call.initiated", payload)
+        time.sleep(self.ring_time)
+        if outcome == "answered":
+            self._event(url, "call.answered", payload)
+            time.sleep(self.talk_time)
+            if body.get("record") and self.recording_url:
+                self._event(url, "call.recording.saved",
+                            dict(payload, recording_urls={"mp3": f"{self.recording_url}?call={call_control_id}"}))
+            hangup_cause = "normal_clearing"
+        else:
+            hangup_cause = "user_busy" if outcome == "busy" else "timeout"
+        with self.lock:
+            self.live.discard(body.get("to"))
+            self.outcomes[outcome] += 1
+        self._event(url, "call.hangup", dict(payload, hangup_cause=hangup_cause))
+
+    def _event(self, url: str, event_type: str, payload: dict):
+        event = {"data": {"event_type": event_type, "id": str(uuid.uuid4()), "payload": payload, "record_type": "event"}}
+        for _ in range(5):  # Telnyx retries failed deliveries too
+            try:
+                if self._webhooks.post(url, json=event).status_code < 400:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(1.0)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._webhooks.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def apply_env(overrides: Dict[str, str]) -> Dict[str, str]:
+    """Return a copy of os.environ with overrides applied (for subprocesses)"""
+    env = dict(os.environ)
+    env.update(overrides)
+    return env
@@ -0,0 +1,225 @@
+"""
+Story metadata extraction: local rules vs the LLM
+Scores both extractors on a small hand-labeled set (people F1, exact time
+period, theme recall against StoryBranchType labels) and reports latency
+per story. With --from-db, also measures how often the rules agree with
+metadata the LLM already stored on existing stories.
+
+The LLM path goes through the app's scheduler, so it uses LLM_PROVIDER:
+set a real OPENAI_API_KEY for meaningful accuracy numbers (with the fake
+provider only the latency/overhead figures mean anything).
+
+Usage (from backend/):
+    python -m benchmarks.metadata_extractors
+    python -m benchmarks.metadata_extractors --skip-llm --from-db 5000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+sys.path.append('..')
+
+from app.services.metadata_extractor import local_extractor
+
+LABELED = [
+    {
+        "text": "In the 1960s, Rose Miller and I used to walk down to the lake every Saturday. "
+                "Aunt Rose always said that hard work never hurt anybody.",
+        "people": ["Rose Miller", "Aunt Rose"], "time_period": "1960s", "themes": ["family", "learnings"],
+    },
+    {
+        "text": "Your grandfather proposed to me at the county fair in 1962. He was terrible at dancing, "
+                "and my mother cried when she heard.",
+        "people": ["grandfather", "mother"], "time_period": "1960s", "themes": ["relationships", "family"],
+    },
+    {
+        "text": "My first day at the factory I was so nervous I forgot my lunch. Mr. Alvarez showed me "
+                "how to fix the conveyor engine, and I used that trick for thirty years.",
+        "people": ["Mr. Alvarez"], "time_period": "early career", "themes": ["career", "skills"],
+    },
+    {
+        "text": "When I was 7, Grandma taught me to make peppermint candy. Walter and I ate half of it "
+                "before supper and Dad pretended not to notice.",
+        "people": ["grandma", "Walter", "dad"], "time_period": "childhood", "themes": ["childhood", "family"],
+    },
+    {
+        "text": "We lived on Rose Street when the river flooded back in the fifties. The whole town "
+                "came out with sandbags, and we lost the chicken coop anyway.",
+        "people": [], "time_period": "1950s", "themes": ["challenges"],
+    },
+    {
+        "text": "In high school I was on the debate team. Mrs. Kowalski, our coach, made us practice "
+                "until we won the state championship. I was so proud.",
+        "people": ["Mrs. Kowalski"], "time_period": "teens", "themes": ["education", "accomplishments"],
+    },
+    {
+        "text": "After the war, Harold and I took the train out west with two suitcases and forty dollars. "
+                "We slept in a different town every night for a month.",
+        "people": ["Harold"], "time_period": "wartime", "themes": ["travel", "adventures"],
+    },
+    {
+        "text": "I failed my driving test three times. Uncle George finally took me out to the old mill "
+                "road and made me parallel park between two hay bales until I got it.",
+        "people": ["Uncle George"], "time_period": None, "themes": ["failures", "skills"],
+    },
+    {
+        "text": "When the kids were little we spent every summer camping at the state park. My husband "
+                "insisted on cooking everything over the fire, even pancakes.",
+        "people": ["husband"], "time_period": "raising a family", "themes": ["family", "adventures"],
+    },
+    {
+        "text": "After I retired I finally learned the piano. My granddaughter Lily gives me lessons "
+                "on Sundays and she is a very strict teacher.",
+        "people": ["Lily"], "time_period": "retirement", "themes": ["hobbies", "learnings"],
+    },
+    {
+        "text": "The seventies were hard on the farm. Dad sold the cows, Mother took in sewing, and my "
+                "brother Frank went to work at the plant in town.",
+        "people": ["dad", "mother", "Frank"], "time_period": "1970s", "themes": ["challenges", "family", "career"],
+    },
+    {
+        "text": "Dorothy and I met at a church dance in 1948. She stepped on my foot and apologized "
+                "for a week. We were married two years later.",
+        "people": ["Dorothy"], "time_period": "1940s", "themes": ["relationships"],
+    },
+]
+
+
+def _normalize_person(name: str) -> str:
+    words = name.lower().replace(".", "").split()
+    return " ".join(w for w in words if w not in ("my", "our", "your", "his", "her"))
+
+
+def _same_person(a: str, b: str) -> bool:
+    a, b = _normalize_person(a), _normalize_person(b)
+    return a == b or a in b.split() or b in a.split()
+
+
+def people_scores(predicted: List[str], expected: List[str]) -> tuple:
+    """(true positives, predicted count, expected count)"""
+    matched = sum(1 for p in predicted if any(_same_person(p, e) for e in expected))
+    return matched, len(predicted), len(expected)
+
+
+def _period(value: Optional[str]) -> Optional[str]:
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+
+def score(results: List[dict], labeled: List[dict]) -> dict:
+    tp = n_pred = n_expected = 0
+    periods = themes_hit = themes_expected = 0
+    for result, label in zip(results, labeled):
+        t, p, e = people_scores(result.get("people") or [], label["people"])
+        tp, n_pred, n_expected = tp + t, n_pred + p, n_expected + e
+        periods += _period(result.get("time_period")) == _period(label["time_period"])
+        predicted_themes = {str(theme).lower() for theme in result.get("themes") or []}
+        themes_hit += sum(1 for theme in label["themes"] if theme in predicted_themes)
+        themes_expected += len(label["themes"])
+    precision = tp / n_pred if n_pred else 0.0
+    recall = tp / n_expected if n_expected else 0.0
+    return {
+        "people_f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "people_precision": precision,
+        "people_recall": recall,
+        "time_period_accuracy": periods / len(labeled),
+        "theme_recall": themes_hit / themes_expected if themes_expected else 0.0,
+    }
+
+
+def run_local(texts: List[str], repeat: int) -> tuple:
+    results = [m.to_dict() for m in local_extractor.extract_batch(texts)]
+    corpus = texts * repeat  # backfill-sized batch
+    started = time.perf_counter()
+    local_extractor.extract_batch(corpus)
+    batch_us = 1e6 * (time.perf_counter() - started) / len(corpus)
+    started = time.perf_counter()
+    for text in corpus:
+        local_extractor.extract(text)
+    single_us = 1e6 * (time.perf_counter() - started) / len(corpus)
+    return results, batch_us, single_us
+
+
+async def run_llm(texts: List[str]) -> tuple:
+    from app.services.ai_service import AIService
+    service = AIService(db=None)
+    results, latencies = [], []
+    for text in texts:
+        started = time.perf_counter()
+        results.append(await service._extract_story_metadata_llm(text))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return results, latencies
+
+
+def agreement_with_stored(limit: int) -> dict:
+    """How often the rules reproduce metadata already stored on stories"""
+    from app.db.session import SessionLocal
+    from app.models.database import Story
+    db = SessionLocal()
+    try:
+        rows = db.query(Story.content, Story.people_mentioned, Story.time_period).filter(
+            Story.time_period.isnot(None)
+        ).order_by(Story.id.desc()).limit(limit).all()
+    finally:
+        db.close()
+    if not rows:
+        return {}
+
+    started = time.perf_counter()
+    extracted = local_extractor.extract_batch([row.content for row in rows])
+    elapsed = time.perf_counter() - started
+    tp = n_pred = n_expected = periods = 0
+    for row, metadata in zip(rows, extracted):
+        t, p, e = people_scores(metadata.people, row.people_mentioned or [])
+        tp, n_pred, n_expected = tp + t, n_pred + p, n_expected + e
+        periods += _period(metadata.time_period) == _period(row.time_period)
+    return {
+        "stories": len(rows),
+        "people_precision": tp / n_pred if n_pred else 0.0,
+        "people_recall": tp / n_expected if n_expected else 0.0,
+        "time_period_agreement": periods / len(rows),
+        "us_per_story": 1e6 * elapsed / len(rows),
+    }
+
+
+def print_scores(name: str, scores: dict, latency: str):
+    print(f"{name:<6} {scores['people_f1']:>9.2f} {scores['people_precision']:>6.2f} {scores['people_recall']:>6.2f} "
+          f"{scores['time_period_accuracy']:>7.2f} {scores['theme_recall']:>7.2f}   {latency}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare local and LLM story metadata extraction")
+    parser.add_argument("--repeat", type=int, default=200, help="copies of the labeled set timed as one batch")
+    parser.add_argument("--skip-llm", action="store_true")
+    parser.add_argument("--from-db", type=int, default=0, metavar="N",
+                        help="also compare against metadata stored on the N newest stories")
+    args = parser.parse_args()
+
+    texts = [item["text"] for item in LABELED]
+    print("Story AI - Metadata Extractor Comparison")
+    print(f"{len(LABELED)} labeled stories\n")
+    print(f"{'path':<6} {'people F1':>9} {'prec':>6} {'recall':>6} {'period':>7} {'themes':>7}   latency")
+
+    local_results, batch_us, single_us = run_local(texts, args.repeat)
+    print_scores("local", score(local_results, LABELED), f"{batch_us:.0f}us/story batched, {single_us:.0f}us single")
+
+    if not args.skip_llm:
+        from app.db.config import settings
+        llm_results, latencies = asyncio.run(run_llm(texts))
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print_scores("llm", score(llm_results, LABELED), f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms")
+        if settings.LLM_PROVIDER == "fake":
+            print("  (LLM_PROVIDER=fake: LLM accuracy is not meaningful)")
+
+    if args.from_db:
+        agreement = agreement_with_stored(args.from_db)
+        if not agreement:
+            print("\nNo stories with stored metadata to compare against")
+        else:
+            print(f"\nAgreement with stored metadata ({agreement['stories']} stories): "
+                  f"people precision {agreement['people_precision']:.2f}, recall {agreement['people_recall']:.2f}, "
+                  f"time period {agreement['time_period_agreement']:.2f} "
+                  f"({agreement['us_per_story']:.0f}us/story)")
@@ -0,0 +1,175 @@
+"""
+SMS notification throughput
+Runs the NotificationDispatcher in-process against a FakeSmsSender while a
+producer thread queues story_generated events (as AIService.generate_story
+does) for users with several recipients each.
+
+Reports enqueue throughput, SMS sent/s (average and peak second, against
+NOTIFY_SMS_PER_SECOND), events coalesced per SMS, event-to-SMS lag, retries
+and final notification states.
+
+Usage (from backend/):
+    python -m benchmarks.notifications
+    python -m benchmarks.notifications --stories 5000 --sms-per-second 100 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.append('..')
+
+
+def seed(args):
+    """Users, their recipients and the stories whose events get queued"""
+    from sqlalchemy import insert
+    from app.db.session import SessionLocal
+    from app.models.database import NotificationRecipient, Story, User
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(User.__table__), [
+            {"id": u + 1, "name": f"Storyteller {u}", "email": f"storyteller{u}@example.com"}
+            for u in range(args.users)
+        ])
+        db.execute(insert(NotificationRecipient.__table__), [
+            {"user_id": u + 1, "name": f"Relative {r}", "phone_number": f"+1555{u:05d}{r:02d}"}
+            for u in range(args.users) for r in range(args.recipients)
+        ])
+        db.execute(insert(Story.__table__), [
+            {"user_id": s % args.users + 1, "title": f"Story {s}", "content": "..."}
+            for s in range(args.stories)
+        ])
+        db.commit()
+        return db.query(Story).order_by(Story.id).all()
+    finally:
+        db.close()
+
+
+def produce(stories: list, duration: float, result: dict):
+    """Queue one story's events per transaction, spread over `duration` seconds"""
+    from app.db.session import SessionLocal
+    from app.services.notification_service import notify_story
+
+    db = SessionLocal()
+    busy = 0.0
+    started = time.perf_counter()
+    try:
+        for i, story in enumerate(stories):
+            delay = started + duration * i / len(stories) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t0 = time.perf_counter()
+            result["events"] = result.get("events", 0) + notify_story(db, story)
+            db.commit()
+            busy += time.perf_counter() - t0
+    finally:
+        db.close()
+    result["busy"] = busy
+
+
+async def run(args) -> dict:
+    from app.db.session import SessionLocal
+    from app.models.database import Notification, NotificationStatus
+    from app.services.notification_service import FakeSmsSender, NotificationDispatcher, queue_stats
+
+    stories = await asyncio.to_thread(seed, args)
+    sender = FakeSmsSender(latency=args.latency, failure_rate=args.failure_rate, seed=1)
+    dispatcher = NotificationDispatcher(sender, sms_per_second=args.sms_per_second, poll_interval=0.05)
+    produced = {}
+    producer = threading.Thread(target=produce, args=(stories, args.duration, produced))
+
+    started = time.perf_counter()
+    producer.start()
+    dispatcher.start()
+    deadline = time.monotonic() + args.duration + args.timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        db = SessionLocal()
+        try:
+            stats = queue_stats(db, datetime.utcnow())
+            in_flight = db.query(Notification).filter(Notification.status == NotificationStatus.SENDING).count()
+        finally:
+            db.close()
+        print(f"  {time.perf_counter() - started:6.1f}s  pending {stats['pending']:>6}  sending {in_flight:>4}  "
+              f"lag {stats['lag_seconds']:6.1f}s  sms {sender.calls:>6}")
+        if not producer.is_alive() and not stats["pending"] and not in_flight:
+            break
+    elapsed = time.perf_counter() - started
+    await dispatcher.stop()
+    producer.join()
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Notification.status, Notification.attempts, Notification.created_at,
+                        Notification.sent_at, Notification.message_id).all()
+    finally:
+        db.close()
+    return {"elapsed": elapsed, "produced": produced, "sender": sender, "rows": rows}
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(args, result: dict):
+    rows, sender, produced = result["rows"], result["sender"], result["produced"]
+    sent = [row for row in rows if row.sent_at is not None]
+    messages = {row.message_id for row in sent}
+    per_second = Counter(row.sent_at.replace(microsecond=0) for row in {row.message_id: row for row in sent}.values())
+    lags = [(row.sent_at - row.created_at).total_seconds() for row in sent]
+
+    print(f"\nDone in {result['elapsed']:.1f}s")
+    print(f"  events queued:       {produced.get('events', 0)} "
+          f"({produced.get('events', 0) / max(produced.get('busy', 0), 1e-9):,.0f}/s while enqueueing)")
+    print(f"  SMS sent:            {len(messages)} ({len(messages) / result['elapsed']:.1f}/s average, "
+          f"{max(per_second.values(), default=0)}/s peak second; limit {args.sms_per_second})")
+    print(f"  send attempts:       {sender.calls} ({sender.calls - len(messages)} failed)")
+    print(f"  events per SMS:      {len(sent) / max(len(messages), 1):.2f}")
+    print(f"  event -> SMS lag:    p50 {percentile(lags, 0.5):.2f}s  p95 {percentile(lags, 0.95):.2f}s  "
+          f"max {max(lags, default=0):.2f}s (coalesce window {args.coalesce}s)")
+    print(f"  retried events:      {sum(1 for row in rows if row.attempts > 1)}")
+    print(f"  final states:        {dict(Counter(row.status.value for row in rows))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure SMS notification throughput against a fake sender")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipients", type=int, default=2, help="recipients per user")
+    parser.add_argument("--stories", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to spread story events over")
+    parser.add_argument("--sms-per-second", type=float, default=50.0, help="NOTIFY_SMS_PER_SECOND")
+    parser.add_argument("--coalesce", type=float, default=1.0, help="NOTIFY_COALESCE_SECONDS")
+    parser.add_argument("--recipient-interval", type=float, default=2.0, help="seconds between SMS to one number")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake send latency (seconds)")
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--retry-backoff", type=float, default=0.2, help="seconds before the first retry")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for the queue to drain")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='story_ai_notify_'), 'notify.db')}",
+        "NOTIFY_COALESCE_SECONDS": str(args.coalesce),
+        "NOTIFY_RECIPIENT_INTERVAL_MINUTES": str(args.recipient_interval / 60),
+        "NOTIFY_MAX_ATTEMPTS": str(args.max_attempts),
+        "NOTIFY_RETRY_BACKOFF_SECONDS": str(args.retry_backoff),
+        "SMS_SENDER": "fake",
+    })
+    from app.db.session import engine
+    from app.models.database import Base
+    Base.metadata.create_all(bind=engine)
+
+    print("Story AI - SMS Notification Benchmark")
+    print(f"{args.stories} stories for {args.users} users x {args.recipients} recipients over {args.duration}s, "
+          f"limit {args.sms_per_second} SMS/s\n")
+    report(args, asyncio.run(run(args)))
@@ -0,0 +1,158 @@
+"""
+Per-user query latency before and after hash partitioning (PostgreSQL)
+Runs the hot per-user queries of scripts/partition_tables.py for a random
+sample of users and reports p50/p95/p99, the partitions each query reads and
+the on-disk size of raw_inputs and stories (tables plus indexes).
+
+Load the synthetic dataset first, e.g.
+    python scripts/generate_dataset.py --database-url postgresql://... --users 5000 --inputs-per-user 200
+
+Usage (from backend/):
+    python -m benchmarks.partitioning --database-url postgresql://... --output before.json
+    python -m benchmarks.partitioning --database-url postgresql://... --migrate --partitions 16
+    python -m benchmarks.partitioning --compare before.json after.json
+"""
+import argparse
+import json
+import random
+import time
+from sqlalchemy import create_engine, text
+from benchmarks.run import percentile
+from app.db.partitioning import PARTITIONED_TABLES, partitioned_tables, relations_in_plan
+from scripts import partition_tables
+from scripts.partition_tables import HOT_QUERIES, sample_params
+
+
+def table_sizes(conn) -> dict:
+    """Bytes of each table with its indexes, summed over partitions"""
+    return {
+        table: conn.execute(text(
+            "SELECT COALESCE(sum(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(CAST(:t AS regclass))"
+        ), {"t": table}).scalar()
+        for table in PARTITIONED_TABLES
+    }
+
+
+def measure(engine, args) -> dict:
+    rng = random.Random(args.seed)
+    with engine.connect() as conn:
+        user_ids = list(conn.execute(text("SELECT DISTINCT user_id FROM raw_inputs")).scalars())
+        if not user_ids:
+            raise SystemExit("No raw_inputs: load a dataset with scripts/generate_dataset.py first")
+        users = [sample_params(conn, user_id) for user_id in rng.sample(user_ids, min(args.users, len(user_ids)))]
+        partitioned = sorted(partitioned_tables(conn))
+
+        report = {"partitioned": partitioned, "users": len(users), "queries": {}, "sizes": table_sizes(conn)}
+        for name, sql, _ in HOT_QUERIES:
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), users[0]).scalar()
+            for params in users:  # warm the cache, so both runs measure the same thing
+                conn.execute(text(sql), params).all()
+            samples = []
+            for _ in range(args.rounds):
+                for params in users:
+                    started = time.perf_counter()
+                    conn.execute(text(sql), params).all()
+                    samples.append(time.perf_counter() - started)
+            report["queries"][name] = {
+                "count": len(samples),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+                "relations": len(relations_in_plan(plan)),
+            }
+    return report
+
+
+def print_report(report: dict):
+    print(f"partitioned: {', '.join(report['partitioned']) or 'none'}; {report['users']} users sampled")
+    print(f"{'query':28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'tables read':>12}")
+    for name, stats in report["queries"].items():
+        print(f"{name:28} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['relations']:>12}")
+    for table, size in report["sizes"].items():
+        print(f"{table} size: {size / 2 ** 20:.1f} MiB")
+
+
+def compare(before: dict, after: dict):
+    def delta(old: float, new: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"{'query':28} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+    for name, new in after["queries"].items():
+        old = before["queries"].get(name)
+        if not old:
+            print(f"{name:28} {'(only in one run)':>18}")
+            continue
+        cells = [f"{new[key]} ({delta(old[key], new[key])})" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{name:28} " + " ".join(f"{cell:>18}" for cell in cells))
+    for table in PARTITIONED_TABLES:
+        old, new = before["sizes"].get(table, 0), after["sizes"].get(table, 0)
+        print(f"{table} size: {old / 2 ** 20:.1f} -> {new / 2 ** 20:.1f} MiB ({delta(old, new)})")
+
+
+def migrate(engine, args):
+    """The online migration of scripts/partition_tables.py, end to end, old tables dropped"""
+    for table in PARTITIONED_TABLES:
+        partition_tables.prepare(engine, table, args.partitions)
+        partition_tables.backfill(engine, table, args.batch_size, 0.0)
+        if not partition_tables.verify(engine, table):
+            raise SystemExit(f"{table}: copy doesn't match, see above")
+        partition_tables.swap(engine, table)
+        partition_tables.drop_old(engine, table)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user query latency before/after partitioning")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--database-url", help="PostgreSQL with the synthetic dataset loaded")
+    parser.add_argument("--migrate", action="store_true",
+                        help="measure, partition the tables online, measure again (writes --output-before/--output)")
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200, help="users sampled")
+    parser.add_argument("--rounds", type=int, default=5, help="runs of each query per sampled user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-before", default="partitioning_before.json")
+    parser.add_argument("--output", default="partitioning.json")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        compare(before, after)
+        return
+
+    if not args.database_url or not args.database_url.startswith("postgresql"):
+        parser.error("--database-url must be a PostgreSQL URL")
+    engine = create_engine(args.database_url)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f"ANALYZE {table}"))
+
+    print("Story AI - Partitioning Benchmark\n")
+    if args.migrate:
+        before = measure(engine, args)
+        with open(args.output_before, "w") as f:
+            json.dump(before, f, indent=2)
+        print_report(before)
+        print(f"\nPartitioning into {args.partitions}...")
+        migrate(engine, args)
+        print()
+
+    report = measure(engine, args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    if args.migrate:
+        print("\nAfter vs before")
+        compare(before, report)
+
+
+if __name__ == "__main__":
+    main()
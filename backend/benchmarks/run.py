@@ -0,0 +1,350 @@
+"""
+End-to-end benchmark harness
+Boots the API with uvicorn against a local database, swaps in local fakes for
+OpenAI/Telnyx/Comet, drives a weighted mix of requests at a fixed concurrency and
+writes per-endpoint p50/p99 latency and req/s to a JSON file.
+
+Usage (from backend/):
+    python -m benchmarks.run --duration 30 --concurrency 32 --output bench.json
+    python -m benchmarks.run --mix ingest=50,list=50 --database-url postgresql://...
+    python -m benchmarks.run --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.fakes import FakeRecordingServer, apply_env, fake_service_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "ingest=30,list=45,generate=5,webhook=20"
+
+SAMPLE_SENTENCES = [
+    "I remember the summer we drove to the lake in my father's old truck.",
+    "My grandmother kept a jar of peppermints on the kitchen windowsill.",
+    "We didn't have much money, but every Sunday there was a big dinner.",
+    "The first day at the factory I was so nervous I forgot my lunch.",
+    "Your grandfather proposed to me at the county fair in 1962.",
+    "I learned to fix engines from Mr. Alvarez down the street.",
+    "When the river flooded, the whole town came out to help.",
+]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            endpoints[endpoint] = {
+                "count": len(samples),
+                "errors": self.errors[endpoint],
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+            }
+        all_samples = [s for samples in self.latencies.values() for s in samples]
+        return {
+            "endpoints": endpoints,
+            "total": {
+                "count": len(all_samples),
+                "errors": sum(self.errors.values()),
+                "rps": round(len(all_samples) / elapsed, 2),
+                "p50_ms": round(percentile(all_samples, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(all_samples, 0.99) * 1000, 2),
+            },
+        }
+
+
+class Workload:
+    """Seeds users and drives the request mix against a running API"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, recordings: FakeRecordingServer, args):
+        self.client = client
+        self.recorder = recorder
+        self.recordings = recordings
+        self.args = args
+        self.users: List[dict] = []
+        self.branches: Dict[int, List[int]] = {}
+        self.inputs: Dict[int, List[int]] = defaultdict(list)
+        self.api = "/api/v1"
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, self.api + path, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    async def seed(self):
+        run_id = uuid.uuid4().hex[:8]
+        for i in range(self.args.users):
+            phone = f"+1555{random.randint(0, 9_999_999):07d}"
+            response = await self.client.post(f"{self.api}/users/", json={
+                "name": f"Bench User {i}",
+                "email": f"bench-{run_id}-{i}@example.com",
+                "phone_number": phone,
+            })
+            response.raise_for_status()
+            user = response.json()
+            self.users.append(user)
+
+            branch = await self.client.post(f"{self.api}/branches/", json={
+                "user_id": user["id"], "branch_type": "childhood", "title": "Growing Up"
+            })
+            branch.raise_for_status()
+            self.branches[user["id"]] = [branch.json()["id"]]
+
+            for _ in range(3):
+                await self.ingest(user, record=False)
+
+    def _text(self) -> str:
+        return " ".join(random.choices(SAMPLE_SENTENCES, k=random.randint(3, 12)))
+
+    async def ingest(self, user: dict, record: bool = True):
+        payload = {
+            "user_id": user["id"],
+            "input_type": "text",
+            "raw_text": self._text(),
+            "memory_branch_id": random.choice(self.branches[user["id"]]),
+        }
+        if record:
+            response = await self.call("POST /inputs", "POST", "/inputs/", json=payload)
+        else:
+            response = await self.client.post(f"{self.api}/inputs/", json=payload)
+        if response is not None and response.status_code == 200:
+            self.inputs[user["id"]].append(response.json()["id"])
+
+    async def list(self, user: dict):
+        choice = random.randrange(3)
+        if choice == 0:
+            await self.call("GET /stories/user/{id}", "GET", f"/stories/user/{user['id']}")
+        elif choice == 1:
+            await self.call("GET /inputs/user/{id}", "GET", f"/inputs/user/{user['id']}")
+        else:
+            await self.call("GET /branches/user/{id}", "GET", f"/branches/user/{user['id']}")
+
+    async def generate(self, user: dict):
+        input_ids = self.inputs[user["id"]]
+        if not input_ids:
+            return await self.ingest(user)
+        await self.call("POST /stories/generate", "POST", "/stories/generate", json={
+            "user_id": user["id"],
+            "input_ids": random.sample(input_ids, min(3, len(input_ids))),
+            "memory_branch_id": self.branches[user["id"]][0],
+        })
+
+    async def webhook(self, user: dict):
+        async def one():
+            call_id = uuid.uuid4().hex
+            await self.call("POST /voice/webhook", "POST", "/voice/webhook", json={
+                "data": {
+                    "event_type": "call.recording.saved",
+                    "payload": {
+                        "call_control_id": call_id,
+                        "from": user["phone_number"],
+                        "to": "+15550000000",
+                        "recording_urls": {"mp3": self.recordings.recording_url(call_id)},
+                    },
+                }
+            })
+        await asyncio.gather(*[one() for _ in range(self.args.webhook_burst)])
+
+    async def run(self, duration: float, concurrency: int, weights: Dict[str, int]) -> float:
+        ops = list(weights)
+        op_weights = [weights[op] for op in ops]
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            while time.monotonic() < deadline:
+                op = random.choices(ops, op_weights)[0]
+                await getattr(self, op)(random.choice(self.users))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - start
+
+
+def start_server(args, recordings: FakeRecordingServer) -> subprocess.Popen:
+    overrides = fake_service_env(
+        llm_latency=args.llm_latency,
+        llm_tokens_per_second=args.llm_tokens_per_second,
+    )
+    overrides.update({
+        "DATABASE_URL": args.database_url,
+        "DEBUG": "False",
+        # A fresh webhook queue per run, so earlier runs' backlog isn't replayed
+        "WEBHOOK_QUEUE_PATH": os.path.join(tempfile.mkdtemp(prefix="story_ai_bench_"), "webhooks.db"),
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=apply_env(overrides))
+
+
+async def wait_for_server(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+async def benchmark(args) -> dict:
+    weights = parse_mix(args.mix)
+    recorder = Recorder()
+    server = None
+
+    with FakeRecordingServer(size=args.recording_size, latency=args.recording_latency) as recordings:
+        base_url = args.base_url
+        if not base_url:
+            args.port = args.port or free_port()
+            base_url = f"http://127.0.0.1:{args.port}"
+            server = start_server(args, recordings)
+        try:
+            await wait_for_server(base_url)
+            limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+                workload = Workload(client, recorder, recordings, args)
+                await workload.seed()
+                elapsed = await workload.run(args.duration, args.concurrency, weights)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+    return {
+        "config": {
+            "mix": weights,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "users": args.users,
+            "workers": args.workers,
+            "database": args.database_url.split("://")[0],
+            "llm_latency": args.llm_latency,
+            "webhook_burst": args.webhook_burst,
+        },
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "elapsed": round(elapsed, 3),
+        **recorder.report(elapsed),
+    }
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':32} {'count':>7} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for endpoint, stats in rows:
+        print(
+            f"{endpoint:32} {stats['count']:>7} {stats['errors']:>5} {stats['rps']:>9} "
+            f"{stats['p50_ms']:>9} {stats['p99_ms']:>9}"
+        )
+
+
+def compare(before_path: str, after_path: str):
+    """Print per-endpoint changes between two benchmark result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def delta(old: float, new: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"{'endpoint':32} {'req/s':>18} {'p50 ms':>18} {'p99 ms':>18}")
+    endpoints = sorted(set(before["endpoints"]) | set(after["endpoints"]))
+    for endpoint in endpoints + ["TOTAL"]:
+        old = before["total"] if endpoint == "TOTAL" else before["endpoints"].get(endpoint)
+        new = after["total"] if endpoint == "TOTAL" else after["endpoints"].get(endpoint)
+        if not old or not new:
+            print(f"{endpoint:32} {'(only in one run)':>18}")
+            continue
+        cells = [f"{new[key]} ({delta(old[key], new[key])})" for key in ("rps", "p50_ms", "p99_ms")]
+        print(f"{endpoint:32} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Story AI end-to-end benchmark")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--base-url", help="benchmark an already running server instead of booting one")
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted ops: ingest,list,generate,webhook")
+    parser.add_argument("--webhook-burst", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--recording-size", type=int, default=64_000)
+    parser.add_argument("--recording-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    random.seed(args.seed)
+    report = asyncio.run(benchmark(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
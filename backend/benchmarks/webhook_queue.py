@@ -0,0 +1,140 @@
+"""
+Webhook queue throughput
+Appends sample webhook payloads from many concurrent producers (like
+concurrent webhook requests) and reports events/s, append latency and the
+average group-commit size, for each synchronous mode. A baseline writes one
+transaction per event, which is what the queue would cost without group
+commit. Finally drains the log with a no-op handler to measure consumer
+throughput.
+
+Usage (from backend/):
+    python -m benchmarks.webhook_queue
+    python -m benchmarks.webhook_queue --events 200000 --producers 512 --dir /var/tmp
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append('..')
+
+from app.services.webhook_queue import WebhookQueue, QueueConsumer, GROUP_COMMIT_SIZE
+
+PAYLOAD = json.dumps({
+    "data": {
+        "event_type": "call.recording.saved",
+        "payload": {
+            "call_control_id": "v3:abcdefghijklmnopqrstuvwxyz0123456789",
+            "from": "+15555550100",
+            "to": "+15555550199",
+            "recording_urls": {"mp3": "https://example.com/recordings/abcdefghijklmnopqrstuvwxyz.mp3"},
+        },
+    }
+}).encode()
+
+
+def fresh_path(directory: str, name: str) -> str:
+    path = os.path.join(directory, name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return path
+
+
+async def run_appends(queue: WebhookQueue, events: int, producers: int) -> dict:
+    latencies = []
+    per_producer = events // producers
+
+    async def producer():
+        for _ in range(per_producer):
+            started = time.perf_counter()
+            await queue.append(PAYLOAD, "call.recording.saved")
+            latencies.append(time.perf_counter() - started)
+
+    commits_before = GROUP_COMMIT_SIZE.get_count()
+    started = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(producers)))
+    elapsed = time.perf_counter() - started
+    commits = GROUP_COMMIT_SIZE.get_count() - commits_before
+    latencies.sort()
+    return {
+        "events_per_second": len(latencies) / elapsed,
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))],
+        "events_per_commit": len(latencies) / commits if commits else 0.0,
+    }
+
+
+def run_baseline(path: str, events: int) -> float:
+    """One transaction (and fsync) per event"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("CREATE TABLE events (seq INTEGER PRIMARY KEY, received_at REAL, event_type TEXT, payload BLOB)")
+    started = time.perf_counter()
+    for _ in range(events):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO events (received_at, event_type, payload) VALUES (?, ?, ?)",
+                     (time.time(), "call.recording.saved", PAYLOAD))
+        conn.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return events / elapsed
+
+
+async def run_drain(queue: WebhookQueue, batch_size: int) -> float:
+    async def handler(event):
+        pass
+
+    consumer = QueueConsumer(queue, "bench", handler, batch_size=batch_size)
+    queue.acquire_lease(consumer.name, consumer.owner, consumer.lease_ttl)
+    started = time.perf_counter()
+    processed = 0
+    while True:
+        count = await consumer.drain_batch()
+        if not count:
+            break
+        processed += count
+    elapsed = time.perf_counter() - started
+    queue.release_lease(consumer.name, consumer.owner)
+    return processed / elapsed
+
+
+async def main(args):
+    directory = args.dir or tempfile.mkdtemp(prefix="story_ai_queue_bench_")
+    print("Story AI - Webhook Queue Benchmark")
+    print(f"{args.events} events of {len(PAYLOAD)} bytes, {args.producers} concurrent producers\n")
+    print(f"{'mode':<22} {'events/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'events/commit':>14}")
+
+    baseline_events = min(args.events, args.baseline_events)
+    rate = run_baseline(fresh_path(directory, "baseline.db"), baseline_events)
+    print(f"{'per-event commit':<22} {rate:>10.0f} {'':>8} {'':>8} {1:>14}")
+
+    queue = None
+    for synchronous in ("FULL", "NORMAL"):
+        if queue is not None:
+            queue.close()
+        queue = WebhookQueue(fresh_path(directory, f"queue_{synchronous.lower()}.db"), synchronous=synchronous,
+                             max_backlog=args.events * 2)
+        result = await run_appends(queue, args.events, args.producers)
+        print(f"{'group commit ' + synchronous:<22} {result['events_per_second']:>10.0f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['events_per_commit']:>14.1f}")
+
+    rate = await run_drain(queue, args.batch_size)
+    print(f"\nConsumer (no-op handler, batches of {args.batch_size}): {rate:.0f} events/s")
+    queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure webhook queue append and drain throughput")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--producers", type=int, default=256)
+    parser.add_argument("--baseline-events", type=int, default=5_000, help="events for the per-event commit baseline")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dir", help="directory for the queue files (default: a temp dir); use the production disk")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,85 @@
+"""
+Audio blob backfill script
+Copies recordings of voice inputs created before the blob store into it
+and sets raw_inputs.audio_blob_key. Recordings whose URL has expired are
+reported and left as they are.
+
+Usage:
+    python scripts/backfill_audio_blobs.py [--dry-run] [--batch-size 100]
+"""
+import argparse
+import asyncio
+import sys
+sys.path.append('..')
+
+from sqlalchemy import update
+from app.models.database import RawInput
+from app.db.session import SessionLocal
+from app.services.telnyx_service import TelnyxService
+from app.api.blobs import guess_audio_type
+
+
+async def backfill_audio_blobs(batch_size: int = 100, dry_run: bool = False) -> dict:
+    """Download recordings in id-ordered batches, one UPDATE per batch"""
+    db = SessionLocal()
+    telnyx_service = TelnyxService()
+    stats = {"scanned": 0, "stored": 0, "deduplicated": 0, "failed": []}
+    last_id = 0
+
+    try:
+        while True:
+            rows = db.query(RawInput.id, RawInput.audio_url, RawInput.input_metadata).filter(
+                RawInput.id > last_id,
+                RawInput.audio_url.isnot(None),
+                RawInput.audio_blob_key.is_(None)
+            ).order_by(RawInput.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            updates = []
+            for input_id, audio_url, metadata in rows:
+                stats["scanned"] += 1
+                if dry_run:
+                    continue
+                try:
+                    blob = await telnyx_service.download_recording(audio_url)
+                except Exception as e:
+                    stats["failed"].append((input_id, str(e)))
+                    continue
+                stats["stored" if blob.created else "deduplicated"] += 1
+                updates.append({
+                    "id": input_id,
+                    "audio_blob_key": blob.key,
+                    "input_metadata": {
+                        **(metadata or {}),
+                        "audio_size": blob.size,
+                        "audio_content_type": guess_audio_type(audio_url)
+                    }
+                })
+
+            if updates:
+                db.execute(update(RawInput), updates)
+                db.commit()
+            last_id = rows[-1][0]
+    finally:
+        db.close()
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy voice recordings into the local blob store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("Story AI - Audio Blob Backfill")
+    stats = asyncio.run(backfill_audio_blobs(batch_size=args.batch_size, dry_run=args.dry_run))
+    if args.dry_run:
+        print(f"✓ {stats['scanned']} inputs have recordings to copy")
+        sys.exit(0)
+
+    print(f"✓ Scanned {stats['scanned']} inputs: stored {stats['stored']} recordings, "
+          f"{stats['deduplicated']} already in the store")
+    for input_id, error in stats["failed"]:
+        print(f"  ⚠️  Input {input_id}: {error}")
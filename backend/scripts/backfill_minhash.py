@@ -0,0 +1,82 @@
+"""
+Near-duplicate backfill script
+Signs raw inputs created before duplicate detection and flags retellings,
+one user at a time (each user's inputs in id order, so the first telling
+stays the original).
+
+Usage:
+    python scripts/backfill_minhash.py [--dry-run] [--user-id 42]
+"""
+import argparse
+import sys
+from datetime import datetime
+sys.path.append('..')
+
+from sqlalchemy import update
+from app.db.config import settings
+from app.models.database import RawInput
+from app.db.session import SessionLocal
+from app.services.dedup_service import UserIndex, minhash_signature, signature_from_bytes
+
+
+def backfill_user(db, user_id: int, dry_run: bool) -> dict:
+    rows = db.query(
+        RawInput.id, RawInput.raw_text, RawInput.minhash_signature, RawInput.duplicate_of_id, RawInput.input_metadata
+    ).filter(RawInput.user_id == user_id).order_by(RawInput.id).all()
+
+    index = UserIndex()
+    updates = []
+    flagged = 0
+    for row in rows:
+        if row.minhash_signature is not None:
+            index.add(row.id, signature_from_bytes(row.minhash_signature), row.duplicate_of_id)
+            continue
+        signature = minhash_signature(row.raw_text)
+        if signature is None:
+            continue
+        values = {"id": row.id, "minhash_signature": signature.tobytes(), "minhash_signed_at": datetime.utcnow()}
+        match = index.best_match(signature, settings.DEDUP_THRESHOLD)
+        root = None
+        if match:
+            input_id, score = match
+            root = index.roots.get(input_id, input_id)
+            values["duplicate_of_id"] = root
+            values["input_metadata"] = {**(row.input_metadata or {}), "duplicate_similarity": round(score, 3)}
+            flagged += 1
+        index.add(row.id, signature, root)
+        updates.append(values)
+
+    if updates and not dry_run:
+        # Rows with and without a match have different keys: one executemany each
+        for keys in {tuple(sorted(u)) for u in updates}:
+            db.execute(update(RawInput), [u for u in updates if tuple(sorted(u)) == keys])
+        db.commit()
+    return {"signed": len(updates), "flagged": flagged}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sign existing raw inputs and flag near-duplicates")
+    parser.add_argument("--user-id", type=int, help="only this user")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("Story AI - Near-duplicate Backfill")
+    db = SessionLocal()
+    try:
+        if args.user_id:
+            user_ids = [args.user_id]
+        else:
+            user_ids = [row[0] for row in db.query(RawInput.user_id).filter(
+                RawInput.minhash_signature.is_(None)
+            ).distinct().all()]
+
+        signed = flagged = 0
+        for user_id in user_ids:
+            stats = backfill_user(db, user_id, args.dry_run)
+            signed += stats["signed"]
+            flagged += stats["flagged"]
+    finally:
+        db.close()
+
+    verb = "would sign" if args.dry_run else "signed"
+    print(f"✓ {len(user_ids)} users: {verb} {signed} inputs, {flagged} flagged as retellings")
@@ -0,0 +1,95 @@
+"""
+Phone number backfill script
+Normalizes existing users.phone_number values to E.164 and creates the unique index
+
+Usage:
+    python scripts/backfill_phone_numbers.py [--dry-run] [--batch-size 1000]
+"""
+import argparse
+import sys
+sys.path.append('..')
+
+from sqlalchemy import update
+from app.models.database import User
+from app.db.session import engine, SessionLocal
+from app.services.phone_service import mark_numbers_changed, try_normalize_phone_number
+
+
+def backfill_phone_numbers(batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Normalize phone numbers in id-ordered batches
+    Numbers that can't be normalized, or that collide with another user
+    after normalization, are reported and left untouched.
+    """
+    db = SessionLocal()
+    seen = {}  # normalized number -> user_id that keeps it
+    stats = {"scanned": 0, "updated": 0, "invalid": [], "conflicts": []}
+    last_id = 0
+
+    try:
+        while True:
+            rows = db.query(User.id, User.phone_number).filter(
+                User.id > last_id,
+                User.phone_number.isnot(None)
+            ).order_by(User.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            updates = []
+            for user_id, phone_number in rows:
+                stats["scanned"] += 1
+                normalized = try_normalize_phone_number(phone_number)
+                if not normalized:
+                    stats["invalid"].append((user_id, phone_number))
+                    continue
+                if normalized in seen:
+                    stats["conflicts"].append((user_id, seen[normalized], normalized))
+                    continue
+                seen[normalized] = user_id
+                if normalized != phone_number:
+                    updates.append({"id": user_id, "phone_number": normalized, "old": phone_number})
+
+            if updates and not dry_run:
+                # Bulk UPDATE ... WHERE id = :id, one statement per batch. The ORM
+                # doesn't track these rows, so tell running workers' caller caches
+                mark_numbers_changed(db, [u["old"] for u in updates] + [u["phone_number"] for u in updates])
+                db.execute(update(User), [{"id": u["id"], "phone_number": u["phone_number"]} for u in updates])
+                db.commit()
+            stats["updated"] += len(updates)
+            last_id = rows[-1][0]
+    finally:
+        db.close()
+
+    return stats
+
+
+def create_phone_index():
+    """Create ix_users_phone_number if it doesn't exist yet"""
+    for index in User.__table__.indexes:
+        if "phone_number" in index.columns:
+            index.create(bind=engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize user phone numbers to E.164")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("Story AI - Phone Number Backfill")
+    stats = backfill_phone_numbers(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(f"✓ Scanned {stats['scanned']} users, {'would update' if args.dry_run else 'updated'} {stats['updated']}")
+
+    for user_id, phone_number in stats["invalid"]:
+        print(f"  ⚠️  User {user_id}: could not normalize {phone_number!r}")
+    for user_id, other_id, number in stats["conflicts"]:
+        print(f"  ⚠️  User {user_id}: {number} already belongs to user {other_id}")
+
+    if args.dry_run:
+        sys.exit(0)
+    if stats["conflicts"]:
+        print("\nResolve the conflicts above, then re-run to create the unique index.")
+        sys.exit(1)
+
+    create_phone_index()
+    print("✓ Unique index on users.phone_number is in place")
@@ -0,0 +1,93 @@
+"""
+Story metadata backfill script
+Fills missing people_mentioned / time_period / key_themes on existing stories
+with the local rule-based extractor (no LLM calls). Values already set are
+kept unless --overwrite is given.
+
+Usage:
+    python scripts/backfill_story_metadata.py [--dry-run] [--overwrite] [--batch-size 1000]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+sys.path.append('..')
+
+from sqlalchemy import or_, update
+from app.models.database import Story
+from app.db.session import SessionLocal
+from app.services.entity_cache import mark_changed
+from app.services.metadata_extractor import local_extractor
+from app.services.story_tags import reindex_stories
+from app.services.timeline import refresh_timeline
+
+FIELDS = {"people_mentioned": "people", "time_period": "time_period", "key_themes": "themes"}
+
+
+def backfill_story_metadata(batch_size: int = 1000, overwrite: bool = False, dry_run: bool = False) -> dict:
+    """Extract in id-ordered batches (one extract_batch call and one UPDATE per batch)"""
+    db = SessionLocal()
+    stats = {"scanned": 0, "updated": 0, "filled": {column: 0 for column in FIELDS}, "extract_seconds": 0.0}
+    last_id = 0
+
+    try:
+        while True:
+            query = db.query(
+                Story.id, Story.content, Story.people_mentioned, Story.time_period, Story.key_themes
+            ).filter(Story.id > last_id)
+            if not overwrite:
+                query = query.filter(or_(
+                    Story.people_mentioned.is_(None),
+                    Story.time_period.is_(None),
+                    Story.key_themes.is_(None)
+                ))
+            rows = query.order_by(Story.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            started = time.perf_counter()
+            extracted = local_extractor.extract_batch([row.content for row in rows])
+            stats["extract_seconds"] += time.perf_counter() - started
+
+            now = datetime.utcnow()
+            updates = []
+            for row, metadata in zip(rows, extracted):
+                stats["scanned"] += 1
+                values = {}
+                for column, key in FIELDS.items():
+                    value = getattr(metadata, key)
+                    if (overwrite or getattr(row, column) is None) and value not in (None, []):
+                        values[column] = value
+                        stats["filled"][column] += 1
+                if values:
+                    updates.append({"id": row.id, "updated_at": now, **values})
+
+            if updates and not dry_run:
+                db.execute(update(Story), updates)
+                mark_changed(db, "story", [u["id"] for u in updates])
+                # bulk UPDATE bypasses the session hooks
+                reindex_stories(db, [u["id"] for u in updates])
+                refresh_timeline(db, [u["id"] for u in updates if "time_period" in u])
+                db.commit()
+            stats["updated"] += len(updates)
+            last_id = rows[-1].id
+    finally:
+        db.close()
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill story metadata with the local extractor")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--overwrite", action="store_true", help="replace existing (LLM) values too")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("Story AI - Story Metadata Backfill")
+    stats = backfill_story_metadata(batch_size=args.batch_size, overwrite=args.overwrite, dry_run=args.dry_run)
+    per_story = 1e6 * stats["extract_seconds"] / stats["scanned"] if stats["scanned"] else 0.0
+    print(f"✓ Scanned {stats['scanned']} stories, {'would update' if args.dry_run else 'updated'} "
+          f"{stats['updated']} ({per_story:.0f}us/story extraction)")
+    for column, count in stats["filled"].items():
+        print(f"  {column}: {count}")
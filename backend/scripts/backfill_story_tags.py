@@ -0,0 +1,48 @@
+"""
+Story people/theme index backfill script
+Fills story_tags and user_tag_counts from people_mentioned / key_themes of
+existing stories (created before the index, or changed by bulk UPDATEs).
+Re-running is safe: each story is diffed against what's already indexed.
+
+Usage:
+    python scripts/backfill_story_tags.py [--batch-size 1000]
+"""
+import argparse
+import sys
+sys.path.append('..')
+
+from app.models.database import Story
+from app.db.session import SessionLocal
+from app.services.story_tags import reindex_stories
+
+
+def backfill_story_tags(batch_size: int = 1000) -> int:
+    """Reindex in id-ordered batches, one transaction per batch"""
+    db = SessionLocal()
+    last_id = 0
+    done = 0
+    try:
+        while True:
+            ids = [row[0] for row in db.query(Story.id).filter(
+                Story.id > last_id
+            ).order_by(Story.id).limit(batch_size)]
+            if not ids:
+                break
+            reindex_stories(db, ids)
+            db.commit()
+            done += len(ids)
+            last_id = ids[-1]
+            print(f"  {done} stories")
+    finally:
+        db.close()
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index people and themes of existing stories")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Story AI - Story Tag Backfill")
+    total = backfill_story_tags(batch_size=args.batch_size)
+    print(f"✓ Indexed people and themes of {total} stories")
@@ -0,0 +1,48 @@
+"""
+Timeline backfill script
+Places existing stories on their users' timelines (timeline_entries), e.g.
+after adding the table or changing the period parser. Re-running replaces
+each story's entry.
+
+Usage:
+    python scripts/backfill_timeline.py [--batch-size 1000]
+"""
+import argparse
+import sys
+sys.path.append('..')
+
+from app.models.database import Story
+from app.db.session import SessionLocal
+from app.services.timeline import refresh_timeline
+
+
+def backfill_timeline(batch_size: int = 1000) -> int:
+    """Re-place stories in id-ordered batches, one transaction per batch"""
+    db = SessionLocal()
+    last_id = 0
+    done = 0
+    try:
+        while True:
+            ids = [row[0] for row in db.query(Story.id).filter(
+                Story.id > last_id
+            ).order_by(Story.id).limit(batch_size)]
+            if not ids:
+                break
+            refresh_timeline(db, ids)
+            db.commit()
+            done += len(ids)
+            last_id = ids[-1]
+            print(f"  {done} stories")
+    finally:
+        db.close()
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Place existing stories on the timeline")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Story AI - Timeline Backfill")
+    total = backfill_timeline(batch_size=args.batch_size)
+    print(f"✓ Placed {total} stories")
@@ -0,0 +1,52 @@
+"""
+Create a call campaign (e.g. weekly from cron)
+Calls every user with a phone number (or --user-id ...) during the given
+windows; the API's campaign dispatcher places the calls.
+
+Usage:
+    python scripts/create_campaign.py --name "Weekly story call" --timezone America/New_York \
+        --window 0-4,17:00-20:00 --window 5,10:00-12:00 [--max-attempts 3] [--retry-backoff-minutes 120]
+"""
+import argparse
+import sys
+sys.path.append('..')
+
+from app.db.session import SessionLocal
+from app.schemas.schemas import CampaignCreate, CallWindow
+from app.services.campaign_service import create_campaign
+
+
+def parse_window(value: str) -> CallWindow:
+    """"0-4,17:00-20:00" -> Monday to Friday, 17:00 to 20:00"""
+    days, hours = value.split(",")
+    first, _, last = days.partition("-")
+    start, end = hours.split("-")
+    return CallWindow(days=list(range(int(first), int(last or first) + 1)), start=start, end=end)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create an outbound call campaign")
+    parser.add_argument("--name", required=True)
+    parser.add_argument("--timezone", default="UTC")
+    parser.add_argument("--window", action="append", default=[], help="DAYS,HH:MM-HH:MM (days 0=Monday..6, e.g. 0-4)")
+    parser.add_argument("--user-id", type=int, action="append", help="only these users (repeatable)")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--retry-backoff-minutes", type=float, default=60.0)
+    args = parser.parse_args()
+
+    data = CampaignCreate(
+        name=args.name,
+        user_ids=args.user_id,
+        timezone=args.timezone,
+        windows=[parse_window(window) for window in args.window],
+        max_attempts=args.max_attempts,
+        retry_backoff_minutes=args.retry_backoff_minutes
+    )
+    db = SessionLocal()
+    try:
+        campaign, skipped = create_campaign(db, data)
+        print(f"✓ Campaign {campaign.id} ({campaign.name}) created")
+        if skipped:
+            print(f"  skipped {len(skipped)} users without a phone number: {skipped[:20]}")
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+"""
+Input enrichment backfill script
+Runs the ingest-time enrichment (token counts, people/time period, summaries,
+duplicate flags and optional embeddings) over inputs that don't have it yet,
+e.g. inputs stored before enrichment existed or while ENRICH_ON_INGEST was off.
+
+Usage:
+    python scripts/enrich_inputs.py [--batch-size 50] [--user-id 42]
+"""
+import argparse
+import asyncio
+import sys
+sys.path.append('..')
+
+from app.models.database import RawInput
+from app.db.session import SessionLocal
+from app.services.enrichment_service import enrich_inputs
+
+
+async def enrich_all(batch_size: int, user_id: int = None) -> int:
+    """Enrich in id order (so first tellings stay the originals), one batch at a time"""
+    db = SessionLocal()
+    try:
+        query = db.query(RawInput.id).filter(RawInput.enriched_at.is_(None), RawInput.raw_text.isnot(None))
+        if user_id:
+            query = query.filter(RawInput.user_id == user_id)
+        ids = [row[0] for row in query.order_by(RawInput.id).all()]
+    finally:
+        db.close()
+
+    for start in range(0, len(ids), batch_size):
+        await enrich_inputs(ids[start:start + batch_size])
+        print(f"  {min(start + batch_size, len(ids))}/{len(ids)}")
+    return len(ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrich raw inputs that haven't been enriched yet")
+    parser.add_argument("--batch-size", type=int, default=50, help="inputs per enrichment batch (one summary pass each)")
+    parser.add_argument("--user-id", type=int, help="only this user")
+    args = parser.parse_args()
+
+    print("Story AI - Input Enrichment Backfill")
+    total = asyncio.run(enrich_all(args.batch_size, args.user_id))
+    print(f"✓ Processed {total} inputs (see input_enrichments_total on /metrics for failures)")
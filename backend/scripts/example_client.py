@@ -1,6 +1,7 @@
 """
 Story AI - Example Client
 Simple Python client demonstrating how to interact with the Story AI API
+(for applications use the async client in story_ai_client/)
 """
 import requests
 import json
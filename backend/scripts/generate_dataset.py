@@ -0,0 +1,286 @@
+"""
+Synthetic dataset generator for load and query testing
+Creates production-scale volumes (thousands of users, millions of raw inputs,
+story version chains) using COPY on PostgreSQL or batched INSERTs elsewhere.
+Output is reproducible for a given --seed.
+
+Usage:
+    python scripts/generate_dataset.py --users 5000 --inputs-per-user 200 --seed 42
+    python scripts/generate_dataset.py --database-url sqlite:///./synthetic.db --users 100
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+sys.path.append('..')
+
+from sqlalchemy import create_engine, func, select, text
+from app.models.database import Base, User, MemoryBranch, RawInput, Story, StoryBranchType, InputType
+
+FIRST_NAMES = [
+    "Rose", "Walter", "Margaret", "Harold", "Dorothy", "Frank", "Helen", "George", "Ruth", "Arthur",
+    "Betty", "Edward", "Irene", "Louis", "Mildred", "Ray", "Evelyn", "Carl", "Alice", "Joe",
+]
+LAST_NAMES = ["Miller", "Okafor", "Nguyen", "Garcia", "Kowalski", "Smith", "Rossi", "Cohen", "Tanaka", "Brown"]
+KIN = ["Aunt", "Uncle", "Grandma", "Grandpa", "Cousin", "my brother", "my sister", "my mother", "my father"]
+PLACES = ["the lake", "the farm", "the county fair", "the mill", "church", "the old school", "the harbor", "Chicago"]
+PERIODS = ["1940s", "1950s", "1960s", "1970s", "1980s", "1990s", "childhood", "my teens", "early career",
+           "after the war", "college", "retirement"]
+THEMES = ["family", "hard work", "resilience", "love", "faith", "humor", "loss", "adventure", "gratitude"]
+SENTENCE_TEMPLATES = [
+    "In the {period}, {person} and I used to walk down to {place} every Saturday.",
+    "{kin} {first} always said that hard work never hurt anybody.",
+    "I remember {place} smelled like rain and sawdust when I was young.",
+    "We didn't have much, but {person} made sure there was always bread on the table.",
+    "The year I turned {age}, we moved closer to {place}.",
+    "{kin} {first} taught me how to fix a tractor engine with nothing but wire.",
+    "That was the {period}, and everything felt like it was changing at once.",
+    "I still think about the day {person} came home from {place} with a puppy.",
+    "Your grandfather and I met at {place}; he was terrible at dancing.",
+    "If there's one thing I learned, it's to be kind to people who can't repay you.",
+]
+
+
+def lognormal_int(rng: random.Random, median: float, sigma: float, low: int, high: int) -> int:
+    return max(low, min(high, int(rng.lognormvariate(math.log(median), sigma))))
+
+
+class TextFactory:
+    """Builds transcripts from a precomputed sentence pool (fast enough for millions of rows)"""
+
+    def __init__(self, rng: random.Random, pool_size: int = 5000):
+        self.rng = rng
+        self.pool = [self._sentence() for _ in range(pool_size)]
+
+    def _sentence(self) -> str:
+        rng = self.rng
+        first = rng.choice(FIRST_NAMES)
+        return rng.choice(SENTENCE_TEMPLATES).format(
+            period=rng.choice(PERIODS),
+            person=f"{first} {rng.choice(LAST_NAMES)}",
+            place=rng.choice(PLACES),
+            kin=rng.choice(KIN),
+            first=first,
+            age=rng.randint(5, 70),
+        )
+
+    def text(self, median_sentences: float, sigma: float = 0.8, max_sentences: int = 400) -> str:
+        count = lognormal_int(self.rng, median_sentences, sigma, 1, max_sentences)
+        return " ".join(self.rng.choices(self.pool, k=count))
+
+
+class BulkWriter:
+    """
+    Buffers rows per table and writes them in dependency order
+    COPY ... FROM STDIN on PostgreSQL, batched executemany INSERTs elsewhere
+    """
+
+    TABLE_ORDER = ["users", "memory_branches", "raw_inputs", "stories"]
+
+    def __init__(self, engine, batch_size: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.is_postgres = engine.dialect.name == "postgresql"
+        self.tables = {t.name: t for t in Base.metadata.sorted_tables}
+        self.buffers = {name: [] for name in self.TABLE_ORDER}
+        self.counts = {name: 0 for name in self.TABLE_ORDER}
+
+    def add(self, table: str, row: dict):
+        self.buffers[table].append(row)
+        if len(self.buffers[table]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for name in self.TABLE_ORDER:
+            rows = self.buffers[name]
+            if rows:
+                self._write(name, rows)
+                self.counts[name] += len(rows)
+                self.buffers[name] = []
+
+    def _write(self, name: str, rows: list):
+        if self.is_postgres:
+            self._copy(name, rows)
+        else:
+            # One compiled INSERT, executemany'd over the batch (drivers such as
+            # mysqlclient rewrite this into multi-row VALUES)
+            with self.engine.begin() as conn:
+                conn.execute(self.tables[name].insert(), rows)
+
+    def _copy(self, name: str, rows: list):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self._copy_value(row[column]) for column in columns])
+        buffer.seek(0)
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.copy_expert(
+                f"COPY {name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            raw.commit()
+        finally:
+            raw.close()
+
+    @staticmethod
+    def _copy_value(value):
+        if value is None:
+            return None  # empty unquoted field -> NULL
+        if isinstance(value, (StoryBranchType, InputType)):
+            return value.name  # SQLAlchemy Enum columns store member names
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def reset_sequences(self):
+        if not self.is_postgres:
+            return
+        with self.engine.begin() as conn:
+            for name in self.TABLE_ORDER:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {name}), 1))"
+                ))
+
+
+def next_ids(engine) -> dict:
+    """First free id per table, so generated rows can reference each other directly"""
+    ids = {}
+    with engine.connect() as conn:
+        for model in (User, MemoryBranch, RawInput, Story):
+            ids[model.__tablename__] = (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+    return ids
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+
+    texts = TextFactory(rng)
+    writer = BulkWriter(engine, args.batch_size)
+    ids = next_ids(engine)
+    branch_types = list(StoryBranchType)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+
+    for u in range(args.users):
+        user_id = ids["users"]
+        ids["users"] += 1
+        joined = now - timedelta(days=rng.randint(30, 5 * 365))
+        writer.add("users", {
+            "id": user_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"synthetic-{args.seed}-{user_id}@example.com",
+            "phone_number": f"+1{args.seed % 10}{user_id:09d}"[:16],
+            "created_at": joined,
+            "updated_at": joined,
+        })
+
+        # Every branch type shows up across the dataset: rotate through them
+        count = rng.randint(3, 8)
+        user_branch_types = [branch_types[(u + i) % len(branch_types)] for i in range(count)]
+        user_branches = []
+        for branch_type in user_branch_types:
+            branch_id = ids["memory_branches"]
+            ids["memory_branches"] += 1
+            user_branches.append(branch_id)
+            writer.add("memory_branches", {
+                "id": branch_id,
+                "user_id": user_id,
+                "branch_type": branch_type,
+                "title": branch_type.value.replace("_", " ").title(),
+                "description": None,
+                "created_at": joined,
+                "updated_at": joined,
+            })
+
+        user_inputs = []
+        for _ in range(lognormal_int(rng, args.inputs_per_user, 0.6, 1, args.inputs_per_user * 10)):
+            input_id = ids["raw_inputs"]
+            ids["raw_inputs"] += 1
+            user_inputs.append(input_id)
+            is_voice = rng.random() < 0.6
+            created = joined + timedelta(seconds=rng.randint(0, int((now - joined).total_seconds())))
+            writer.add("raw_inputs", {
+                "id": input_id,
+                "user_id": user_id,
+                "memory_branch_id": rng.choice(user_branches) if rng.random() < 0.85 else None,
+                "input_type": InputType.VOICE if is_voice else InputType.TEXT,
+                "telnyx_call_id": f"v3:{input_id:012x}" if is_voice else None,
+                "audio_url": f"https://recordings.example.com/{input_id}.mp3" if is_voice else None,
+                # Voice transcripts run longer than typed notes
+                "raw_text": texts.text(14 if is_voice else 5),
+                "transcript_confidence": rng.randint(70, 99) if is_voice else None,
+                "metadata": {"duration": rng.randint(20, 1800), "language": "en"} if is_voice else None,
+                "created_at": created,
+            })
+
+        for _ in range(args.stories_per_user):
+            parent_id = None
+            created = joined + timedelta(seconds=rng.randint(0, int((now - joined).total_seconds())))
+            branch_id = rng.choice(user_branches)
+            title = f"{rng.choice(['Summers at', 'The Day at', 'Letters from', 'Growing Up by'])} {rng.choice(PLACES).title()}"
+            for version in range(1, rng.randint(1, args.max_versions) + 1):
+                story_id = ids["stories"]
+                ids["stories"] += 1
+                updated = created + timedelta(days=version - 1)
+                writer.add("stories", {
+                    "id": story_id,
+                    "user_id": user_id,
+                    "memory_branch_id": branch_id,
+                    "title": title,
+                    "content": texts.text(40, sigma=0.7),
+                    "summary": texts.text(2, sigma=0.3, max_sentences=3),
+                    "key_themes": rng.sample(THEMES, 3),
+                    "time_period": rng.choice(PERIODS),
+                    "people_mentioned": [f"{rng.choice(KIN)} {rng.choice(FIRST_NAMES)}" for _ in range(rng.randint(0, 4))],
+                    "source_input_ids": rng.sample(user_inputs, min(len(user_inputs), rng.randint(1, 5))),
+                    "version": version,
+                    "parent_story_id": parent_id,
+                    "created_at": updated,
+                    "updated_at": updated,
+                })
+                parent_id = story_id
+
+        if (u + 1) % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  {u + 1}/{args.users} users ({elapsed:.1f}s)")
+
+    writer.flush()
+    writer.reset_sequences()
+    return writer.counts, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Story AI dataset")
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from settings")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--inputs-per-user", type=int, default=100, help="median raw inputs per user")
+    parser.add_argument("--stories-per-user", type=int, default=10)
+    parser.add_argument("--max-versions", type=int, default=3, help="longest story version chain")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        from app.db.config import settings
+        args.database_url = settings.DATABASE_URL
+
+    print("Story AI - Synthetic Dataset Generator")
+    print(f"Database URL: {args.database_url}")
+    counts, elapsed = generate(args)
+    for table, count in counts.items():
+        print(f"✓ {table}: {count:,} rows")
+    print(f"✓ Done in {elapsed:.1f}s")
@@ -0,0 +1,146 @@
+"""
+Schema sync for existing databases
+Base.metadata.create_all() only creates missing tables, so columns and
+indexes added to existing models need this script:
+- creates missing tables
+- adds missing columns (as nullable, without defaults)
+- creates missing indexes
+- updates ON DELETE rules of foreign keys (PostgreSQL; added NOT VALID and
+  validated separately, so the table is only briefly locked)
+- points at scripts/partition_tables.py when DB_USER_PARTITIONS is set but
+  raw_inputs/stories are still plain tables (that conversion copies data)
+
+Usage:
+    python scripts/migrate_schema.py [--dry-run]
+"""
+import argparse
+import sys
+sys.path.append('..')
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from app.models.database import Base
+from app.db.partitioning import PARTITIONED_TABLES, USER_PARTITIONS, partitioned_tables
+from app.db.session import engine
+
+
+def pending_changes() -> list:
+    """DDL statements needed to bring the database up to the models"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            statements.append(("create_table", table))
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                statements.append((
+                    "sql",
+                    f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}{references(column)}'
+                ))
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                statements.append(("index", index))
+
+        statements.extend(foreign_key_changes(inspector, table))
+
+    if USER_PARTITIONS:
+        with engine.connect() as conn:
+            partitioned = partitioned_tables(conn)
+        statements.extend(
+            ("unpartitioned", name) for name in PARTITIONED_TABLES
+            if name in existing_tables and name not in partitioned
+        )
+    return statements
+
+
+def references(column) -> str:
+    """Inline REFERENCES clause for a new foreign key column (PostgreSQL and SQLite accept it in ADD COLUMN)"""
+    for fk in column.foreign_keys:
+        clause = f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+        if fk.ondelete:
+            clause += f" ON DELETE {fk.ondelete}"
+        return clause
+    return ""
+
+
+def foreign_key_changes(inspector, table) -> list:
+    """Foreign keys whose ON DELETE rule differs from the model"""
+    existing = {
+        tuple(fk["constrained_columns"]): fk
+        for fk in inspector.get_foreign_keys(table.name)
+    }
+    changes = []
+    for fk in table.foreign_key_constraints:
+        columns = tuple(column.name for column in fk.columns)
+        current = existing.get(columns)
+        if current is None:
+            continue
+        wanted = (fk.ondelete or "NO ACTION").upper()
+        actual = (current.get("options", {}).get("ondelete") or "NO ACTION").upper()
+        if wanted == actual:
+            continue
+        if engine.dialect.name != "postgresql":
+            changes.append(("unsupported", f"{table.name}({', '.join(columns)}) ON DELETE {wanted}"))
+            continue
+        name = current["name"]
+        referred = fk.elements[0].column.table.name
+        referred_columns = ", ".join(element.column.name for element in fk.elements)
+        changes.append(("sql",
+            f"ALTER TABLE {table.name} DROP CONSTRAINT {name}, "
+            f"ADD CONSTRAINT {name} FOREIGN KEY ({', '.join(columns)}) "
+            f"REFERENCES {referred} ({referred_columns}) ON DELETE {wanted} NOT VALID"
+        ))
+        changes.append(("sql", f"ALTER TABLE {table.name} VALIDATE CONSTRAINT {name}"))
+    return changes
+
+
+def describe(change) -> str:
+    kind, target = change
+    if kind == "create_table":
+        return f"CREATE TABLE {target.name}"
+    if kind == "index":
+        return str(CreateIndex(target).compile(dialect=engine.dialect))
+    if kind == "unsupported":
+        return f"skipped {target}: {engine.dialect.name} can't alter constraints, recreate the table"
+    if kind == "unpartitioned":
+        return f"skipped {target}: not partitioned yet, convert it with scripts/partition_tables.py"
+    return target
+
+
+def migrate(dry_run: bool = False) -> list:
+    changes = pending_changes()
+    if dry_run:
+        return changes
+
+    for kind, target in changes:
+        if kind == "create_table":
+            target.create(bind=engine, checkfirst=True)
+        elif kind == "index":
+            target.create(bind=engine, checkfirst=True)
+        elif kind in ("unsupported", "unpartitioned"):
+            continue
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(target))
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add missing tables, columns and indexes")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("Story AI - Schema Sync")
+    changes = migrate(dry_run=args.dry_run)
+    for change in changes:
+        marker = "!" if change[0] in ("unsupported", "unpartitioned") else ("would run" if args.dry_run else "✓")
+        print(f"  {marker} {describe(change)}")
+    print(f"\n✓ {len(changes)} change(s) {'pending' if args.dry_run else 'applied'}")
@@ -0,0 +1,432 @@
+"""
+Online conversion of raw_inputs and stories to hash partitions (PostgreSQL 15+)
+Builds a partitioned copy of each table next to the live one and swaps them
+in a short transaction; reads and writes continue throughout:
+
+  prepare   create <table>_partitioned (PARTITION BY HASH (user_id), same
+            columns, indexes and sequence) and a trigger that copies every
+            insert, update and delete on the live table into it
+  backfill  copy existing rows in id batches (resumable, safe to re-run)
+  verify    compare row count and a checksum of both tables in one snapshot
+  swap      rename the tables, move the id sequence, point foreign keys at
+            (id, user_id); constraints are added NOT VALID and validated
+            after the lock is released
+  drop-old  drop <table>_unpartitioned once you are happy
+  abort     remove the copy and the trigger (before swap)
+  status    progress of each table
+  explain   partitions read by the hot per-user queries
+
+Then set DB_USER_PARTITIONS to the same --partitions and restart the API.
+
+Usage:
+    python scripts/partition_tables.py prepare --partitions 16
+    python scripts/partition_tables.py backfill --batch-size 10000
+    python scripts/partition_tables.py verify
+    python scripts/partition_tables.py swap
+    python scripts/partition_tables.py explain
+    python scripts/partition_tables.py drop-old
+"""
+import argparse
+import sys
+import time
+sys.path.append('..')
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from app.db.config import settings
+from app.db.partitioning import (
+    PARTITIONED_TABLES, SELF_REFERENCES, create_partitions_sql, partition_name, partitioned_tables,
+    relations_in_plan, self_reference_sql
+)
+from app.models.database import Base
+
+STATE_TABLE = "partition_migration"
+LOCK_TIMEOUT = "5s"  # DDL gives up instead of queueing every query behind it
+BATCH_RETRIES = 5
+
+# Query shapes of the API's per-user reads (see app/api/inputs.py, stories.py,
+# branches.py, conditional.py, services/ai_service.py, dedup_service.py):
+# (name, SQL, reads one partition once partitioned)
+HOT_QUERIES = [
+    ("list inputs", "SELECT * FROM raw_inputs WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 100", True),
+    ("input validators", "SELECT count(id), max(updated_at) FROM raw_inputs WHERE user_id = :user_id", True),
+    ("generate: source inputs", "SELECT * FROM raw_inputs WHERE id = ANY(:input_ids) AND user_id = :user_id", True),
+    ("dedup candidates",
+     "SELECT id, duplicate_of_id, minhash_signature FROM raw_inputs "
+     "WHERE user_id = :user_id AND minhash_signature IS NOT NULL", True),
+    ("list stories", "SELECT * FROM stories WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 100", True),
+    ("story validators", "SELECT count(id), max(updated_at) FROM stories WHERE user_id = :user_id", True),
+    ("branch summaries",
+     "SELECT memory_branch_id, count(id), max(updated_at) FROM stories "
+     "WHERE user_id = :user_id GROUP BY memory_branch_id", True),
+    ("story by id", "SELECT * FROM stories WHERE id = :story_id", False),
+    ("branch stories", "SELECT * FROM stories WHERE memory_branch_id = :branch_id ORDER BY created_at DESC", False),
+]
+
+
+def copy_name(table: str) -> str:
+    return f"{table}_partitioned"
+
+
+def old_name(table: str) -> str:
+    return f"{table}_unpartitioned"
+
+
+def ensure_state_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+        "table_name VARCHAR(64) PRIMARY KEY, partitions INTEGER NOT NULL, phase VARCHAR(20) NOT NULL, "
+        "backfill_max_id BIGINT, backfilled_id BIGINT NOT NULL DEFAULT 0, updated_at TIMESTAMP DEFAULT now())"
+    ))
+
+
+def get_state(conn, table: str):
+    ensure_state_table(conn)
+    return conn.execute(text(f"SELECT * FROM {STATE_TABLE} WHERE table_name = :t"), {"t": table}).mappings().first()
+
+
+def set_state(conn, table: str, **values):
+    assignments = ", ".join(f"{column} = :{column}" for column in values)
+    conn.execute(text(f"UPDATE {STATE_TABLE} SET {assignments}, updated_at = now() WHERE table_name = :t"),
+                 {"t": table, **values})
+
+
+def model_indexes(table: str) -> list:
+    """(name, columns) of the model's indexes on `table`"""
+    return [
+        (index.name, [column.name for column in index.columns])
+        for index in sorted(Base.metadata.tables[table].indexes, key=lambda index: index.name)
+    ]
+
+
+def outgoing_foreign_keys(table: str) -> list:
+    """FKs from `table` to the other tables (users, memory_branches); self references are handled separately"""
+    keys = []
+    for fk in Base.metadata.tables[table].foreign_keys:
+        referred = fk.column.table.name
+        if referred in PARTITIONED_TABLES:
+            continue
+        clause = f"FOREIGN KEY ({fk.parent.name}) REFERENCES {referred} ({fk.column.name})"
+        if fk.ondelete:
+            clause += f" ON DELETE {fk.ondelete}"
+        keys.append((f"{table}_{fk.parent.name}_fkey", clause))
+    return sorted(keys)
+
+
+def incoming_foreign_keys(conn, table: str) -> list:
+    """(referencing table, constraint, column, ON DELETE) of single-column FKs from other tables to `table`"""
+    rows = conn.execute(text(
+        "SELECT c.conrelid::regclass::text AS referencing, c.conname, a.attname, c.confdeltype "
+        "FROM pg_constraint c JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+        "WHERE c.contype = 'f' AND c.confrelid = CAST(:t AS regclass) AND c.conrelid <> c.confrelid "
+        "AND array_length(c.conkey, 1) = 1"
+    ), {"t": table}).all()
+    actions = {"a": "NO ACTION", "r": "RESTRICT", "c": "CASCADE", "n": "SET NULL", "d": "SET DEFAULT"}
+    return [(row.referencing, row.conname, row.attname, actions[row.confdeltype]) for row in rows]
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = :t AND column_name = :c"
+    ), {"t": table, "c": column}).first() is not None
+
+
+def prepare(engine, table: str, partitions: int):
+    copy = copy_name(table)
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        if state is not None:
+            print(f"  {table}: already {state['phase']} ({state['partitions']} partitions)")
+            return
+        if table in partitioned_tables(conn):
+            print(f"  {table}: already partitioned")
+            return
+        for referencing, _, _, _ in incoming_foreign_keys(conn, table):
+            if not has_column(conn, referencing, "user_id"):
+                raise SystemExit(f"{referencing} references {table} but has no user_id to reference (id, user_id) with")
+
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        # Same columns, defaults (the id sequence included) and NOT NULLs
+        conn.execute(text(
+            f"CREATE TABLE {copy} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE) PARTITION BY HASH (user_id)"
+        ))
+        conn.execute(text(f"ALTER TABLE {copy} ADD CONSTRAINT {copy}_pkey PRIMARY KEY (id, user_id)"))
+        for statement in create_partitions_sql(copy, partitions, table=table):
+            conn.execute(text(statement))
+        # Indexes on an empty table: instant; they are built per partition as rows arrive
+        for name, columns in model_indexes(table):
+            conn.execute(text(f"CREATE INDEX {name}_partitioned ON {copy} ({', '.join(columns)})"))
+        for name, clause in outgoing_foreign_keys(table):
+            conn.execute(text(f"ALTER TABLE {copy} ADD CONSTRAINT {name} {clause}"))
+
+        # Every change from here on reaches the copy; CREATE TRIGGER waits for
+        # writes already in flight, so backfill sees everything committed before
+        conn.execute(text(f"""
+            CREATE FUNCTION {table}_partition_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {copy} WHERE id = OLD.id AND user_id = OLD.user_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {copy} SELECT (NEW).*;
+                END IF;
+                RETURN NULL;
+            END $$
+        """))
+        conn.execute(text(
+            f"CREATE TRIGGER {table}_partition_sync AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_partition_sync()"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {STATE_TABLE} (table_name, partitions, phase) VALUES (:t, :p, 'prepared')"
+        ), {"t": table, "p": partitions})
+    print(f"  ✓ {table}: {copy} with {partitions} partitions, sync trigger installed")
+
+
+def backfill(engine, table: str, batch_size: int, pause: float):
+    copy = copy_name(table)
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        if state is None or state["phase"] not in ("prepared", "backfilling"):
+            print(f"  {table}: nothing to backfill ({state['phase'] if state else 'not prepared'})")
+            return
+        upto = state["backfill_max_id"]
+        if upto is None:
+            # Rows above this were written after the trigger existed
+            upto = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+            set_state(conn, table, backfill_max_id=upto, phase="backfilling")
+        after = state["backfilled_id"]
+
+    started = time.perf_counter()
+    copied = 0
+    while after < upto:
+        for attempt in range(BATCH_RETRIES):
+            try:
+                with engine.begin() as conn:
+                    high = conn.execute(text(
+                        f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > :after AND id <= :upto "
+                        f"ORDER BY id LIMIT :batch) batch"
+                    ), {"after": after, "upto": upto, "batch": batch_size}).scalar()
+                    if high is None:
+                        high = upto
+                    # FOR SHARE: a concurrent update or delete of these rows waits
+                    # for this batch, then reaches the copy through the trigger
+                    copied += conn.execute(text(
+                        f"INSERT INTO {copy} SELECT * FROM {table} WHERE id > :after AND id <= :high "
+                        f"FOR SHARE ON CONFLICT DO NOTHING"
+                    ), {"after": after, "high": high}).rowcount
+                    set_state(conn, table, backfilled_id=high)
+                break
+            except DBAPIError as e:  # deadlocks, or a parent row deleted mid-batch
+                if attempt + 1 == BATCH_RETRIES:
+                    raise
+                print(f"  ! {table}: batch after id {after} failed, retrying: {e.orig}")
+                time.sleep(1 + attempt)
+        after = high
+        elapsed = time.perf_counter() - started
+        print(f"  {table}: {after}/{upto} ids, {copied} rows copied ({copied / max(elapsed, 1e-9):.0f}/s)")
+        if pause:
+            time.sleep(pause)
+
+    with engine.begin() as conn:
+        set_state(conn, table, phase="backfilled")
+    print(f"  ✓ {table}: backfilled")
+
+
+def checksum(conn, table: str) -> tuple:
+    return tuple(conn.execute(text(
+        f"SELECT count(*), COALESCE(sum(hashtext(t::text)::bigint), 0) FROM {table} t"
+    )).one())
+
+
+def verify(engine, table: str) -> bool:
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        state = get_state(conn, table)
+        if state is None or state["phase"] not in ("backfilled", "verified"):
+            print(f"  {table}: backfill first ({state['phase'] if state else 'not prepared'})")
+            return False
+        live, copy = checksum(conn, table), checksum(conn, copy_name(table))
+        conn.rollback()
+    if live != copy:
+        print(f"  ✗ {table}: {live[0]} rows (checksum {live[1]}) vs copy {copy[0]} rows (checksum {copy[1]})")
+        return False
+    with engine.begin() as conn:
+        set_state(conn, table, phase="verified")
+    print(f"  ✓ {table}: {live[0]} rows match")
+    return True
+
+
+def swap(engine, table: str):
+    copy, old = copy_name(table), old_name(table)
+    validate = []
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        if state is None or state["phase"] != "verified":
+            print(f"  {table}: verify first ({state['phase'] if state else 'not prepared'})")
+            return
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        incoming = incoming_foreign_keys(conn, table)
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar()
+        primary_key = conn.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'"
+        ), {"t": table}).scalar()
+        referencing_tables = ", ".join(sorted({referencing for referencing, _, _, _ in incoming}))
+        conn.execute(text(
+            f"LOCK TABLE {table}, {copy}{', ' + referencing_tables if referencing_tables else ''} "
+            f"IN ACCESS EXCLUSIVE MODE"
+        ))
+
+        conn.execute(text(f"DROP TRIGGER {table}_partition_sync ON {table}"))
+        conn.execute(text(f"DROP FUNCTION {table}_partition_sync()"))
+        for referencing, constraint, _, _ in incoming:
+            conn.execute(text(f"ALTER TABLE {referencing} DROP CONSTRAINT {constraint}"))
+
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {primary_key} TO {old}_pkey"))
+        for name, _ in model_indexes(table):
+            conn.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_unpartitioned"))
+        conn.execute(text(f"ALTER TABLE {copy} RENAME TO {table}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME CONSTRAINT {copy}_pkey TO {table}_pkey"))
+        for name, _ in model_indexes(table):
+            conn.execute(text(f"ALTER INDEX {name}_partitioned RENAME TO {name}"))
+        if sequence:
+            # Otherwise dropping the old table would drop the sequence with it
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+        # NOT VALID: no scan under the lock; validated below
+        for referencing, constraint, column, ondelete in incoming:
+            conn.execute(text(
+                f"ALTER TABLE {referencing} ADD CONSTRAINT {constraint} FOREIGN KEY ({column}, user_id) "
+                f"REFERENCES {table} (id, user_id) ON DELETE {ondelete} NOT VALID"
+            ))
+            validate.append((referencing, constraint))
+        # Per partition: PostgreSQL can't add NOT VALID FKs on a partitioned table
+        if table in SELF_REFERENCES:
+            for remainder in range(state["partitions"]):
+                partition = partition_name(table, remainder)
+                conn.execute(text(self_reference_sql(partition, referenced=table, not_valid=True)))
+                validate.append((partition, f"{partition}_{SELF_REFERENCES[table]}_fkey"))
+        set_state(conn, table, phase="swapped")
+    print(f"  ✓ {table}: swapped, the old table is {old}")
+
+    for referencing, constraint in validate:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {referencing} VALIDATE CONSTRAINT {constraint}"))
+        print(f"  ✓ {referencing}.{constraint} validated")
+    with engine.begin() as conn:
+        set_state(conn, table, phase="validated")
+
+
+def drop_old(engine, table: str):
+    old = old_name(table)
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        if state is None or state["phase"] != "validated":
+            print(f"  {table}: swap first ({state['phase'] if state else 'not prepared'})")
+            return
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {old}"))
+        conn.execute(text(f"DELETE FROM {STATE_TABLE} WHERE table_name = :t"), {"t": table})
+    print(f"  ✓ {table}: dropped {old}")
+
+
+def abort(engine, table: str):
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        if state is None:
+            print(f"  {table}: nothing to abort")
+            return
+        if state["phase"] in ("swapped", "validated"):
+            print(f"  {table}: already swapped, the old table is {old_name(table)}")
+            return
+        conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_partition_sync ON {table}"))
+        conn.execute(text(f"DROP FUNCTION IF EXISTS {table}_partition_sync()"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {copy_name(table)}"))
+        conn.execute(text(f"DELETE FROM {STATE_TABLE} WHERE table_name = :t"), {"t": table})
+    print(f"  ✓ {table}: removed {copy_name(table)} and the sync trigger")
+
+
+def status(engine, table: str):
+    with engine.begin() as conn:
+        state = get_state(conn, table)
+        partitioned = table in partitioned_tables(conn)
+    if state is None:
+        print(f"  {table}: {'partitioned' if partitioned else 'not partitioned'}")
+        return
+    progress = ""
+    if state["backfill_max_id"]:
+        progress = f", backfilled to id {state['backfilled_id']}/{state['backfill_max_id']}"
+    print(f"  {table}: {state['phase']} ({state['partitions']} partitions{progress})")
+
+
+def sample_params(conn, user_id: int = None) -> dict:
+    """Bind values for HOT_QUERIES: the given user, or the one with the most inputs"""
+    if user_id is None:
+        user_id = conn.execute(text(
+            "SELECT user_id FROM raw_inputs GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+        )).scalar()
+    input_ids = list(conn.execute(text(
+        "SELECT id FROM raw_inputs WHERE user_id = :u ORDER BY id LIMIT 5"
+    ), {"u": user_id}).scalars())
+    story_id = conn.execute(text("SELECT id FROM stories WHERE user_id = :u LIMIT 1"), {"u": user_id}).scalar()
+    branch_id = conn.execute(text(
+        "SELECT id FROM memory_branches WHERE user_id = :u LIMIT 1"
+    ), {"u": user_id}).scalar()
+    return {"user_id": user_id, "input_ids": input_ids or [0], "story_id": story_id or 0, "branch_id": branch_id or 0}
+
+
+def explain(engine, user_id: int = None):
+    with engine.connect() as conn:
+        params = sample_params(conn, user_id)
+        partitioned = partitioned_tables(conn)
+        print(f"  user {params['user_id']}")
+        for name, sql, prunes in HOT_QUERIES:
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+            relations = sorted(relations_in_plan(plan))
+            table = "stories" if " stories" in sql else "raw_inputs"
+            if table not in partitioned:
+                marker = "-"
+            elif prunes:
+                marker = "✓" if len(relations) == 1 else "✗"
+            else:
+                marker = "·"  # no user_id in the query: every partition
+            print(f"  {marker} {name:<26} {', '.join(relations)}")
+
+
+COMMANDS = {
+    "prepare": lambda engine, table, args: prepare(engine, table, args.partitions),
+    "backfill": lambda engine, table, args: backfill(engine, table, args.batch_size, args.pause),
+    "verify": lambda engine, table, args: verify(engine, table),
+    "swap": lambda engine, table, args: swap(engine, table),
+    "drop-old": lambda engine, table, args: drop_old(engine, table),
+    "abort": lambda engine, table, args: abort(engine, table),
+    "status": lambda engine, table, args: status(engine, table),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert raw_inputs and stories to hash partitions online")
+    parser.add_argument("command", choices=sorted(list(COMMANDS) + ["explain"]))
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from settings")
+    parser.add_argument("--table", choices=PARTITIONED_TABLES, action="append",
+                        help="default: both tables")
+    parser.add_argument("--partitions", type=int, default=settings.DB_USER_PARTITIONS or 16)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds between backfill batches")
+    parser.add_argument("--user-id", type=int, help="explain: user to plan the queries for")
+    args = parser.parse_args()
+
+    if args.command == "prepare" and args.partitions < 2:
+        sys.exit("--partitions must be at least 2")
+
+    engine = create_engine(args.database_url or settings.DATABASE_URL)
+    if engine.dialect.name != "postgresql":
+        sys.exit("Partitioning needs PostgreSQL")
+
+    print(f"Story AI - Partition Tables ({args.command})")
+    if args.command == "explain":
+        explain(engine, args.user_id)
+    else:
+        for table in args.table or PARTITIONED_TABLES:
+            COMMANDS[args.command](engine, table, args)
@@ -0,0 +1,88 @@
+"""
+Webhook queue operations
+Inspect the local webhook queue, re-process a range of events, or drain it
+from a standalone process (e.g. with WEBHOOK_CONSUMER_ENABLED=False on the
+web workers).
+
+Usage:
+    python scripts/webhook_queue.py status
+    python scripts/webhook_queue.py replay --from-offset 120345
+    python scripts/webhook_queue.py drain [--until-empty]
+    python scripts/webhook_queue.py retry-dead
+    python scripts/webhook_queue.py prune
+"""
+import argparse
+import asyncio
+import sys
+import time
+sys.path.append('..')
+
+from app.db.config import settings
+from app.api.voice import webhook_queue, webhook_consumer, WEBHOOK_CONSUMER
+
+
+def print_status():
+    stats = webhook_queue.stats(WEBHOOK_CONSUMER)
+    print(f"  queue:     {webhook_queue.path}")
+    print(f"  offsets:   {stats['first_offset']}..{stats['head_offset']} (replayable from {stats['first_offset']})")
+    print(f"  committed: {stats['committed_offset']}")
+    print(f"  lag:       {stats['lag_events']} events, oldest {stats['lag_seconds']:.1f}s")
+    print(f"  failed:    {stats['retrying']} waiting to be retried, {stats['dead_letters']} dead letters")
+
+
+async def drain(until_empty: bool):
+    """Run the consumer in this process (takes the lease when it's free)"""
+    started = time.perf_counter()
+    processed = 0
+    while True:
+        if not webhook_queue.acquire_lease(WEBHOOK_CONSUMER, webhook_consumer.owner, webhook_consumer.lease_ttl):
+            print("  another process holds the consumer lease; waiting")
+            await asyncio.sleep(webhook_consumer.lease_ttl / 3)
+            continue
+        count = await webhook_consumer.drain_batch()
+        processed += count
+        if count:
+            print(f"  {processed} events ({processed / (time.perf_counter() - started):.0f}/s)")
+        elif until_empty:
+            break
+        else:
+            await asyncio.sleep(webhook_consumer.poll_interval)
+    webhook_queue.release_lease(WEBHOOK_CONSUMER, webhook_consumer.owner)
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and operate the local webhook queue")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("status")
+    replay = subcommands.add_parser("replay", help="process again from an offset (inclusive)")
+    replay.add_argument("--from-offset", type=int, required=True)
+    drain_parser = subcommands.add_parser("drain", help="run the consumer in this process")
+    drain_parser.add_argument("--until-empty", action="store_true")
+    subcommands.add_parser("prune", help="delete processed events older than the retention window")
+    subcommands.add_parser("retry-dead", help="retry events that failed too many times")
+    args = parser.parse_args()
+
+    if webhook_queue is None:
+        print("WEBHOOK_QUEUE_ENABLED is off")
+        sys.exit(1)
+
+    print("Story AI - Webhook Queue")
+    if args.command == "status":
+        print_status()
+    elif args.command == "replay":
+        stats = webhook_queue.stats(WEBHOOK_CONSUMER)
+        if args.from_offset < stats["first_offset"]:
+            print(f"  events before {stats['first_offset']} were pruned; replaying from there")
+        webhook_queue.replay(WEBHOOK_CONSUMER, args.from_offset)
+        print(f"✓ Consumer will re-process from offset {max(args.from_offset, stats['first_offset'])}")
+    elif args.command == "drain":
+        total = asyncio.run(drain(args.until_empty))
+        print(f"✓ Processed {total} events")
+    elif args.command == "prune":
+        deleted = webhook_queue.prune(WEBHOOK_CONSUMER, settings.WEBHOOK_QUEUE_RETENTION_HOURS * 3600)
+        print(f"✓ Deleted {deleted} processed events")
+    elif args.command == "retry-dead":
+        count = webhook_queue.retry_dead(WEBHOOK_CONSUMER)
+        print(f"✓ {count} dead letters will be retried")
+    webhook_queue.close()
@@ -0,0 +1,9 @@
+"""
+Story AI Python client
+An async client (httpx) with pooled keep-alive connections, page iteration,
+bulk ingest, job polling and retries with jitter. See client.py.
+"""
+from story_ai_client.client import StoryAIClient, StoryAIError, JobFailed, HTTP2_AVAILABLE
+from story_ai_client.retry import RetryPolicy, NO_RETRY
+
+__all__ = ["StoryAIClient", "StoryAIError", "JobFailed", "HTTP2_AVAILABLE", "RetryPolicy", "NO_RETRY"]
@@ -0,0 +1,279 @@
+"""
+Async client for the Story AI API
+One client holds one pool of keep-alive connections (HTTP/2 when the optional
+`h2` package is installed and the server negotiates it, i.e. behind a TLS
+proxy; uvicorn itself speaks HTTP/1.1). Share a client across tasks rather
+than opening one per call.
+
+    async with StoryAIClient("http://localhost:8000") as client:
+        user = await client.create_user("Rose", "rose@example.com")
+        input_ids = await client.create_inputs(
+            {"user_id": user["id"], "raw_text": text} for text in texts
+        )
+        story = await client.generate_story(user["id"], input_ids)
+        async for story in client.iter_user_stories(user["id"], view="summary"):
+            print(story["title"])
+
+Listings are iterated page by page (the next page is fetched while the
+current one is consumed). Transient failures are retried with jittered
+backoff (see retry.py).
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+import httpx
+from story_ai_client.retry import RetryPolicy, parse_retry_after
+
+try:
+    import h2  # noqa: F401  optional: httpx's HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+MAX_BULK_INPUTS = 500  # per POST /inputs/bulk
+FINISHED_JOB_STATUSES = {"completed", "failed"}
+
+
+class StoryAIError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None, detail: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.detail = detail  # the response's "detail", when there is one
+
+
+class JobFailed(StoryAIError):
+    def __init__(self, job: Dict):
+        super().__init__(f"Job {job['id']} ({job['kind']}) failed: {job.get('error')}", detail=job.get("error"))
+        self.job = job
+
+
+class StoryAIClient:
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        api_version: str = "v1",
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        http2: Optional[bool] = None,
+        retry: Optional[RetryPolicy] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.retry = retry or RetryPolicy()
+        self.retries = 0  # retried requests, for diagnostics
+        self._http = httpx.AsyncClient(
+            base_url=f"{base_url.rstrip('/')}/api/{api_version}",
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0
+            ),
+            http2=HTTP2_AVAILABLE if http2 is None else http2,
+            transport=transport,
+            headers={"User-Agent": "story-ai-client"}
+        )
+
+    async def __aenter__(self) -> "StoryAIClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def request(self, method: str, path: str, params: Optional[Dict] = None, json: Any = None) -> Any:
+        """Send a request, retrying transient failures; returns the decoded JSON body"""
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.request(method, path, params=params, json=json)
+            except httpx.TransportError as e:
+                if attempt + 1 < self.retry.attempts and self.retry.should_retry_error(method, e):
+                    await self._backoff(attempt)
+                    attempt += 1
+                    continue
+                raise StoryAIError(f"{method} {path} failed: {e!r}") from e
+
+            if response.status_code < 400:
+                return response.json() if response.content else None
+            if attempt + 1 < self.retry.attempts and self.retry.should_retry_status(method, response.status_code):
+                await self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            try:
+                detail = response.json().get("detail")
+            except ValueError:
+                detail = response.text
+            raise StoryAIError(f"{method} {path} returned {response.status_code}: {detail}",
+                               status_code=response.status_code, detail=detail)
+
+    async def _backoff(self, attempt: int, retry_after: Optional[float] = None):
+        self.retries += 1
+        await asyncio.sleep(self.retry.delay(attempt, retry_after))
+
+    # Pagination
+
+    async def paginate(self, path: str, params: Optional[Dict] = None, page_size: int = 100) -> AsyncIterator[Dict]:
+        """Items of a skip/limit listing, fetching the next page while this one is consumed"""
+        params = dict(params or {})
+
+        def fetch(skip: int) -> asyncio.Task:
+            return asyncio.ensure_future(self.request("GET", path, params={**params, "skip": skip, "limit": page_size}))
+
+        skip = 0
+        pending = fetch(skip)
+        try:
+            while pending is not None:
+                page = await pending
+                skip += len(page)
+                pending = fetch(skip) if len(page) == page_size else None
+                for item in page:
+                    yield item
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def paginate_cursor(self, path: str, params: Optional[Dict] = None, items_key: str = "entries") -> AsyncIterator[Dict]:
+        """Items of a cursor-paged listing (`next_cursor`), fetching ahead like paginate()"""
+        params = dict(params or {})
+
+        def fetch(cursor: Optional[str]) -> asyncio.Task:
+            return asyncio.ensure_future(
+                self.request("GET", path, params={**params, "cursor": cursor} if cursor else params)
+            )
+
+        pending = fetch(None)
+        try:
+            while pending is not None:
+                page = await pending
+                pending = fetch(page["next_cursor"]) if page.get("next_cursor") else None
+                for item in page[items_key]:
+                    yield item
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    # Users
+
+    async def create_user(self, name: str, email: str, phone_number: Optional[str] = None,
+                          birth_year: Optional[int] = None) -> Dict:
+        return await self.request("POST", "/users/", json={
+            "name": name, "email": email, "phone_number": phone_number, "birth_year": birth_year
+        })
+
+    async def get_user(self, user_id: int) -> Dict:
+        return await self.request("GET", f"/users/{user_id}")
+
+    def iter_users(self, page_size: int = 100) -> AsyncIterator[Dict]:
+        return self.paginate("/users/", page_size=page_size)
+
+    def iter_timeline(self, user_id: int, page_size: int = 50, include_undated: bool = True) -> AsyncIterator[Dict]:
+        """Timeline entries in chronological order (undated last)"""
+        return self.paginate_cursor(
+            f"/users/{user_id}/timeline",
+            params={"limit": page_size, "include_undated": str(include_undated).lower()}
+        )
+
+    # Memory branches
+
+    async def create_branch(self, user_id: int, branch_type: str, title: str, description: Optional[str] = None) -> Dict:
+        return await self.request("POST", "/branches/", json={
+            "user_id": user_id, "branch_type": branch_type, "title": title, "description": description
+        })
+
+    async def list_user_branches(self, user_id: int) -> List[Dict]:
+        return await self.request("GET", f"/branches/user/{user_id}")
+
+    # Raw inputs
+
+    async def create_input(self, user_id: int, raw_text: str, input_type: str = "text",
+                           memory_branch_id: Optional[int] = None, **fields) -> Dict:
+        return await self.request("POST", "/inputs/", json={
+            "user_id": user_id, "input_type": input_type, "raw_text": raw_text,
+            "memory_branch_id": memory_branch_id, **fields
+        })
+
+    async def create_inputs(self, inputs: Iterable[Dict], chunk_size: int = MAX_BULK_INPUTS,
+                            concurrency: int = 4) -> List[int]:
+        """
+        Bulk ingest: inputs (dicts shaped like create_input()'s arguments, input_type
+        defaulting to "text") go in chunks through POST /inputs/bulk, `concurrency`
+        chunks at a time. Returns the new ids in input order.
+        """
+        chunk_size = min(chunk_size, MAX_BULK_INPUTS)
+        items = [{"input_type": "text", **item} for item in inputs]
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(chunk: List[Dict]) -> List[int]:
+            async with semaphore:
+                return (await self.request("POST", "/inputs/bulk", json={"inputs": chunk}))["ids"]
+
+        results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [input_id for ids in results for input_id in ids]
+
+    def iter_user_inputs(self, user_id: int, page_size: int = 100, view: str = "full") -> AsyncIterator[Dict]:
+        return self.paginate(f"/inputs/user/{user_id}", params={"view": view}, page_size=page_size)
+
+    # Stories
+
+    async def get_story(self, story_id: int) -> Dict:
+        return await self.request("GET", f"/stories/{story_id}")
+
+    def iter_user_stories(self, user_id: int, page_size: int = 100, view: str = "full") -> AsyncIterator[Dict]:
+        return self.paginate(f"/stories/user/{user_id}", params={"view": view}, page_size=page_size)
+
+    async def start_story_generation(self, user_id: int, input_ids: List[int], memory_branch_id: Optional[int] = None,
+                                     style: str = "narrative", collapse_duplicates: bool = True) -> Dict:
+        """Queue story generation; returns the job (see wait_for_job()/watch_job())"""
+        return await self.request("POST", "/stories/generate/jobs", json={
+            "user_id": user_id, "input_ids": input_ids, "memory_branch_id": memory_branch_id,
+            "style": style, "collapse_duplicates": collapse_duplicates
+        })
+
+    async def generate_story(self, user_id: int, input_ids: List[int], memory_branch_id: Optional[int] = None,
+                             style: str = "narrative", collapse_duplicates: bool = True,
+                             timeout: float = 300.0) -> Dict:
+        """Generate a story as a background job and wait for it"""
+        job = await self.start_story_generation(user_id, input_ids, memory_branch_id, style, collapse_duplicates)
+        job = await self.wait_for_job(job["id"], timeout=timeout)
+        return await self.get_story(job["result"]["story_id"])
+
+    # Jobs
+
+    async def get_job(self, job_id: int) -> Dict:
+        return await self.request("GET", f"/jobs/{job_id}")
+
+    async def watch_job(self, job_id: int, timeout: float = 300.0, poll_interval: float = 0.1,
+                        max_poll_interval: float = 2.0) -> AsyncIterator[Dict]:
+        """
+        Yield the job each time its status or progress changes, until it finishes
+        Polls quickly at first, backing off to `max_poll_interval` while nothing changes.
+        """
+        deadline = time.monotonic() + timeout
+        interval = poll_interval
+        last = None
+        while True:
+            job = await self.get_job(job_id)
+            state = (job["status"], job.get("completed"), job.get("total"))
+            if state != last:
+                last = state
+                interval = poll_interval
+                yield job
+            if job["status"] in FINISHED_JOB_STATUSES:
+                return
+            if time.monotonic() + interval > deadline:
+                raise StoryAIError(f"Job {job_id} still {job['status']} after {timeout}s")
+            await asyncio.sleep(interval)
+            interval = min(max_poll_interval, interval * 1.5)
+
+    async def wait_for_job(self, job_id: int, timeout: float = 300.0, poll_interval: float = 0.1,
+                           max_poll_interval: float = 2.0) -> Dict:
+        """The finished job; raises JobFailed if it failed"""
+        job = None
+        async for job in self.watch_job(job_id, timeout, poll_interval, max_poll_interval):
+            pass
+        if job["status"] == "failed":
+            raise JobFailed(job)
+        return job
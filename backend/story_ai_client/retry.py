@@ -0,0 +1,62 @@
+"""
+When and how long to retry
+Exponential backoff with full jitter (a random delay up to base * 2^attempt),
+so clients that failed together don't retry together. A server's Retry-After
+is a floor.
+
+Requests the server never processed (connection refused, pool timeouts, 429,
+503) are retried for every method. Failures after the request may have been
+handled (read timeouts, 502, 504) are only retried for idempotent methods, so
+a POST isn't applied twice.
+"""
+import random
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+import httpx
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+NOT_PROCESSED_STATUSES = {429, 503}
+IDEMPOTENT_RETRY_STATUSES = {502, 504}
+# Raised before the request reached the server
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 4  # tries in total, including the first
+    base_delay: float = 0.2  # seconds
+    max_delay: float = 10.0
+
+    def should_retry_status(self, method: str, status_code: int) -> bool:
+        return status_code in NOT_PROCESSED_STATUSES or (
+            status_code in IDEMPOTENT_RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS
+        )
+
+    def should_retry_error(self, method: str, error: Exception) -> bool:
+        if isinstance(error, NOT_SENT_ERRORS):
+            return True
+        return isinstance(error, httpx.TransportError) and method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0.0)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After in seconds (delta-seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+NO_RETRY = RetryPolicy(attempts=1)